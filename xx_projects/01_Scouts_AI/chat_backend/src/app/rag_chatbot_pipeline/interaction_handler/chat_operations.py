@@ -1,15 +1,26 @@
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
 from app.rag_chatbot_pipeline.data_handler.data_operations import initialize_vector_database
+from chat_common.deadlines import MIN_GENERATION_SECONDS, Deadline, StageTimeout, deadline_metrics, partial_answer
+from chat_common.intent_router import intent_router
+from chat_common.retrieval_client import retrieval_client
+from chat_common.sentence_limit import max_answer_tokens, sentence_limit, stream_answer
 
 from app.openai.openai_connectivity import OPENAI_API_KEY
 
+import os
+
+# Snapshot this backend's store is served under by the retrieval service, used when RETRIEVAL_SERVICE_URL is set
+RETRIEVAL_COLLECTION = os.getenv("RETRIEVAL_COLLECTION", "langchain")
+
 vector_database = None
 
 async def load_and_initialize_vector_database():
     global vector_database
-    if not vector_database:
+    # The retrieval service holds the index, the local store isn't opened
+    if not vector_database and not retrieval_client.enabled:
         # Await the initialization if it's an async function
         vector_database = await initialize_vector_database()
         
@@ -23,7 +34,28 @@ async def load_and_initialize_vector_database():
 
             print(f"Vector database initialized: {type(vector_database)}")
 
-async def question_answer(query: str):
+def chat_retriever():
+    if retrieval_client.enabled:
+        return retrieval_client.as_retriever(RETRIEVAL_COLLECTION)
+    return vector_database.as_retriever()
+
+async def question_answer(query: str, deadline: Deadline = None):
+    """Answers a query within its deadline.
+
+    Retrieval and generation each run within their budget of `deadline`. The
+    answer is streamed and stops at the prompt's sentence limit. When generation
+    can't finish in time the top retrieved passages are returned instead, flagged
+    partial.
+
+    Raises:
+        StageTimeout: If retrieval ran out of time, there is nothing to answer with.
+    """
+    deadline = deadline or Deadline()
+    # Small talk is answered from templates, without retrieval or an LLM call
+    fast_answer = intent_router.answer(query)
+    if fast_answer is not None:
+        return {"result": fast_answer, "source_documents": []}
+
     # Ensure vector database is initialized before running the QA
     await load_and_initialize_vector_database()
 
@@ -36,19 +68,26 @@ async def question_answer(query: str):
 
     # Define the retrieval QA chain
     qa = RetrievalQA.from_chain_type(
-        llm=ChatOpenAI(temperature=0, model_name="gpt-4", openai_api_key=OPENAI_API_KEY),
+        llm=ChatOpenAI(temperature=0, model_name="gpt-4", openai_api_key=OPENAI_API_KEY,
+                       max_tokens=max_answer_tokens(template)),
         chain_type="stuff",
-        retriever=vector_database.as_retriever(),  # Use the retriever
+        retriever=chat_retriever(),  # Use the retriever
         chain_type_kwargs={'prompt': QA_CHAIN_PROMPT},
         return_source_documents=True,
         verbose=True
     )
     
-    # Asynchronously call the QA chain using ainvoke
-    response = await qa.ainvoke({"query": query})
-    
-    # Extract the result and source documents
-    result = response.get("result")
-    source_documents = response.get("source_documents", [])
-    
+    # What qa.ainvoke does, one stage at a time so each gets its own budget
+    source_documents = await deadline.run("retrieval", qa.retriever.ainvoke(query))
+    llm_chain = qa.combine_documents_chain.llm_chain
+    context = "\n\n".join(document.page_content for document in source_documents)
+    try:
+        result = await deadline.run("generation", stream_answer(
+            llm_chain.prompt | llm_chain.llm | StrOutputParser(), {"context": context, "question": query},
+            sentence_limit(template)), MIN_GENERATION_SECONDS)
+    except StageTimeout:
+        deadline_metrics.record(degraded=True)
+        return partial_answer(source_documents)
+    deadline_metrics.record(degraded=False)
+
     return {"result": result, "source_documents": source_documents}
@@ -1,8 +1,18 @@
-from fastapi import FastAPI, HTTPException
-from app.rag_chatbot_pipeline.interaction_handler.chat_operations import question_answer
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from app.rag_chatbot_pipeline.interaction_handler.chat_operations import RETRIEVAL_COLLECTION, question_answer
+from chat_common.deadlines import Deadline, StageTimeout, deadline_metrics
+from chat_common.intent_router import intent_router
+from chat_common.source_references import compact_source_documents, find_source
 from app.rag_chatbot_pipeline.data_handler.data_operations import initialize_vector_database, load_documents
+from app.rag_chatbot_pipeline.data_handler.ingestion_jobs import ingestion_jobs
+from chat_common.retrieval_client import retrieval_client
+from chat_common.admission_control import chat_admission, chat_slot
+from app.routes.ingestion_routes import router as ingestion_routes
+from app.routes.pdf_pre_processing_routes import router as pdf_pre_processing_routes
 from app.schema.models import ChatRequest
 from PyPDF2 import PdfReader
+import asyncio
 import os
 import logging
 
@@ -14,22 +24,36 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 Logger.addHandler(handler)
 
-app = FastAPI(title="RAG chat application", version="0.1.0")
+app = FastAPI(title="RAG chat application", version="0.1.0", default_response_class=ORJSONResponse)
+app.include_router(ingestion_routes)
+app.include_router(pdf_pre_processing_routes)
 vector_database = None
 
 @app.on_event("startup")
 async def startup_event():
     global vector_database
-    print("Initializing vector database...")
-    vector_database = await load_and_initialize_vector_database()
-    if vector_database is None:
-        print("Failed to initialize vector database at startup.")
+    if retrieval_client.enabled:
+        print(f"Retrieving through the retrieval service at {retrieval_client.base_url}")
     else:
-        print("Vector database initialized successfully.")
+        print("Initializing vector database...")
+        vector_database = await load_and_initialize_vector_database()
+        if vector_database is None:
+            print("Failed to initialize vector database at startup.")
+        else:
+            print("Vector database initialized successfully.")
+    # Picks up PDFs added while the server was down, chat is served from the current index meanwhile
+    ingestion_jobs.start()
+    ingestion_jobs.submit()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingestion_jobs.stop()
+    await retrieval_client.close()
 
 async def load_and_initialize_vector_database():
     global vector_database
-    if vector_database is None:
+    # The retrieval service holds the index, the local store isn't opened
+    if vector_database is None and not retrieval_client.enabled:
         vector_database = await initialize_vector_database()
         if vector_database is None:
             print("Vector database initialization failed!")
@@ -42,19 +66,48 @@ def read_root():
     return {'Message': 'This is a RAG-architecture based AI application-server'}
 
 @app.post('/chat')
-async def read_chat(request: ChatRequest):
+async def read_chat(request: ChatRequest, deadline: Deadline = Depends(chat_slot)):
     try:
         req: str = request.query
         print(dict({"user_query": req}))
-        response = await question_answer(query=req)
+        response = await question_answer(query=req, deadline=deadline)
 
         if response:
             chat_result = response['result']
             source_documents = response['source_documents']
-            return {"chat_result": chat_result, "source_documents": source_documents}
+            if request.response_mode == "slim":
+                source_documents = compact_source_documents(source_documents)
+            return {"chat_result": chat_result, "source_documents": source_documents,
+                    "partial": response.get("partial", False)}
         else:
             return {"message": "No results found!"}
         
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         Logger.exception("Error in chat retrieval: %s", str(e))  
         return {"message": "An error occurred while retrieving the chat."}
+
+@app.get('/admission')
+async def read_admission():
+    return chat_admission.stats()
+
+@app.get('/deadlines')
+async def read_deadlines():
+    return deadline_metrics.stats()
+
+@app.get('/intents')
+async def read_intents():
+    return intent_router.stats()
+
+@app.get('/sources/{source_id}')
+async def read_source(source_id: str):
+    # Resolved against the collection, so any worker can answer for ids another one handed out
+    if retrieval_client.enabled:
+        document = await retrieval_client.get_chunk(source_id, RETRIEVAL_COLLECTION)
+    else:
+        database = await load_and_initialize_vector_database()
+        document = await asyncio.to_thread(find_source, database, source_id) if database is not None else None
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Unknown source id: {source_id}")
+    return {"id": source_id, "page_content": document.page_content, "metadata": document.metadata}
@@ -1,21 +1,21 @@
+import asyncio
 import logging
 from fastapi import APIRouter, HTTPException
-from app.pdf_processing.pre_processing import process_pdfs_in_folders
+from app.rag_chatbot_pipeline.data_handler.raw_pdfs import RawPDFProcessor
 
 router = APIRouter()
 
 @router.post("/process_pdfs/")
 async def process_pdfs():
-    raw_pdf_folder = "/app/assets/pdfs/raw_pdfs"
-    processed_pdf_folder = "/app/assets/pdfs/processed_pdfs"
+    # Extracts the text of the raw PDFs only; POST /ingest also chunks, embeds and stores it
     try:
-        result = await process_pdfs_in_folders(raw_pdf_folder, processed_pdf_folder)
+        result = await asyncio.to_thread(RawPDFProcessor().process_all_pdfs)
         return result
     except HTTPException as he:
          # Return a dictionary with an error message
-        logging.error(f"Unexpected error during web scraping: {he}")
+        logging.error(f"Unexpected error during PDF processing: {he}")
         return {"error": he.detail}
     except Exception as e:
          # Return a dictionary with an error message
-        logging.error(f"Unexpected error during web scraping: {e}")
+        logging.error(f"Unexpected error during PDF processing: {e}")
         return {"error": "Internal server error"}
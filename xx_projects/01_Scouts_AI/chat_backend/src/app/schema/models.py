@@ -1,4 +1,7 @@
+from typing import Literal
 from pydantic import BaseModel
 
 class ChatRequest(BaseModel):
-    query: str
\ No newline at end of file
+    query: str
+    # "slim" returns compact source references instead of full documents
+    response_mode: Literal["full", "slim"] = "full"
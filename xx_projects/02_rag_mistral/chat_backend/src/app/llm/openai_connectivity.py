@@ -9,6 +9,15 @@ import openai
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', '..', '.env')
 load_dotenv(dotenv_path)
 
+# Base URL of an OpenAI-compatible server to use instead of OpenAI, e.g. http://127.0.0.1:8900/v1 for the
+# load-test stand-in in full_stack_rag_application/chat_backend/benchmarks/openai_standin.py
+OPENAI_STANDIN_URL = os.getenv('OPENAI_STANDIN_URL')
+if OPENAI_STANDIN_URL:
+    # Read by the openai client and by langchain_openai, so every chat, completion and embedding call goes there
+    os.environ['OPENAI_BASE_URL'] = OPENAI_STANDIN_URL
+    os.environ['OPENAI_API_BASE'] = OPENAI_STANDIN_URL
+    os.environ.setdefault('OPENAI_API_KEY', 'standin')
+
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')  # Use getenv to avoid KeyError if variable is not set
 def version_check():
     # Check OpenAI version is correct
@@ -0,0 +1,41 @@
+"""Compacts the vector store: drops duplicate, orphaned and legacy chunks and rebuilds the index files.
+
+Run offline, with the API stopped, as: poetry run python -m app.rag_chatbot_pipeline.data_handler.compaction
+"""
+from typing import Callable, Optional
+from chat_common import compaction
+from app.rag_chatbot_pipeline.data_handler.ingestion_pipeline import PERSIST_DIRECTORY
+from app.rag_chatbot_pipeline.data_handler.raw_pdfs import RawPDFProcessor
+
+import os
+
+import chromadb
+
+
+def open_client(persist_directory: str):
+    return chromadb.PersistentClient(path=persist_directory)
+
+
+def pdf_source_check() -> Callable[[str], bool]:
+    """Returns a check that a source is still in the raw or processed PDF folder."""
+    processor = RawPDFProcessor()
+    return lambda source: any(
+        os.path.exists(os.path.join(folder, os.path.basename(source)))
+        for folder in (processor.raw_pdf_dir, processor.processed_pdf_dir))
+
+
+def compact(persist_directory: str = PERSIST_DIRECTORY, is_live_source: Optional[Callable[[str], bool]] = None,
+            dry_run: bool = False) -> dict:
+    """Compacts the store with `chat_common.compaction.compact`.
+
+    Args:
+        persist_directory (str, optional): The Chroma directory to compact.
+        is_live_source (callable, optional): Tells whether a chunk's source still exists.
+            Defaults to checking the raw and processed PDF folders.
+        dry_run (bool, optional): Only report what would be deleted.
+    """
+    return compaction.compact(persist_directory, open_client, is_live_source or pdf_source_check(), dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    compaction.main(PERSIST_DIRECTORY, open_client, pdf_source_check())
@@ -3,6 +3,7 @@ from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from app.llm.openai_connectivity import OPENAI_API_KEY
 from app.rag_chatbot_pipeline.data_handler.raw_pdfs import RawPDFProcessor
+from app.rag_chatbot_pipeline.data_handler.ingestion_pipeline import PERSIST_DIRECTORY
 from langchain.schema import Document
 import os
 
@@ -67,17 +68,14 @@ def split_documents(documents):
     return database
 
 async def initialize_vector_database():
-    folder_path = os.path.join(os.path.dirname(__file__), "..", "..", "assets", "processed_pdfs")
+    """Opens the vector database as it is, without ingesting anything.
+
+    New and changed PDFs are ingested by jobs submitted through `POST /ingest`
+    (and one at startup), while chat is served from the current index.
+    """
     try:
-        prepare_pdf_data()  # Ensure PDFs are processed
-        
-        docs = load_documents(folder_path)
-        if docs:
-            return split_documents(docs)
-        else:
-            print("No documents were found to initialize the vector database.")
-            return None
+        embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+        return Chroma(persist_directory=PERSIST_DIRECTORY, embedding_function=embeddings)
     except Exception as e:
         print(f"Error initializing vector database: {e}")
         return None
-
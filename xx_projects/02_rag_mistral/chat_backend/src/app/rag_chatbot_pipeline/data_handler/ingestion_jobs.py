@@ -0,0 +1,4 @@
+from chat_common.ingestion_jobs import IngestionJobQueue
+from app.rag_chatbot_pipeline.data_handler.ingestion_pipeline import STAGES, IngestionPipeline
+
+ingestion_jobs = IngestionJobQueue(IngestionPipeline, STAGES)
@@ -0,0 +1,26 @@
+from typing import Optional
+from langchain_openai import OpenAIEmbeddings
+from langchain_community.vectorstores import Chroma
+from chat_common import ingestion_pipeline
+from chat_common.ingestion_pipeline import STAGES
+from app.llm.openai_connectivity import OPENAI_API_KEY
+from app.rag_chatbot_pipeline.data_handler.raw_pdfs import RawPDFProcessor
+
+import os
+
+PERSIST_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "..", "chroma_store")
+CHECKPOINT_PATH = os.path.join(PERSIST_DIRECTORY, "ingestion_checkpoint.json")
+
+
+class IngestionPipeline(ingestion_pipeline.IngestionPipeline):
+    """The shared streaming ingestion over this backend's raw PDFs, OpenAI embeddings and Chroma store."""
+
+    def __init__(self, processor: Optional[RawPDFProcessor] = None, persist_directory: str = PERSIST_DIRECTORY,
+                 checkpoint_path: str = CHECKPOINT_PATH, **options):
+        super().__init__(
+            processor or RawPDFProcessor(),
+            OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY),
+            lambda embeddings: Chroma(persist_directory=persist_directory, embedding_function=embeddings),
+            checkpoint_path,
+            **options,
+        )
@@ -1,20 +1,31 @@
 from langchain.chains import RetrievalQA
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
 
 from langchain.llms import Ollama
 
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.callbacks.manager import CallbackManager
 from app.rag_chatbot_pipeline.data_handler.data_operations import initialize_vector_database
+from chat_common.deadlines import MIN_GENERATION_SECONDS, Deadline, StageTimeout, deadline_metrics, partial_answer
+from chat_common.intent_router import intent_router
+from chat_common.retrieval_client import retrieval_client
+from chat_common.sentence_limit import max_answer_tokens, sentence_limit, stream_answer
 
 from app.llm.openai_connectivity import OPENAI_API_KEY
 
+import os
+
+# Snapshot this backend's store is served under by the retrieval service, used when RETRIEVAL_SERVICE_URL is set
+RETRIEVAL_COLLECTION = os.getenv("RETRIEVAL_COLLECTION", "langchain")
+
 vector_database = None
 
 async def load_and_initialize_vector_database():
     global vector_database
-    if not vector_database:
+    # The retrieval service holds the index, the local store isn't opened
+    if not vector_database and not retrieval_client.enabled:
         # Await the initialization if it's an async function
         vector_database = await initialize_vector_database()
         
@@ -28,9 +39,44 @@ async def load_and_initialize_vector_database():
 
             print(f"Vector database initialized: {type(vector_database)}")
 
-async def question_answer(query: str):
+def chat_retriever():
+    if retrieval_client.enabled:
+        return retrieval_client.as_retriever(RETRIEVAL_COLLECTION)
+    return vector_database.as_retriever()
+
+async def answer_within_deadline(qa: RetrievalQA, query: str, deadline: Deadline):
+    """Runs a "stuff" retrieval QA chain one stage at a time, each within its budget of `deadline`.
+
+    The answer is streamed and stops at the sentence limit of the chain's prompt.
+    When generation can't finish in time the top retrieved passages are returned
+    instead, flagged partial.
+
+    Raises:
+        StageTimeout: If retrieval ran out of time, there is nothing to answer with.
+    """
+    source_documents = await deadline.run("retrieval", qa.retriever.ainvoke(query))
+    llm_chain = qa.combine_documents_chain.llm_chain
+    context = "\n\n".join(document.page_content for document in source_documents)
+    try:
+        result = await deadline.run("generation", stream_answer(
+            llm_chain.prompt | llm_chain.llm | StrOutputParser(), {"context": context, "question": query},
+            sentence_limit(llm_chain.prompt.template)), MIN_GENERATION_SECONDS)
+    except StageTimeout:
+        deadline_metrics.record(degraded=True)
+        return partial_answer(source_documents)
+    deadline_metrics.record(degraded=False)
+
+    return {"result": result, "source_documents": source_documents}
+
+async def question_answer(query: str, deadline: Deadline = None):
+    # Small talk is answered from templates, without retrieval or an LLM call
+    fast_answer = intent_router.answer(query)
+    if fast_answer is not None:
+        return {"result": fast_answer, "source_documents": []}
+
     # Ensure vector database is initialized before running the QA
     await load_and_initialize_vector_database()
+    deadline = deadline or Deadline()
 
     # Define the prompt template
     template = """You are Scout's assistant chatbot. Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer. Use three sentences maximum. Keep the answer as concise as possible. Greet properly in response to a greet.
@@ -41,26 +87,26 @@ async def question_answer(query: str):
 
     # Define the retrieval QA chain using OpenAI's GPT-4
     qa = RetrievalQA.from_chain_type(
-        llm=ChatOpenAI(temperature=0, model_name="gpt-4", openai_api_key=OPENAI_API_KEY),
+        llm=ChatOpenAI(temperature=0, model_name="gpt-4", openai_api_key=OPENAI_API_KEY,
+                       max_tokens=max_answer_tokens(template)),
         chain_type="stuff",
-        retriever=vector_database.as_retriever(),  # Use the retriever
+        retriever=chat_retriever(),  # Use the retriever
         chain_type_kwargs={'prompt': QA_CHAIN_PROMPT},
         return_source_documents=True,
         verbose=True
     )
 
-    # Asynchronously call the QA chain using ainvoke
-    response = await qa.ainvoke({"query": query})
-    
-    # Extract the result and source documents
-    result = response.get("result")
-    source_documents = response.get("source_documents", [])
-    
-    return {"result": result, "source_documents": source_documents}
+    return await answer_within_deadline(qa, query, deadline)
+
+async def question_answer_using_mistral(query: str, deadline: Deadline = None):
+    # Small talk is answered from templates, without retrieval or an LLM call
+    fast_answer = intent_router.answer(query)
+    if fast_answer is not None:
+        return {"result": fast_answer, "source_documents": []}
 
-async def question_answer_using_mistral(query: str):
     # Ensure vector database is initialized before running the QA
     await load_and_initialize_vector_database()
+    deadline = deadline or Deadline()
 
     # Define the prompt template
     template = """You are Scout's assistant chatbot. Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer. Use three sentences maximum. Keep the answer as concise as possible. Greet properly in response to a greet.
@@ -73,6 +119,7 @@ async def question_answer_using_mistral(query: str):
     mistral_llm = Ollama(
         base_url="http://localhost:11434", 
         model="mistral", 
+        num_predict=max_answer_tokens(template),
         verbose=True,
         callback_manager=CallbackManager([StreamingStdOutCallbackHandler()])
     )
@@ -81,17 +128,10 @@ async def question_answer_using_mistral(query: str):
     qa = RetrievalQA.from_chain_type(
         llm=mistral_llm,  # Use the Mistral LLM instead of GPT-4
         chain_type="stuff",
-        retriever=vector_database.as_retriever(),  # Use the retriever
+        retriever=chat_retriever(),  # Use the retriever
         chain_type_kwargs={'prompt': QA_CHAIN_PROMPT},
         return_source_documents=True,
         verbose=True
     )
 
-    # Asynchronously call the QA chain using ainvoke
-    response = await qa.ainvoke({"query": query})
-
-    # Extract the result and source documents
-    result = response.get("result")
-    source_documents = response.get("source_documents", [])
-
-    return {"result": result, "source_documents": source_documents}
+    return await answer_within_deadline(qa, query, deadline)
@@ -1,7 +1,16 @@
-from fastapi import FastAPI, HTTPException
-from app.rag_chatbot_pipeline.interaction_handler.chat_operations import question_answer, question_answer_using_mistral
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from app.rag_chatbot_pipeline.interaction_handler.chat_operations import RETRIEVAL_COLLECTION, question_answer, question_answer_using_mistral
+from chat_common.deadlines import Deadline, StageTimeout, deadline_metrics
+from chat_common.intent_router import intent_router
+from chat_common.source_references import compact_source_documents, find_source
 from app.rag_chatbot_pipeline.data_handler.data_operations import initialize_vector_database
+from app.rag_chatbot_pipeline.data_handler.ingestion_jobs import ingestion_jobs
+from chat_common.retrieval_client import retrieval_client
+from chat_common.admission_control import chat_admission, chat_slot
+from app.routes.ingestion_routes import router as ingestion_routes
 from app.schema.models import ChatRequest
+import asyncio
 import logging
 
 # Logger configuration
@@ -12,12 +21,25 @@ formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-app = FastAPI(title="RAG Chat Application", version="0.1.0")
+app = FastAPI(title="RAG Chat Application", version="0.1.0", default_response_class=ORJSONResponse)
+app.include_router(ingestion_routes)
 vector_database = None
 
+@app.on_event("startup")
+async def startup_event():
+    # Picks up PDFs added while the server was down, chat is served from the current index meanwhile
+    ingestion_jobs.start()
+    ingestion_jobs.submit()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingestion_jobs.stop()
+    await retrieval_client.close()
+
 async def load_and_initialize_vector_database():
     global vector_database
-    if vector_database is None:
+    # The retrieval service holds the index, the local store isn't opened
+    if vector_database is None and not retrieval_client.enabled:
         vector_database = await initialize_vector_database()
         if vector_database is None:
             logger.error("Vector database initialization failed!")
@@ -30,7 +52,7 @@ def read_root():
     return {'Message': 'This is a RAG-architecture based AI application server'}
 
 @app.post("/chat/openai")
-async def chat_with_openai(request: ChatRequest):
+async def chat_with_openai(request: ChatRequest, deadline: Deadline = Depends(chat_slot)):
     """
     Endpoint to chat with OpenAI's GPT-4 model.
     """
@@ -38,22 +60,27 @@ async def chat_with_openai(request: ChatRequest):
         req: str = request.query
         logger.debug(f"Received request for OpenAI: {req}")
         
-        response = await question_answer(req)
+        response = await question_answer(req, deadline=deadline)
 
         if response:
             chat_result = response['result']
             source_documents = response['source_documents']
-            return {"chat_result": chat_result, "source_documents": source_documents}
+            if request.response_mode == "slim":
+                source_documents = compact_source_documents(source_documents)
+            return {"chat_result": chat_result, "source_documents": source_documents,
+                    "partial": response.get("partial", False)}
         else:   
             logger.warning("No results found for OpenAI query.")
             return {"message": "No results found!"}
         
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.exception("Error in chat retrieval with OpenAI: %s", str(e))  
         raise HTTPException(status_code=500, detail="An error occurred while retrieving the chat with OpenAI.")
 
 @app.post("/chat/mistral")
-async def chat_with_mistral(request: ChatRequest):
+async def chat_with_mistral(request: ChatRequest, deadline: Deadline = Depends(chat_slot)):
     """
     Endpoint to chat with Mistral 7B model via Ollama.
     """
@@ -64,16 +91,57 @@ async def chat_with_mistral(request: ChatRequest):
         # Ensure the vector database is initialized
         await load_and_initialize_vector_database()
         
-        response = await question_answer_using_mistral(req)
+        response = await question_answer_using_mistral(req, deadline=deadline)
 
         if response:
             chat_result = response['result']
             source_documents = response['source_documents']
-            return {"chat_result": chat_result, "source_documents": source_documents}
+            if request.response_mode == "slim":
+                source_documents = compact_source_documents(source_documents)
+            return {"chat_result": chat_result, "source_documents": source_documents,
+                    "partial": response.get("partial", False)}
         else:
             logger.warning("No results found for Mistral query.")
             return {"message": "No results found!"}
         
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.exception("Error in chat retrieval with Mistral: %s", str(e))  
         raise HTTPException(status_code=500, detail="An error occurred while retrieving the chat with Mistral.")
+
+@app.get('/admission')
+async def read_admission():
+    """
+    Returns the chat pipelines in flight, the queue depth and how many requests were shed and why.
+    """
+    return chat_admission.stats()
+
+@app.get('/deadlines')
+async def read_deadlines():
+    """
+    Returns how many chat responses were degraded to retrieved passages and which stages ran out of time.
+    """
+    return deadline_metrics.stats()
+
+@app.get('/intents')
+async def read_intents():
+    """
+    Returns how many chat requests the small-talk fast path answered without retrieval or an LLM call.
+    """
+    return intent_router.stats()
+
+@app.get('/sources/{source_id}')
+async def read_source(source_id: str):
+    """
+    Returns the full content of a source referenced by a slim chat response.
+    """
+    # Resolved against the collection, so any worker can answer for ids another one handed out
+    if retrieval_client.enabled:
+        document = await retrieval_client.get_chunk(source_id, RETRIEVAL_COLLECTION)
+    else:
+        database = await load_and_initialize_vector_database()
+        document = await asyncio.to_thread(find_source, database, source_id) if database is not None else None
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Unknown source id: {source_id}")
+    return {"id": source_id, "page_content": document.page_content, "metadata": document.metadata}
@@ -0,0 +1 @@
+"""Request handling shared by the RAG chat backends."""
@@ -0,0 +1,142 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import Header, HTTPException
+from chat_common.deadlines import CHAT_DEADLINE_SECONDS, Deadline
+
+import asyncio
+import math
+import os
+import time
+
+# Chat pipelines running at once per worker, each holds an LLM call and its retrieval
+CHAT_MAX_IN_FLIGHT = int(os.getenv("CHAT_MAX_IN_FLIGHT", "16"))
+CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", "64"))
+# Starting guess of one pipeline's duration, replaced by the measured average as requests complete
+CHAT_EXPECTED_SERVICE_SECONDS = float(os.getenv("CHAT_EXPECTED_SERVICE_SECONDS", "5"))
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+class AdmissionController:
+    """Caps the chat pipelines in flight and sheds load before it turns into timeouts.
+
+    Requests beyond `max_in_flight` wait in a FIFO queue. A request is rejected
+    straight away, with a Retry-After, when the queue is full (503) or when its
+    expected queue wait plus the average pipeline time would already overrun its
+    deadline (429). A queued request whose deadline can no longer be met is
+    dropped from the queue the same way. Admitted requests therefore finish in
+    time, and throughput stays at capacity under overload instead of every
+    request timing out together.
+    """
+
+    def __init__(self, max_in_flight: int = CHAT_MAX_IN_FLIGHT, max_queue: int = CHAT_MAX_QUEUE,
+                 deadline: float = CHAT_DEADLINE_SECONDS, expected_service_time: float = CHAT_EXPECTED_SERVICE_SECONDS):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.service_time = expected_service_time
+        self.in_flight = 0
+        self._waiters: deque = deque()
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = {"queue_full": 0, "deadline": 0, "expired_in_queue": 0}
+        self.total_queue_wait = 0.0
+
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: int) -> float:
+        """Seconds until the request at `position` in the queue (0 = head) gets a slot."""
+        return (position + 1) * self.service_time / self.max_in_flight
+
+    def _reject(self, status_code: int, reason: str, detail: str):
+        self.rejected[reason] += 1
+        retry_after = max(1, math.ceil(self.expected_wait(self.queue_depth())))
+        raise HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(retry_after)})
+
+    @asynccontextmanager
+    async def admit(self, deadline: Optional[float] = None):
+        """Holds a pipeline slot for the duration of the block, which gets the request's `Deadline`.
+
+        Args:
+            deadline (float, optional): Seconds the client is willing to wait in total. Defaults to `self.deadline`.
+
+        Raises:
+            HTTPException: 503 when the queue is full, 429 when the deadline can't be met. Both carry Retry-After.
+        """
+        loop = asyncio.get_running_loop()
+        arrived = time.monotonic()
+        deadline_at = arrived + (deadline or self.deadline)
+
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+        else:
+            if self.queue_depth() >= self.max_queue:
+                self._reject(503, "queue_full", "Too many chat requests queued, try again later")
+            if arrived + self.expected_wait(self.queue_depth()) + self.service_time > deadline_at:
+                self._reject(429, "deadline", "The chat queue is longer than the request deadline allows")
+            await self._wait(loop, deadline_at)
+
+        self.admitted += 1
+        started = time.monotonic()
+        self.total_queue_wait += started - arrived
+        try:
+            yield Deadline(expires_at=deadline_at)
+        finally:
+            self.service_time += SERVICE_TIME_SMOOTHING * (time.monotonic() - started - self.service_time)
+            self.completed += 1
+            self._release()
+
+    async def _wait(self, loop, deadline_at: float):
+        slot = loop.create_future()
+        self._waiters.append(slot)
+        # Give up once the pipeline could no longer finish before the deadline
+        timeout = max(0.0, deadline_at - time.monotonic() - self.service_time)
+        try:
+            await asyncio.wait_for(asyncio.shield(slot), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if slot.done() and not slot.cancelled():
+                if isinstance(e, asyncio.CancelledError):
+                    self._release()  # handed a slot while the client went away
+                    raise
+                return  # the slot arrived just as the timeout fired
+            slot.cancel()
+            self._waiters.remove(slot)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._reject(503, "expired_in_queue", "The chat request waited too long in the queue")
+
+    def _release(self):
+        # Hand the slot straight to the next waiter so nobody can jump the queue
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queue_depth": self.queue_depth(),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected": dict(self.rejected),
+            "average_queue_wait_seconds": round(self.total_queue_wait / self.admitted, 3) if self.admitted else 0.0,
+            "average_service_seconds": round(self.service_time, 3),
+        }
+
+
+chat_admission = AdmissionController()
+
+
+async def chat_slot(x_deadline_ms: Optional[float] = Header(None)):
+    """Route dependency that holds a chat pipeline slot until the response is ready and gives the request's `Deadline`.
+
+    Clients may shorten or extend the default deadline with an `X-Deadline-Ms` header.
+    The deadline starts when the request arrives, time spent queued counts against it.
+    """
+    async with chat_admission.admit(x_deadline_ms / 1000 if x_deadline_ms else None) as deadline:
+        yield deadline
@@ -0,0 +1,168 @@
+"""Compacts a Chroma store: drops duplicate, orphaned and legacy chunks and rebuilds the index files.
+
+Each backend runs it through its own `app.rag_chatbot_pipeline.data_handler.compaction`, which knows
+where its store is and which sources still exist.
+"""
+from typing import Callable, List, Optional
+from chat_common.ingestion_pipeline import chunk_hash
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+
+PAGE_SIZE = 1000
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def _records(collection, include):
+    for offset in range(0, collection.count(), PAGE_SIZE):
+        page = collection.get(include=include, limit=PAGE_SIZE, offset=offset)
+        for index, id in enumerate(page["ids"]):
+            yield id, {key: page[key][index] for key in include}
+
+
+def redundant_chunk_ids(collection, is_live_source: Callable[[str], bool]) -> dict:
+    """Returns the ids of the chunks compaction deletes, by reason.
+
+    - duplicate: a chunk stored more than once. Rows with the same `chunk_id` are one
+      chunk, the row whose id is its `chunk_id` is kept. Rows without one were written
+      on every restart before chunk ids were deterministic: they go when a chunk with an
+      id holds the same text of the same source and page, all but one otherwise. The same
+      text at two offsets has two chunk ids, both are kept.
+    - orphaned: chunks of sources that no longer exist.
+    - unsourced: chunks without a source, written before sources were recorded. Only
+      dropped when the collection also holds sourced chunks, i.e. it was re-ingested.
+    """
+    kept, duplicate, orphaned, unsourced, sourced = {}, [], [], [], 0
+    legacy, identified_texts = {}, set()
+    for id, record in _records(collection, ["metadatas", "documents"]):
+        metadata = record["metadatas"] or {}
+        source = metadata.get("source")
+        if source is None:
+            unsourced.append(id)
+            continue
+        sourced += 1
+        if not is_live_source(source):
+            orphaned.append(id)
+            continue
+        text = (source, metadata.get("page"), metadata.get("content_hash") or chunk_hash(record["documents"] or ""))
+        key = metadata.get("chunk_id")
+        if key is None:
+            legacy.setdefault(text, []).append(id)
+            continue
+        identified_texts.add(text)
+        if key not in kept:
+            kept[key] = id
+        elif id == key:
+            duplicate.append(kept[key])
+            kept[key] = id
+        else:
+            duplicate.append(id)
+
+    for text, ids in legacy.items():
+        duplicate.extend(ids if text in identified_texts else ids[1:])
+
+    return {"duplicate": duplicate, "orphaned": orphaned, "unsourced": unsourced if sourced else []}
+
+
+def rebuild_collection(client, name: str, metadata: Optional[dict] = None) -> int:
+    """Copies a collection into a fresh one and swaps it in, so deleted entries stop taking space in the index.
+
+    Args:
+        client: The Chroma client.
+        name (str): The collection to rebuild.
+        metadata (dict, optional): Metadata of the rebuilt collection, e.g. new HNSW parameters, which Chroma
+            only applies when an index is created. Defaults to the collection's current metadata.
+
+    Returns:
+        int: The number of chunks copied.
+    """
+    temporary_name = f"{name}_compacting"
+    collection = client.get_collection(name)
+    try:
+        client.delete_collection(temporary_name)
+    except ValueError:
+        pass
+    rebuilt = client.create_collection(temporary_name, metadata=metadata or collection.metadata)
+
+    copied = 0
+    for offset in range(0, collection.count(), PAGE_SIZE):
+        page = collection.get(include=["embeddings", "documents", "metadatas"], limit=PAGE_SIZE, offset=offset)
+        if page["ids"]:
+            rebuilt.add(ids=page["ids"], embeddings=page["embeddings"], documents=page["documents"], metadatas=page["metadatas"])
+            copied += len(page["ids"])
+
+    client.delete_collection(name)
+    rebuilt.modify(name=name)
+    return copied
+
+
+def vacuum(persist_directory: str):
+    database_path = os.path.join(persist_directory, "chroma.sqlite3")
+    if os.path.exists(database_path):
+        connection = sqlite3.connect(database_path)
+        connection.execute("VACUUM")
+        connection.close()
+
+
+def compact(persist_directory: str, open_client: Callable[[str], object], is_live_source: Callable[[str], bool],
+            dry_run: bool = False) -> dict:
+    """Deletes redundant chunks from every collection, rebuilds the changed ones and vacuums the store.
+
+    Args:
+        persist_directory (str): The Chroma directory to compact.
+        open_client (callable): Opens the backend's Chroma client on the directory. The client is
+            released before vacuuming.
+        is_live_source (callable): Tells whether a chunk's source still exists.
+        dry_run (bool, optional): Only report what would be deleted.
+
+    Returns:
+        dict: Deleted chunks per collection and reason, and the store size before and after.
+    """
+    bytes_before = directory_size(persist_directory)
+    client = open_client(persist_directory)
+    report = {"collections": {}}
+
+    for collection in client.list_collections():
+        name = collection.name
+        if name.endswith("_compacting"):
+            # Left over from an interrupted rebuild: finish the swap if the original is gone
+            original = name[:-len("_compacting")]
+            if original not in [c.name for c in client.list_collections()] and not dry_run:
+                collection.modify(name=original)
+            continue
+
+        deleted = redundant_chunk_ids(collection, is_live_source)
+        report["collections"][name] = {reason: len(ids) for reason, ids in deleted.items()}
+        ids = [id for reason_ids in deleted.values() for id in reason_ids]
+        if ids and not dry_run:
+            for start in range(0, len(ids), PAGE_SIZE):
+                collection.delete(ids=ids[start:start + PAGE_SIZE])
+            report["collections"][name]["kept"] = rebuild_collection(client, name)
+
+    del client
+    if not dry_run:
+        vacuum(persist_directory)
+
+    bytes_after = directory_size(persist_directory)
+    report.update(bytes_before=bytes_before, bytes_after=bytes_after, bytes_reclaimed=bytes_before - bytes_after)
+    return report
+
+
+def main(default_persist_directory: str, open_client: Callable[[str], object], is_live_source: Callable[[str], bool],
+         argv: Optional[List[str]] = None):
+    """Command line of the backends' compaction modules."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--persist-directory", default=default_persist_directory)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    result = compact(args.persist_directory, open_client, is_live_source, dry_run=args.dry_run)
+    print(json.dumps(result, indent=2))
+    print(f"Reclaimed {result['bytes_reclaimed'] / 1024 / 1024:.1f} MB")
@@ -0,0 +1,103 @@
+from typing import Awaitable, List, Optional, TypeVar
+from langchain_core.documents import Document
+
+import asyncio
+import os
+import threading
+import time
+
+# Time a client waits for an answer unless it sends its own X-Deadline-Ms
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+# Longest each stage of a chat request may take, further capped by what is left of the request's deadline
+STAGE_BUDGETS = {
+    "retrieval": float(os.getenv("RETRIEVAL_BUDGET_SECONDS", "3")),
+    "compression": float(os.getenv("COMPRESSION_BUDGET_SECONDS", "6")),
+    "generation": float(os.getenv("GENERATION_BUDGET_SECONDS", "20")),
+}
+# The LLM isn't called with less time than this left, it couldn't answer in time anyway
+MIN_GENERATION_SECONDS = float(os.getenv("MIN_GENERATION_SECONDS", "1"))
+# Passages returned in place of an answer the LLM couldn't finish
+PARTIAL_PASSAGES = 3
+PARTIAL_ANSWER = "I couldn't finish an answer in time. These are the most relevant passages I found."
+
+T = TypeVar("T")
+
+
+class StageTimeout(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"The {stage} stage ran out of time")
+        self.stage = stage
+
+
+class DeadlineMetrics:
+    """Counts chat responses, the degraded ones among them and the stages that ran out of time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = 0
+        self.degraded = 0
+        self.timeouts = {stage: 0 for stage in STAGE_BUDGETS}
+
+    def timed_out(self, stage: str):
+        with self._lock:
+            self.timeouts[stage] += 1
+
+    def record(self, degraded: bool):
+        with self._lock:
+            self.responses += 1
+            self.degraded += int(degraded)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "responses": self.responses,
+                "degraded": self.degraded,
+                "degraded_rate": round(self.degraded / self.responses, 4) if self.responses else 0.0,
+                "stage_timeouts": dict(self.timeouts),
+                "stage_budgets_seconds": dict(STAGE_BUDGETS),
+            }
+
+
+deadline_metrics = DeadlineMetrics()
+
+
+class Deadline:
+    """End-to-end deadline of one chat request, handed out to its stages as budgets.
+
+    A stage gets its own budget from STAGE_BUDGETS or whatever is left of the
+    request, whichever is shorter, so a slow stage can't starve the later ones of
+    more than its share and nothing runs past the deadline.
+    """
+
+    def __init__(self, seconds: float = CHAT_DEADLINE_SECONDS, expires_at: Optional[float] = None):
+        self.expires_at = expires_at if expires_at is not None else time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, stage: str) -> float:
+        return min(STAGE_BUDGETS[stage], self.remaining())
+
+    async def run(self, stage: str, awaitable: Awaitable[T], min_seconds: float = 0.0) -> T:
+        """Awaits a stage within its budget, cancelling it when it runs over.
+
+        A stage whose budget is below `min_seconds` isn't started at all.
+
+        Raises:
+            StageTimeout: If the stage didn't finish within its budget.
+        """
+        if self.budget(stage) < min_seconds:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            deadline_metrics.timed_out(stage)
+            raise StageTimeout(stage)
+        try:
+            return await asyncio.wait_for(awaitable, self.budget(stage))
+        except asyncio.TimeoutError:
+            deadline_metrics.timed_out(stage)
+            raise StageTimeout(stage) from None
+
+
+def partial_answer(passages: List[Document]) -> dict:
+    """The response given when generation would miss the deadline: the top retrieved passages, flagged partial."""
+    return {"result": PARTIAL_ANSWER, "source_documents": passages[:PARTIAL_PASSAGES], "partial": True}
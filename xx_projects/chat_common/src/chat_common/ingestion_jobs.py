@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional
+
+import asyncio
+import logging
+import time
+import uuid
+
+MAX_FINISHED_JOBS = 100
+
+
+@dataclass
+class IngestionJob:
+    job_id: str
+    status: str = "queued"  # "queued", "running", "succeeded" or "failed"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    pipeline: Any = None
+    error: Optional[str] = None
+    stages: List[str] = field(default_factory=list)
+
+    def report(self) -> dict:
+        """Status, per-stage counts and throughput, docs from the first stage and chunks from the last."""
+        progress = self.pipeline.progress if self.pipeline else None
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        counts = progress.stage_counts if progress else dict.fromkeys(self.stages, 0)
+        # Errors of single sources, then what made the whole job fail
+        errors = list(progress.errors) if progress else []
+        if self.error:
+            errors.append(self.error)
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(elapsed, 3),
+            "stages": counts,
+            "docs_per_second": round(counts[self.stages[0]] / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_second": round(counts[self.stages[-1]] / elapsed, 2) if elapsed else 0.0,
+            "skipped_sources": progress.skipped_sources if progress else 0,
+            "deleted_chunks": progress.deleted_chunks if progress else 0,
+            "errors": errors,
+        }
+
+
+class IngestionJobQueue:
+    """Runs ingestion jobs one at a time on a background task.
+
+    Jobs write to the same collection the chat routes read from: upserts and
+    stale-chunk deletions land as each batch completes, so chat keeps being
+    answered from the current index while a job runs. A job submitted while
+    another one is still queued is merged into it, since it would do the
+    same work.
+
+    `pipeline_factory` builds each job's pipeline: an object with an async `run()`
+    and a `progress` holding `stage_counts` (keyed by `stages`), `errors`,
+    `skipped_sources` and `deleted_chunks`.
+    """
+
+    def __init__(self, pipeline_factory: Callable[[], Any], stages: List[str]):
+        self.pipeline_factory = pipeline_factory
+        self.stages = stages
+        self.jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def submit(self) -> IngestionJob:
+        queued = next((job for job in self.jobs.values() if job.status == "queued"), None)
+        if queued:
+            return queued
+        job = IngestionJob(uuid.uuid4().hex[:12], stages=self.stages)
+        self.jobs[job.job_id] = job
+        self._queue.put_nowait(job)
+        self._forget_finished()
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self.jobs.get(job_id)
+
+    def _forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in ("succeeded", "failed")]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            job.status, job.started_at = "running", time.time()
+            try:
+                job.pipeline = self.pipeline_factory()
+                await job.pipeline.run()
+                job.status = "succeeded"
+            except Exception as e:
+                logging.exception(f"Ingestion job {job.job_id} failed")
+                job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+            finally:
+                job.finished_at = time.time()
@@ -0,0 +1,346 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+# Items buffered between two stages, enough to keep the embedder busy without holding the corpus in memory
+STAGE_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "128"))
+STAGES = ["extract", "clean", "chunk", "dedupe", "embed", "upsert"]
+
+_DONE = object()
+
+
+@dataclass
+class SourceText:
+    source: str
+    fingerprint: str
+    text: str
+
+
+@dataclass
+class Chunk:
+    chunk_id: str
+    source: str
+    fingerprint: str
+    index: int
+    text: str
+    metadata: dict
+    digest: str
+
+
+@dataclass
+class SourceEnd:
+    """Marks that every chunk of a source has been sent down the pipeline."""
+    source: str
+    fingerprint: str
+    chunk_ids: List[str]
+
+
+@dataclass
+class EmbeddedBatch:
+    items: list
+    embeddings: List[List[float]]
+
+
+@dataclass
+class IngestionProgress:
+    stage_counts: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(STAGES, 0))
+    errors: List[str] = field(default_factory=list)
+    skipped_sources: int = 0
+    deleted_chunks: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+
+def file_fingerprint(path: str) -> str:
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_id(source: str, offset: int, digest: str) -> str:
+    """Returns the id of a chunk, stable for as long as the source has the same text at the same offset.
+
+    Re-ingesting a source then upserts its unchanged chunks onto themselves
+    instead of adding another copy.
+    """
+    return hashlib.sha256(f"{source}\x00{offset}\x00{digest}".encode("utf-8")).hexdigest()[:32]
+
+
+def clean_text(text: str) -> str:
+    """Joins words hyphenated across line breaks, strips every line and collapses blank lines."""
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    lines = [" ".join(line.split()) for line in text.splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+class IngestionCheckpoint:
+    """Sources (and how far into them) whose chunks are already in the vector store.
+
+    Written atomically after every upserted batch, so a crashed run resumes
+    after the last batch it stored instead of starting over.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sources: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.sources = json.load(file).get("sources", {})
+
+    def is_done(self, source: str, fingerprint: str) -> bool:
+        entry = self.sources.get(source)
+        return bool(entry and entry["fingerprint"] == fingerprint and entry["done"])
+
+    def resume_index(self, source: str, fingerprint: str) -> int:
+        """Returns the index of the first chunk of the source that still has to be stored."""
+        entry = self.sources.get(source)
+        if not entry or entry["fingerprint"] != fingerprint:
+            return 0
+        return entry["next_index"]
+
+    def advance(self, source: str, fingerprint: str, next_index: int):
+        entry = self.sources.get(source)
+        if not entry or entry["fingerprint"] != fingerprint:
+            entry = self.sources[source] = {"fingerprint": fingerprint, "next_index": 0, "done": False}
+        entry["next_index"] = max(entry["next_index"], next_index)
+
+    def finish(self, source: str, fingerprint: str):
+        self.advance(source, fingerprint, 0)
+        self.sources[source]["done"] = True
+
+    def forget(self, source: str):
+        self.sources.pop(source, None)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump({"sources": self.sources, "saved_at": time.time()}, file)
+        os.replace(temporary_path, self.path)
+
+
+class IngestionPipeline:
+    """Streaming extract -> clean -> chunk -> dedupe -> embed -> upsert ingestion.
+
+    Every stage runs as its own task connected to the next by a bounded queue,
+    so PDF parsing and chunking (in worker threads) overlap the embedding calls
+    and only a few batches are in memory at any time. A checkpoint is saved
+    after every upserted batch and sources it records as done are skipped, so
+    rerunning after a failure resumes where the last run stopped.
+
+    Chunk ids are derived from source, offset and content (`chunk_id`), so
+    unchanged chunks of a changed source are neither re-embedded nor stored
+    twice. Once a changed source is fully stored, its chunks that no longer
+    exist are deleted, as are the chunks of sources that disappeared.
+
+    Each backend passes in what differs between them:
+
+    - processor: its raw PDF processor, with `raw_pdf_dir`, `processed_pdf_dir`,
+      `get_raw_pdf_files()` and `process_pdf(name)` returning the `text_file` it wrote.
+    - embeddings: the embedding model of its store.
+    - open_vector_store: opens its LangChain Chroma store with those embeddings.
+    """
+
+    def __init__(self, processor, embeddings: Embeddings, open_vector_store: Callable[[Embeddings], Any],
+                 checkpoint_path: str, embed_batch_size: int = EMBED_BATCH_SIZE, queue_size: int = STAGE_QUEUE_SIZE,
+                 chunk_size: int = 2000, chunk_overlap: int = 250):
+        self.processor = processor
+        self.open_vector_store = open_vector_store
+        self.checkpoint = IngestionCheckpoint(checkpoint_path)
+        self.embed_batch_size = embed_batch_size
+        self.queue_size = queue_size
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
+        self.embeddings = embeddings
+        self.progress = IngestionProgress()
+        self.vector_database = None
+
+    def _sources(self) -> List[str]:
+        """Raw PDFs, plus processed text files that have no raw PDF (anymore)."""
+        raw_pdfs = []
+        if os.path.exists(self.processor.raw_pdf_dir):
+            raw_pdfs = [os.path.join(self.processor.raw_pdf_dir, name) for name in self.processor.get_raw_pdf_files()]
+        extracted = {os.path.basename(path).replace(".pdf", "_text.txt") for path in raw_pdfs}
+        texts = [os.path.join(self.processor.processed_pdf_dir, name) for name in os.listdir(self.processor.processed_pdf_dir)
+                 if name.endswith(".txt") and name not in extracted]
+        return sorted(raw_pdfs) + sorted(texts)
+
+    def _read(self, path: str) -> str:
+        if path.endswith(".pdf"):
+            # Keeps writing the processed text file, as the batch processor did
+            result = self.processor.process_pdf(os.path.basename(path))
+            path = result["text_file"]
+        with open(path, "r", encoding="utf-8") as file:
+            return file.read()
+
+    async def _extract(self, output: asyncio.Queue):
+        for path in self._sources():
+            source = os.path.basename(path)
+            fingerprint = file_fingerprint(path)
+            if self.checkpoint.is_done(source, fingerprint):
+                self.progress.skipped_sources += 1
+                continue
+            try:
+                text = await asyncio.to_thread(self._read, path)
+            except Exception as e:
+                logging.error(f"Error extracting {source}: {e}")
+                self.progress.errors.append(f"extract {source}: {e}")
+                continue
+            self.progress.stage_counts["extract"] += 1
+            await output.put(SourceText(source, fingerprint, text))
+        await output.put(_DONE)
+
+    async def _clean(self, input: asyncio.Queue, output: asyncio.Queue):
+        while (item := await input.get()) is not _DONE:
+            item.text = await asyncio.to_thread(clean_text, item.text)
+            self.progress.stage_counts["clean"] += 1
+            await output.put(item)
+        await output.put(_DONE)
+
+    async def _chunk(self, input: asyncio.Queue, output: asyncio.Queue):
+        while (item := await input.get()) is not _DONE:
+            documents = await asyncio.to_thread(self.splitter.create_documents, [item.text], [{"source": item.source}])
+            digests = [chunk_hash(document.page_content) for document in documents]
+            chunk_ids = [chunk_id(item.source, document.metadata["start_index"], digest)
+                         for document, digest in zip(documents, digests)]
+            # Chunks stored before an interruption are skipped, splitting is deterministic
+            for index in range(self.checkpoint.resume_index(item.source, item.fingerprint), len(documents)):
+                metadata = {**documents[index].metadata, "chunk_id": chunk_ids[index], "content_hash": digests[index]}
+                await output.put(Chunk(chunk_ids[index], item.source, item.fingerprint, index,
+                                       documents[index].page_content, metadata, digests[index]))
+                self.progress.stage_counts["chunk"] += 1
+            await output.put(SourceEnd(item.source, item.fingerprint, chunk_ids))
+        await output.put(_DONE)
+
+    async def _dedupe(self, input: asyncio.Queue, output: asyncio.Queue, stored_ids: set):
+        seen_hashes = set()
+        while (item := await input.get()) is not _DONE:
+            if isinstance(item, Chunk):
+                # Chunks already stored under the same id need no new embedding,
+                # and text repeated across sources is only stored once per run
+                if item.chunk_id in stored_ids or item.digest in seen_hashes:
+                    continue
+                seen_hashes.add(item.digest)
+                self.progress.stage_counts["dedupe"] += 1
+            await output.put(item)
+        await output.put(_DONE)
+
+    async def _embed(self, input: asyncio.Queue, output: asyncio.Queue):
+        items, chunks, done = [], 0, False
+        while not done:
+            item = await input.get()
+            if item is _DONE:
+                done = True
+            else:
+                items.append(item)
+                chunks += isinstance(item, Chunk)
+            if items and (done or chunks >= self.embed_batch_size):
+                texts = [item.text for item in items if isinstance(item, Chunk)]
+                embeddings = await self.embeddings.aembed_documents(texts) if texts else []
+                self.progress.stage_counts["embed"] += len(texts)
+                await output.put(EmbeddedBatch(items, embeddings))
+                items, chunks = [], 0
+        await output.put(_DONE)
+
+    async def _upsert(self, input: asyncio.Queue):
+        while (batch := await input.get()) is not _DONE:
+            chunks = [item for item in batch.items if isinstance(item, Chunk)]
+            if chunks:
+                await asyncio.to_thread(
+                    self.vector_database._collection.upsert,
+                    ids=[chunk.chunk_id for chunk in chunks],
+                    embeddings=batch.embeddings,
+                    documents=[chunk.text for chunk in chunks],
+                    metadatas=[chunk.metadata for chunk in chunks],
+                )
+                self.progress.stage_counts["upsert"] += len(chunks)
+
+            for item in batch.items:
+                if isinstance(item, Chunk):
+                    self.checkpoint.advance(item.source, item.fingerprint, item.index + 1)
+                else:
+                    # All current chunks of the source are stored, drop the ones of its previous version
+                    self.progress.deleted_chunks += await asyncio.to_thread(self._delete_chunks, item.source, set(item.chunk_ids))
+                    self.checkpoint.finish(item.source, item.fingerprint)
+            await asyncio.to_thread(self.checkpoint.save)
+
+    def _stored_ids(self) -> set:
+        return set(self.vector_database._collection.get(include=[])["ids"])
+
+    def _delete_chunks(self, source: str, keep_ids: set = frozenset()) -> int:
+        """Deletes the chunks of a source except `keep_ids`, returning how many were deleted."""
+        ids = self.vector_database._collection.get(where={"source": source}, include=[])["ids"]
+        stale = [id for id in ids if id not in keep_ids]
+        if stale:
+            self.vector_database._collection.delete(ids=stale)
+        return len(stale)
+
+    def _delete_vanished_sources(self, sources: List[str]):
+        current = {os.path.basename(path) for path in sources}
+        for source in [source for source in self.checkpoint.sources if source not in current]:
+            self.progress.deleted_chunks += self._delete_chunks(source)
+            self.checkpoint.forget(source)
+            logging.info(f"Deleted the chunks of vanished source {source}")
+        self.checkpoint.save()
+
+    async def run(self):
+        """Runs the pipeline to completion and returns the vector store.
+
+        Raises:
+            Exception: The first error of the embed or upsert stages. Everything
+                upserted before it is kept and recorded in the checkpoint.
+        """
+        self.vector_database = await asyncio.to_thread(self.open_vector_store, self.embeddings)
+        stored_ids = await asyncio.to_thread(self._stored_ids)
+
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(len(STAGES) - 1)]
+        stages = [
+            self._extract(queues[0]),
+            self._clean(queues[0], queues[1]),
+            self._chunk(queues[1], queues[2]),
+            self._dedupe(queues[2], queues[3], stored_ids),
+            self._embed(queues[3], queues[4]),
+            self._upsert(queues[4]),
+        ]
+        tasks = []
+
+        async def run_stage(position: int, stage):
+            try:
+                await stage
+            except Exception:
+                # Stop feeding the failed stage, but let the stages after it store what already got past it
+                for upstream in tasks[:position]:
+                    upstream.cancel()
+                if position < len(queues):
+                    await queues[position].put(_DONE)
+                raise
+
+        tasks.extend(asyncio.create_task(run_stage(position, stage)) for position, stage in enumerate(stages))
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.progress.finished_at = time.monotonic()
+
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            self.progress.errors.append(f"{type(errors[0]).__name__}: {errors[0]}")
+            raise errors[0]
+
+        await asyncio.to_thread(self._delete_vanished_sources, self._sources())
+        logging.info(f"Ingestion finished: {self.progress.stage_counts}, {self.progress.skipped_sources} sources unchanged, "
+                     f"{self.progress.deleted_chunks} stale chunks deleted")
+        return self.vector_database
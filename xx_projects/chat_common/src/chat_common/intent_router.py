@@ -0,0 +1,152 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import math
+import os
+import random
+import re
+import threading
+
+# Set to "false" to send every message through retrieval and the LLM
+INTENT_FAST_PATH = os.getenv("INTENT_FAST_PATH", "true").lower() == "true"
+# Cosine similarity of character trigrams a message needs with a canned example
+INTENT_MATCH_THRESHOLD = float(os.getenv("INTENT_MATCH_THRESHOLD", "0.7"))
+# Longer messages are real questions even when they open with a greeting
+MAX_SMALL_TALK_WORDS = 6
+
+NON_WORD_PATTERN = re.compile(r"[^a-z' ]+")
+REPEATED_LETTER_PATTERN = re.compile(r"(\w)\1{2,}")
+
+
+@dataclass
+class Intent:
+    name: str
+    # Whole-message patterns, checked before the nearest-neighbour match
+    pattern: str
+    examples: List[str]
+    responses: List[str]
+
+
+INTENTS = [
+    Intent(
+        "greeting",
+        r"(hi|hii|hello|hey|heya|hiya|yo|greetings|salam|salaam|assalam ?o ?alaikum|assalamu ?alaikum|aoa|good (morning|afternoon|evening|day))( there| all| everyone| bot)?",
+        ["hi", "hello", "hey there", "hello there", "hi bot", "good morning", "good evening", "good afternoon",
+         "assalam o alaikum", "salam", "greetings", "hey hello", "helo", "hellow", "hi there"],
+        ["Hello! How can I help you today?", "Hi there! What would you like to know?"],
+    ),
+    Intent(
+        "thanks",
+        r"(thanks|thank you|thankyou|thx|ty|many thanks|much appreciated)( (so|very) much| a lot| again)?",
+        ["thanks", "thank you", "thank you so much", "thanks a lot", "many thanks", "thx", "appreciate it",
+         "thank you very much", "thanks for the help", "thanks for your help", "thnks", "thanx", "thank u"],
+        ["You're welcome! Let me know if there is anything else I can help with.", "Happy to help!"],
+    ),
+    Intent(
+        "goodbye",
+        r"(bye|goodbye|bye bye|see you|see ya|take care|good night)( later| soon)?",
+        ["bye", "goodbye", "see you later", "take care", "bye bye", "good night", "see you soon", "bye for now"],
+        ["Goodbye! Feel free to come back with more questions.", "Take care!"],
+    ),
+    Intent(
+        "how_are_you",
+        r"(how are you|how are you doing|how r u|how's it going|hows it going|how do you do)( today)?",
+        ["how are you", "how are you doing", "how is it going", "how do you do", "how are you today", "how are u"],
+        ["I'm doing well, thanks for asking! How can I help you?"],
+    ),
+    Intent(
+        "acknowledgement",
+        r"(ok|okay|k|cool|great|nice|got it|alright|sure|perfect|awesome|fine)",
+        ["ok", "okay", "got it", "alright", "great", "cool", "nice", "perfect", "ok thanks", "okay great", "okay then"],
+        ["Great! Let me know if you have any other questions."],
+    ),
+]
+
+
+def normalize_message(text: str) -> str:
+    text = REPEATED_LETTER_PATTERN.sub(r"\1", text.lower().replace("’", "'"))  # "hiiii" -> "hi"
+    return " ".join(NON_WORD_PATTERN.sub(" ", text).split())
+
+
+def trigrams(text: str) -> Counter:
+    padded = f" {text} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def cosine(a: Counter, b: Counter, norm_a: float, norm_b: float) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b[gram] for gram, count in a.items() if gram in b) / (norm_a * norm_b or 1.0)
+
+
+@dataclass
+class IntentMatch:
+    intent: Intent
+    score: float
+    # "rule" for a keyword pattern, "neighbour" for the nearest canned example
+    method: str
+
+
+class IntentRouter:
+    """Recognises small talk locally so it can be answered without retrieval or an LLM call.
+
+    A message matches when it is short and either fully matches an intent's
+    keyword pattern or is close enough, by character trigram cosine similarity,
+    to one of its canned examples. The trigrams tolerate typos and stretched
+    words that the patterns miss.
+    """
+
+    def __init__(self, intents: List[Intent] = INTENTS, threshold: float = INTENT_MATCH_THRESHOLD,
+                 max_words: int = MAX_SMALL_TALK_WORDS, enabled: bool = INTENT_FAST_PATH):
+        self.intents = intents
+        self.threshold = threshold
+        self.max_words = max_words
+        self.enabled = enabled
+        self.rules = [(re.compile(rf"^(?:{intent.pattern})$"), intent) for intent in intents]
+        self.examples: List[Tuple[Counter, float, Intent]] = []
+        for intent in intents:
+            for example in intent.examples:
+                grams = trigrams(normalize_message(example))
+                self.examples.append((grams, math.sqrt(sum(c * c for c in grams.values())), intent))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.short_circuited: Dict[str, int] = {intent.name: 0 for intent in intents}
+
+    def classify(self, text: str) -> Optional[IntentMatch]:
+        message = normalize_message(text)
+        if not message or len(message.split()) > self.max_words:
+            return None
+
+        for rule, intent in self.rules:
+            if rule.match(message):
+                return IntentMatch(intent, 1.0, "rule")
+
+        grams = trigrams(message)
+        norm = math.sqrt(sum(c * c for c in grams.values()))
+        score, intent = max(((cosine(grams, example, norm, example_norm), intent)
+                             for example, example_norm, intent in self.examples), key=lambda scored: scored[0])
+        return IntentMatch(intent, score, "neighbour") if score >= self.threshold else None
+
+    def answer(self, text: str) -> Optional[str]:
+        """Returns a templated reply for small talk, or None when the message needs the RAG chain."""
+        match = self.classify(text) if self.enabled else None
+        with self._lock:
+            self.requests += 1
+            if match:
+                self.short_circuited[match.intent.name] += 1
+        return random.choice(match.intent.responses) if match else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            short_circuited = sum(self.short_circuited.values())
+            return {
+                "enabled": self.enabled,
+                "requests": self.requests,
+                "short_circuited": short_circuited,
+                "short_circuit_rate": round(short_circuited / self.requests, 4) if self.requests else 0.0,
+                "by_intent": dict(self.short_circuited),
+            }
+
+
+intent_router = IntentRouter()
@@ -0,0 +1,163 @@
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+from langchain_core.documents import Document
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+import asyncio
+import os
+import threading
+import time
+
+import httpx
+
+# Base URL of the retrieval service, retrieval stays in-process when unset
+RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL")
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "5"))
+RETRIEVAL_MAX_CONNECTIONS = int(os.getenv("RETRIEVAL_MAX_CONNECTIONS", "32"))
+RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+RETRIEVAL_CACHE_TTL_SECONDS = float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "300"))
+# Queries sent per request, at most the 256 the service's RetrievalRequest accepts
+RETRIEVAL_MAX_BATCH = int(os.getenv("RETRIEVAL_MAX_BATCH", "256"))
+
+
+class RetrievalClient:
+    """Client of the retrieval service with pooled keep-alive connections and a local LRU of results.
+
+    Queries missing from the cache are sent together, `max_batch` per request, and
+    the service batches them with the queries of every other API worker.
+    """
+
+    def __init__(self, base_url: Optional[str] = RETRIEVAL_SERVICE_URL, timeout: float = RETRIEVAL_TIMEOUT_SECONDS,
+                 max_connections: int = RETRIEVAL_MAX_CONNECTIONS, cache_size: int = RETRIEVAL_CACHE_SIZE,
+                 cache_ttl: float = RETRIEVAL_CACHE_TTL_SECONDS, max_batch: int = RETRIEVAL_MAX_BATCH):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.max_batch = max_batch
+        self._cache: "OrderedDict[tuple, Tuple[float, List[Document]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.base_url)
+
+    def _cached(self, key: tuple) -> Optional[List[Document]]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            self._cache.pop(key, None)
+            self.misses += 1
+            return None
+
+    def _store(self, key: tuple, documents: List[Document]):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, documents)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _prepare(self, queries: List[dict]) -> Tuple[List[tuple], list, List[List[int]]]:
+        keys = [tuple(sorted(query.items())) for query in queries]
+        results = [self._cached(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        return keys, results, [missing[i:i + self.max_batch] for i in range(0, len(missing), self.max_batch)]
+
+    def _complete(self, keys: List[tuple], results: list, missing: List[int], response: httpx.Response) -> List[List[Document]]:
+        response.raise_for_status()
+        for i, chunks in zip(missing, response.json()["results"]):
+            results[i] = [Document(page_content=chunk["page_content"], metadata=chunk["metadata"]) for chunk in chunks]
+            self._store(keys[i], list(results[i]))
+        return results
+
+    async def retrieve_batch(self, queries: List[dict]) -> List[List[Document]]:
+        """Returns the chunks of each query, as dicts with `query`, `collection`, `mode` and optionally `k`,
+        `fetch_k` and `lambda_mult`.
+
+        Raises:
+            httpx.HTTPError: If the service can't be reached or rejects the request.
+        """
+        keys, results, batches = self._prepare(queries)
+        if batches:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            responses = await asyncio.gather(*(
+                self._async_client.post("/retrieve", json={"queries": [queries[i] for i in batch]}) for batch in batches))
+            for batch, response in zip(batches, responses):
+                results = self._complete(keys, results, batch, response)
+        return results
+
+    def retrieve_batch_sync(self, queries: List[dict]) -> List[List[Document]]:
+        keys, results, batches = self._prepare(queries)
+        if batches:
+            with self._lock:
+                if self._sync_client is None:
+                    self._sync_client = httpx.Client(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            for batch in batches:
+                response = self._sync_client.post("/retrieve", json={"queries": [queries[i] for i in batch]})
+                results = self._complete(keys, results, batch, response)
+        return results
+
+    async def get_chunk(self, chunk_id: str, collection: str) -> Optional[Document]:
+        """Returns a stored chunk of the collection by id, None when the service doesn't have it.
+
+        Raises:
+            httpx.HTTPError: If the service can't be reached or fails.
+        """
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+        response = await self._async_client.get(f"/chunks/{chunk_id}", params={"collection": collection})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        chunk = response.json()
+        return Document(page_content=chunk["page_content"], metadata=chunk["metadata"])
+
+    async def retrieve(self, query: str, collection: str, mode: str = "document_retrieval", k: int = 3,
+                       **options: Any) -> List[Document]:
+        return (await self.retrieve_batch([dict(query=query, collection=collection, mode=mode, k=k, **options)]))[0]
+
+    def as_retriever(self, collection: str, search_type: str = "similarity", k: int = 4) -> "RemoteRetriever":
+        """Returns a LangChain retriever over a collection of the service, for use in chains."""
+        return RemoteRetriever(client=self, collection=collection, search_type=search_type, k=k)
+
+    async def close(self):
+        if self._async_client:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client:
+            self._sync_client.close()
+            self._sync_client = None
+
+    def stats(self) -> dict:
+        return {"service_url": self.base_url, "cached": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+
+class RemoteRetriever(BaseRetriever):
+    """Retriever answered by the retrieval service, like `vector_database.as_retriever()` for a local store."""
+
+    client: Any
+    collection: str
+    search_type: str = "similarity"
+    k: int = 4
+
+    def _query(self, query: str) -> dict:
+        return {"query": query, "collection": self.collection, "mode": self.search_type, "k": self.k}
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.client.retrieve_batch_sync([self._query(query)])[0]
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return (await self.client.retrieve_batch([self._query(query)]))[0]
+
+
+retrieval_client = RetrievalClient()
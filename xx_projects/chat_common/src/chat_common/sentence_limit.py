@@ -0,0 +1,93 @@
+from typing import Any, Optional
+
+import os
+import re
+
+# Output tokens allowed per sentence the prompt asks for, the answer's max_tokens is this times the limit
+TOKENS_PER_SENTENCE = int(os.getenv("TOKENS_PER_SENTENCE", "60"))
+
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10}
+_NUMBER = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+# "Use three sentences maximum", "in at most five sentences", "no more than 2 sentences"
+SENTENCE_LIMIT_PATTERN = re.compile(
+    rf"\b(?:{_NUMBER}\s+sentences?\s+(?:maximum|max|at most)|(?:at most|no more than|up to|a maximum of)\s+{_NUMBER}\s+sentences?)\b",
+    re.IGNORECASE)
+# A sentence ends at terminal punctuation, possibly closing a quote or bracket, followed by whitespace
+SENTENCE_END = re.compile(r"""[.!?]+["')\]]*(?=\s)""")
+# Words whose trailing period doesn't end a sentence, dotted ones like "e.g." and "U.S." never do
+ABBREVIATIONS = {"etc", "vs", "mr", "mrs", "ms", "dr", "prof", "st", "approx", "dept", "univ"}
+DOTTED_ABBREVIATION = re.compile(r"(?:[a-z]{1,2}\.)+[a-z]{1,2}")
+
+
+def sentence_limit(template: str) -> Optional[int]:
+    """Returns the most sentences a prompt allows its answer, or None when it doesn't say."""
+    match = SENTENCE_LIMIT_PATTERN.search(template)
+    if not match:
+        return None
+    number = (match.group(1) or match.group(2)).lower()
+    return int(number) if number.isdigit() else NUMBER_WORDS[number]
+
+
+def max_answer_tokens(template: str) -> Optional[int]:
+    """Returns the max_tokens cap of an answer to a prompt, derived from its sentence limit."""
+    limit = sentence_limit(template)
+    return limit * TOKENS_PER_SENTENCE if limit else None
+
+
+class SentenceCounter:
+    """Counts the sentences of a streamed answer as its chunks arrive.
+
+    A sentence only counts once the whitespace after its punctuation has arrived,
+    so "3." of "3.5" or the "e." of "e.g." never end one. A "No." waits for the
+    next word, which tells "No. 5" from a plain "No."
+    """
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self.text = ""
+        self.sentences = 0
+        self.end = None
+        self._scanned = 0
+
+    def feed(self, chunk: str) -> bool:
+        """Adds a chunk of the answer, returns True once `limit` sentences are complete."""
+        self.text += chunk
+        for match in SENTENCE_END.finditer(self.text, self._scanned):
+            word = self.text[:match.start()].rsplit(None, 1)[-1:]
+            word = word[0].lstrip("\"'([").lower() if word else ""
+            # "No." only abbreviates a number, as in "No. 5", otherwise it is a whole answer
+            if word == "no" and match.group() == ".":
+                following = self.text[match.end():].lstrip()
+                if not following:
+                    break
+                if following[0].isdigit():
+                    self._scanned = match.end()
+                    continue
+            self._scanned = match.end()
+            if word in ABBREVIATIONS or DOTTED_ABBREVIATION.fullmatch(word) or word.isdigit() or (len(word) == 1 and word.isalpha()):
+                continue
+            self.sentences += 1
+            if self.limit and self.sentences >= self.limit:
+                self.end = match.end()
+                return True
+        return False
+
+    def answer(self) -> str:
+        return (self.text if self.end is None else self.text[:self.end]).strip()
+
+
+async def stream_answer(chain, inputs: Any, limit: Optional[int]) -> str:
+    """Streams the answer of `chain` (prompt | llm | StrOutputParser) and stops at `limit` sentences.
+
+    Closing the stream early closes the connection to the LLM provider, which stops
+    generating, so the tokens past the limit are neither waited for nor paid for.
+    """
+    counter = SentenceCounter(limit)
+    stream = chain.astream(inputs)
+    try:
+        async for chunk in stream:
+            if counter.feed(chunk):
+                break
+    finally:
+        await stream.aclose()
+    return counter.answer()
@@ -0,0 +1,71 @@
+from typing import List, Optional
+from langchain_core.documents import Document
+from pydantic import BaseModel
+import hashlib
+import os
+
+SNIPPET_LENGTH = 200
+
+
+class SourceReference(BaseModel):
+    id: str
+    title: Optional[str] = None
+    page: Optional[int] = None
+    snippet: str
+
+
+def source_id(document: Document) -> str:
+    """Returns a stable id for a retrieved chunk.
+
+    Uses the `chunk_id` the ingestion stored with the chunk, which is also its id in
+    the collection, so any worker can resolve it with `find_source`. Chunks stored
+    without one get a hash of the source, page and content: stable, but not resolvable.
+    """
+    metadata = document.metadata or {}
+    if metadata.get("chunk_id"):
+        return str(metadata["chunk_id"])
+
+    key = f"{metadata.get('source', '')}|{metadata.get('page', '')}|{document.page_content}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def find_source(vector_database, chunk_id: str) -> Optional[Document]:
+    """Looks up the chunk behind a source id in a Chroma store or index snapshot, None when it isn't there."""
+    found = vector_database.get(where={"chunk_id": chunk_id}, include=["documents", "metadatas"])
+    if not found["ids"]:
+        return None
+    return Document(page_content=found["documents"][0], metadata=found["metadatas"][0] or {})
+
+
+def make_snippet(text: str, length: int = SNIPPET_LENGTH) -> str:
+    """Collapses whitespace and cuts the text at a word boundary."""
+    text = " ".join(text.split())
+    if len(text) <= length:
+        return text
+    cut = text.rfind(" ", 0, length)
+    return text[:cut if cut > 0 else length] + "..."
+
+
+def to_source_reference(document: Document) -> SourceReference:
+    """Builds a compact reference (id, title, page, snippet) for a document."""
+    metadata = document.metadata or {}
+    source = metadata.get("source")
+    title = metadata.get("title") or (os.path.splitext(os.path.basename(source))[0] if source else None)
+    page = metadata.get("page")
+
+    return SourceReference(
+        id=source_id(document),
+        title=title,
+        # PyPDFLoader pages are zero-based
+        page=page + 1 if isinstance(page, int) else None,
+        snippet=make_snippet(document.page_content),
+    )
+
+
+def compact_source_documents(documents: List[Document]) -> List[SourceReference]:
+    """Converts retrieved documents into compact source references, dropping duplicates."""
+    references = {}
+    for document in documents:
+        reference = to_source_reference(document)
+        references.setdefault(reference.id, reference)
+    return list(references.values())
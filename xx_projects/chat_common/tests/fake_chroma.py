@@ -0,0 +1,25 @@
+class FakeCollection:
+    """The part of a Chroma collection the ingestion pipeline and compaction use, kept in a dict."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def count(self) -> int:
+        return len(self.rows)
+
+    def add(self, ids, metadatas, documents, embeddings):
+        self.upsert(ids=ids, metadatas=metadatas, documents=documents, embeddings=embeddings)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for id, embedding, document, metadata in zip(ids, embeddings, documents, metadatas):
+            self.rows[id] = {"embeddings": embedding, "documents": document, "metadatas": metadata}
+
+    def delete(self, ids):
+        for id in ids:
+            self.rows.pop(id, None)
+
+    def get(self, include, where=None, limit=None, offset=0):
+        ids = [id for id, row in self.rows.items()
+               if not where or all(row["metadatas"].get(key) == value for key, value in where.items())]
+        ids = ids[offset:None if limit is None else offset + limit]
+        return {"ids": ids, **{key: [self.rows[id][key] for id in ids] for key in include}}
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from chat_common.admission_control import AdmissionController
+
+
+def test_expected_wait_grows_with_queue_position() -> None:
+    controller = AdmissionController(max_in_flight=2, expected_service_time=4.0)
+    assert controller.expected_wait(0) == 2.0
+    assert controller.expected_wait(3) == 8.0
+
+
+def test_admitted_request_gets_its_deadline() -> None:
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, deadline=10.0)
+        before = time.monotonic()
+        async with controller.admit() as deadline:
+            assert 10.0 <= deadline.expires_at - before < 11.0
+            assert controller.in_flight == 1
+        assert controller.in_flight == 0
+        assert controller.stats()["completed"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_with_retry_after() -> None:
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=1, deadline=100.0, expected_service_time=3.0)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        queued = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            async with controller.admit():
+                pass
+        release.set()
+        await asyncio.gather(holder, queued)
+        return controller, error.value
+
+    controller, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    # One request queued ahead: (1 + 1) * 3s / 1 slot
+    assert error.headers["Retry-After"] == "6"
+    assert controller.rejected["queue_full"] == 1
+
+
+def test_deadline_shorter_than_the_queue_is_rejected() -> None:
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, expected_service_time=5.0)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            async with controller.admit(deadline=2.0):
+                pass
+        release.set()
+        await holder
+        return controller, error.value
+
+    controller, error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert int(error.headers["Retry-After"]) >= 1
+    assert controller.rejected["deadline"] == 1
+
+
+def test_slots_are_handed_over_in_arrival_order() -> None:
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, deadline=100.0, expected_service_time=0.01)
+        order = []
+
+        async def request(name):
+            async with controller.admit():
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(request(i) for i in range(5)))
+        return controller, order
+
+    controller, order = asyncio.run(scenario())
+    assert order == [0, 1, 2, 3, 4]
+    assert controller.in_flight == 0
+    assert controller.queue_depth() == 0
+
+
+def test_request_that_can_no_longer_finish_leaves_the_queue() -> None:
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, expected_service_time=0.1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with controller.admit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as error:
+            async with controller.admit(deadline=0.3):
+                pass
+        release.set()
+        await holder
+        return controller, error.value
+
+    controller, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert controller.rejected["expired_in_queue"] == 1
+    assert controller.queue_depth() == 0
+    assert controller.in_flight == 0
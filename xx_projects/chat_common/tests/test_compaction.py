@@ -0,0 +1,36 @@
+from chat_common.compaction import redundant_chunk_ids
+from tests.fake_chroma import FakeCollection
+
+BOILERPLATE = {"source": "fees.pdf", "page": 0, "content_hash": "h-boilerplate"}
+
+
+def test_only_copies_of_one_chunk_are_duplicates() -> None:
+    collection = FakeCollection()
+    rows = {
+        # The same paragraph twice on one page, at two offsets: two chunks
+        "c-top": {**BOILERPLATE, "chunk_id": "c-top", "start_index": 0},
+        "c-bottom": {**BOILERPLATE, "chunk_id": "c-bottom", "start_index": 2400},
+        # A second row of the chunk c-top
+        "copy-of-c-top": {**BOILERPLATE, "chunk_id": "c-top", "start_index": 0},
+        # Written before chunk ids: copies of a chunk that now has an id, and of text that has none
+        "legacy-1": BOILERPLATE,
+        "legacy-2": {"source": "fees.pdf", "page": 1, "content_hash": "h-old"},
+        "legacy-3": {"source": "fees.pdf", "page": 1, "content_hash": "h-old"},
+        "gone": {"source": "deleted.pdf", "page": 0, "content_hash": "h-gone", "chunk_id": "gone"},
+    }
+    collection.add(ids=list(rows), metadatas=list(rows.values()), documents=["text"] * len(rows),
+                   embeddings=[[float(i), 1.0] for i in range(len(rows))])
+
+    deleted = redundant_chunk_ids(collection, lambda source: source != "deleted.pdf")
+    assert sorted(deleted["duplicate"]) == ["copy-of-c-top", "legacy-1", "legacy-3"]
+    assert deleted["orphaned"] == ["gone"]
+    assert deleted["unsourced"] == []
+
+
+def test_unsourced_chunks_are_kept_until_the_collection_is_reingested() -> None:
+    collection = FakeCollection()
+    collection.add(ids=["old"], metadatas=[{}], documents=["text"], embeddings=[[0.0]])
+    assert redundant_chunk_ids(collection, lambda source: True)["unsourced"] == []
+
+    collection.add(ids=["new"], metadatas=[{"source": "fees.pdf", "chunk_id": "new"}], documents=["text"], embeddings=[[1.0]])
+    assert redundant_chunk_ids(collection, lambda source: True)["unsourced"] == ["old"]
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from chat_common.deadlines import (
+    PARTIAL_ANSWER, STAGE_BUDGETS, Deadline, DeadlineMetrics, StageTimeout, deadline_metrics, partial_answer)
+
+
+def test_stage_budget_is_capped_by_the_time_left() -> None:
+    roomy = Deadline(seconds=1000)
+    assert roomy.budget("retrieval") == STAGE_BUDGETS["retrieval"]
+
+    tight = Deadline(seconds=0.5)
+    assert 0 < tight.budget("generation") <= 0.5
+
+
+def test_expired_deadline_leaves_no_budget() -> None:
+    deadline = Deadline(expires_at=time.monotonic() - 1)
+    assert deadline.remaining() == 0.0
+    assert deadline.budget("generation") == 0.0
+
+
+def test_run_returns_the_stage_result() -> None:
+    async def stage():
+        return "done"
+
+    assert asyncio.run(Deadline(seconds=5).run("retrieval", stage())) == "done"
+
+
+def test_run_cancels_a_stage_that_overruns() -> None:
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    before = deadline_metrics.stats()["stage_timeouts"]["retrieval"]
+    with pytest.raises(StageTimeout) as error:
+        asyncio.run(Deadline(seconds=0.05).run("retrieval", slow()))
+    assert error.value.stage == "retrieval"
+    assert cancelled == [True]
+    assert deadline_metrics.stats()["stage_timeouts"]["retrieval"] == before + 1
+
+
+def test_run_skips_a_stage_below_its_minimum() -> None:
+    started = []
+
+    async def generation():
+        started.append(True)
+
+    stage = generation()
+    with pytest.raises(StageTimeout):
+        asyncio.run(Deadline(seconds=0.2).run("generation", stage, min_seconds=1.0))
+    assert started == []
+    # Closed rather than left to warn that it was never awaited
+    assert stage.cr_frame is None
+
+
+def test_partial_answer_keeps_the_top_passages() -> None:
+    passages = [Document(page_content=f"passage {i}") for i in range(5)]
+    answer = partial_answer(passages)
+    assert answer["partial"] is True
+    assert answer["result"] == PARTIAL_ANSWER
+    assert [doc.page_content for doc in answer["source_documents"]] == ["passage 0", "passage 1", "passage 2"]
+
+
+def test_metrics_report_the_degraded_rate() -> None:
+    metrics = DeadlineMetrics()
+    assert metrics.stats()["degraded_rate"] == 0.0
+    for degraded in (True, False, False, False):
+        metrics.record(degraded)
+    metrics.timed_out("compression")
+    stats = metrics.stats()
+    assert (stats["responses"], stats["degraded"], stats["degraded_rate"]) == (4, 1, 0.25)
+    assert stats["stage_timeouts"]["compression"] == 1
@@ -0,0 +1,71 @@
+import asyncio
+from dataclasses import dataclass, field
+
+from chat_common.ingestion_jobs import IngestionJobQueue
+
+STAGES = ["extract", "upsert"]
+
+
+@dataclass
+class Progress:
+    stage_counts: dict = field(default_factory=lambda: dict.fromkeys(STAGES, 0))
+    errors: list = field(default_factory=list)
+    skipped_sources: int = 0
+    deleted_chunks: int = 0
+
+
+class Pipeline:
+    """Ingests two sources, one of which fails, then optionally fails as a whole."""
+
+    def __init__(self, crash: bool = False):
+        self.crash = crash
+        self.progress = Progress()
+
+    async def run(self):
+        self.progress.stage_counts.update(extract=2, upsert=5)
+        self.progress.errors.append("broken.pdf: PdfReadError")
+        if self.crash:
+            raise RuntimeError("store unavailable")
+
+
+def run_job(queue: IngestionJobQueue) -> dict:
+    async def scenario():
+        queue.start()
+        job = queue.submit()
+        while job.status in ("queued", "running"):
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        return job.report()
+
+    return asyncio.run(scenario())
+
+
+def test_report_counts_stages_and_source_errors() -> None:
+    report = run_job(IngestionJobQueue(Pipeline, STAGES))
+    assert report["status"] == "succeeded"
+    assert report["stages"] == {"extract": 2, "upsert": 5}
+    assert report["errors"] == ["broken.pdf: PdfReadError"]
+
+
+def test_report_of_a_failed_job_includes_its_error() -> None:
+    report = run_job(IngestionJobQueue(lambda: Pipeline(crash=True), STAGES))
+    assert report["status"] == "failed"
+    assert report["errors"] == ["broken.pdf: PdfReadError", "RuntimeError: store unavailable"]
+
+
+def test_job_failing_before_its_pipeline_runs_reports_the_error() -> None:
+    def factory():
+        raise OSError("assets folder unreadable")
+
+    report = run_job(IngestionJobQueue(factory, STAGES))
+    assert report["status"] == "failed"
+    assert report["stages"] == {"extract": 0, "upsert": 0}
+    assert report["errors"] == ["OSError: assets folder unreadable"]
+
+
+def test_jobs_submitted_while_one_is_queued_are_merged() -> None:
+    queue = IngestionJobQueue(Pipeline, STAGES)
+    first = queue.submit()
+    assert queue.submit() is first
+    assert queue.get(first.job_id) is first
+    assert queue.get("unknown") is None
@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+from langchain_core.embeddings import Embeddings
+
+from chat_common.ingestion_pipeline import IngestionPipeline
+from tests.fake_chroma import FakeCollection
+
+
+class Processor:
+    """Processed text files only, the raw PDF folder does not exist."""
+
+    def __init__(self, directory):
+        self.raw_pdf_dir = os.path.join(directory, "raw")
+        self.processed_pdf_dir = os.path.join(directory, "processed")
+        os.makedirs(self.processed_pdf_dir)
+
+    def write(self, name: str, text: str):
+        with open(os.path.join(self.processed_pdf_dir, name), "w", encoding="utf-8") as file:
+            file.write(text)
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), 1.0]
+
+
+class Store:
+    def __init__(self, collection):
+        self._collection = collection
+
+
+def ingest(processor, embeddings, collection, checkpoint_path):
+    pipeline = IngestionPipeline(processor, embeddings, lambda _: Store(collection), checkpoint_path,
+                                 embed_batch_size=2, chunk_size=40, chunk_overlap=0)
+    asyncio.run(pipeline.run())
+    return pipeline.progress
+
+
+def sources(collection):
+    return sorted({row["metadatas"]["source"] for row in collection.rows.values()})
+
+
+def test_reingesting_only_embeds_changed_sources_and_drops_stale_chunks(tmp_path) -> None:
+    processor, embeddings, collection = Processor(str(tmp_path)), CountingEmbeddings(), FakeCollection()
+    checkpoint_path = str(tmp_path / "store" / "checkpoint.json")
+    processor.write("fees_text.txt", "Tuition is due in September.\n\nLate fees apply after October.")
+    processor.write("camp_text.txt", "Summer camp starts in July.")
+
+    progress = ingest(processor, embeddings, collection, checkpoint_path)
+    assert sources(collection) == ["camp_text.txt", "fees_text.txt"]
+    assert progress.errors == []
+    first_run = embeddings.embedded
+
+    # Nothing changed: both sources are skipped
+    progress = ingest(processor, embeddings, collection, checkpoint_path)
+    assert progress.skipped_sources == 2
+    assert embeddings.embedded == first_run
+
+    # One paragraph changed: only its chunk is embedded and the old one deleted
+    processor.write("fees_text.txt", "Tuition is due in September.\n\nLate fees apply after November.")
+    os.utime(os.path.join(processor.processed_pdf_dir, "fees_text.txt"), ns=(1, 1))
+    count = collection.count()
+    progress = ingest(processor, embeddings, collection, checkpoint_path)
+    assert embeddings.embedded == first_run + 1
+    assert progress.deleted_chunks == 1
+    assert collection.count() == count
+    assert any("November" in row["documents"] for row in collection.rows.values())
+    assert not any("October" in row["documents"] for row in collection.rows.values())
+
+    # A source that disappeared loses its chunks
+    os.remove(os.path.join(processor.processed_pdf_dir, "camp_text.txt"))
+    ingest(processor, embeddings, collection, checkpoint_path)
+    assert sources(collection) == ["fees_text.txt"]
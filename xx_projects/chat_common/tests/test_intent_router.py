@@ -0,0 +1,40 @@
+from chat_common.intent_router import INTENTS, IntentRouter, normalize_message
+
+
+def test_messages_are_normalized() -> None:
+    assert normalize_message("Hiiii!!  There") == "hi there"
+    assert normalize_message("Thank’s a LOT :)") == "thank's a lot"
+
+
+def test_small_talk_matches_by_rule_or_nearest_example() -> None:
+    router = IntentRouter(enabled=True)
+    match = router.classify("Hello there!")
+    assert (match.intent.name, match.method) == ("greeting", "rule")
+
+    match = router.classify("thank u so much")
+    assert match.intent.name == "thanks"
+    assert match.method == "neighbour"
+
+
+def test_questions_go_to_the_rag_chain() -> None:
+    router = IntentRouter(enabled=True)
+    assert router.classify("What is the admission fee for BS computer science?") is None
+    # Long messages are questions even when they open with a greeting
+    assert router.answer("hi, what documents do I need to apply for the BS program") is None
+
+
+def test_answer_is_one_of_the_intent_responses_and_counted() -> None:
+    router = IntentRouter(enabled=True)
+    greeting = next(intent for intent in INTENTS if intent.name == "greeting")
+    assert router.answer("good morning") in greeting.responses
+    assert router.answer("Which programs are offered?") is None
+
+    stats = router.stats()
+    assert (stats["requests"], stats["short_circuited"], stats["short_circuit_rate"]) == (2, 1, 0.5)
+    assert stats["by_intent"]["greeting"] == 1
+
+
+def test_disabled_router_answers_nothing() -> None:
+    router = IntentRouter(enabled=False)
+    assert router.answer("hello") is None
+    assert router.stats()["requests"] == 1
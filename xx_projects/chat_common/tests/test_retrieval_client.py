@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import httpx
+
+from chat_common.retrieval_client import RetrievalClient
+
+BASE_URL = "http://retrieval.test"
+
+
+class RetrievalService:
+    """Answers /retrieve with one chunk per query, recording the queries of every request."""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        queries = json.loads(request.content)["queries"]
+        self.requests.append([query["query"] for query in queries])
+        return httpx.Response(200, json={"results": [
+            [{"page_content": f"about {query['query']}", "metadata": {"collection": query["collection"]}}]
+            for query in queries]})
+
+
+def client_for(service: RetrievalService, **options) -> RetrievalClient:
+    client = RetrievalClient(base_url=BASE_URL, **options)
+    client._async_client = httpx.AsyncClient(base_url=BASE_URL, transport=httpx.MockTransport(service))
+    client._sync_client = httpx.Client(base_url=BASE_URL, transport=httpx.MockTransport(service))
+    return client
+
+
+def query(text: str) -> dict:
+    return {"query": text, "collection": "dawood", "mode": "document_retrieval", "k": 3}
+
+
+def test_client_is_disabled_without_a_service_url() -> None:
+    assert not RetrievalClient(base_url=None).enabled
+    assert RetrievalClient(base_url=BASE_URL).enabled
+
+
+def test_only_queries_missing_from_the_cache_are_sent() -> None:
+    service = RetrievalService()
+    client = client_for(service)
+
+    async def scenario():
+        first = await client.retrieve_batch([query("fees"), query("hostel")])
+        second = await client.retrieve_batch([query("hostel"), query("admissions"), query("fees")])
+        await client.close()
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert service.requests == [["fees", "hostel"], ["admissions"]]
+    assert [docs[0].page_content for docs in first] == ["about fees", "about hostel"]
+    assert [docs[0].page_content for docs in second] == ["about hostel", "about admissions", "about fees"]
+    assert (client.hits, client.misses) == (2, 3)
+
+
+def test_cache_evicts_the_least_recently_used_query() -> None:
+    service = RetrievalService()
+    client = client_for(service, cache_size=2)
+    client.retrieve_batch_sync([query("a"), query("b")])
+    client.retrieve_batch_sync([query("a")])
+    client.retrieve_batch_sync([query("c")])
+    client.retrieve_batch_sync([query("a"), query("b")])
+    assert service.requests == [["a", "b"], ["c"], ["b"]]
+
+
+def test_expired_results_are_fetched_again() -> None:
+    service = RetrievalService()
+    client = client_for(service, cache_ttl=0.0)
+    client.retrieve_batch_sync([query("fees")])
+    client.retrieve_batch_sync([query("fees")])
+    assert service.requests == [["fees"], ["fees"]]
+    assert client.hits == 0
+
+
+def test_remote_retriever_queries_its_collection() -> None:
+    service = RetrievalService()
+    client = client_for(service)
+    retriever = client.as_retriever("scouts", k=2)
+    documents = retriever.invoke("fees")
+    assert documents[0].metadata == {"collection": "scouts"}
+    assert asyncio.run(retriever.ainvoke("fees"))[0].page_content == "about fees"
+    assert service.requests == [["fees"]]
+
+
+def test_large_batches_are_split_to_the_service_limit() -> None:
+    service = RetrievalService()
+    client = client_for(service, max_batch=2)
+    texts = ["a", "b", "c", "d", "e"]
+
+    async def scenario():
+        results = await client.retrieve_batch([query(text) for text in texts])
+        await client.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [docs[0].page_content for docs in results] == [f"about {text}" for text in texts]
+    assert sorted(service.requests) == [["a", "b"], ["c", "d"], ["e"]]
+
+
+def test_chunks_are_fetched_by_id() -> None:
+    def service(request: httpx.Request) -> httpx.Response:
+        assert request.url.params["collection"] == "dawood"
+        if request.url.path == "/chunks/c1":
+            return httpx.Response(200, json={"id": "c1", "page_content": "Fees are due in June.",
+                                             "metadata": {"chunk_id": "c1"}})
+        return httpx.Response(404, json={"detail": "Unknown chunk id"})
+
+    client = client_for(service)
+
+    async def scenario():
+        found = await client.get_chunk("c1", "dawood")
+        missing = await client.get_chunk("c9", "dawood")
+        await client.close()
+        return found, missing
+
+    found, missing = asyncio.run(scenario())
+    assert found.page_content == "Fees are due in June."
+    assert found.metadata == {"chunk_id": "c1"}
+    assert missing is None
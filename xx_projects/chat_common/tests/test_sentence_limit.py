@@ -0,0 +1,94 @@
+import asyncio
+
+from chat_common.sentence_limit import TOKENS_PER_SENTENCE, SentenceCounter, max_answer_tokens, sentence_limit, stream_answer
+
+QA_TEMPLATE = ("Use the following pieces of context to answer the question at the end. Use three sentences maximum. "
+               "Keep the answer as concise as possible.\n{context}\nQuestion: {question}\nHelpful Answer:")
+
+
+def feed_in_chunks(counter: SentenceCounter, text: str, size: int = 3) -> bool:
+    return any(counter.feed(text[i:i + size]) for i in range(0, len(text), size))
+
+
+def test_sentence_limit_is_read_from_the_prompt() -> None:
+    assert sentence_limit(QA_TEMPLATE) == 3
+    assert sentence_limit("Answer in at most five sentences.") == 5
+    assert sentence_limit("Use no more than 2 sentences.") == 2
+    assert sentence_limit("Answer the question.") is None
+
+
+def test_max_tokens_follow_the_sentence_limit() -> None:
+    assert max_answer_tokens(QA_TEMPLATE) == 3 * TOKENS_PER_SENTENCE
+    assert max_answer_tokens("Answer the question.") is None
+
+
+def test_counter_stops_at_the_limit_across_chunks() -> None:
+    counter = SentenceCounter(2)
+    assert feed_in_chunks(counter, "The fee is due in June. Late fees apply! Ask the office for details.")
+    assert counter.answer() == "The fee is due in June. Late fees apply!"
+
+
+def test_decimals_and_abbreviations_do_not_end_a_sentence() -> None:
+    counter = SentenceCounter(2)
+    feed_in_chunks(counter, "The fee is 3.5 lakh, e.g. for BS programs. Dr. Ali approves waivers. Apply online.")
+    assert counter.answer() == "The fee is 3.5 lakh, e.g. for BS programs. Dr. Ali approves waivers."
+
+
+def test_a_bare_no_is_a_sentence() -> None:
+    counter = SentenceCounter(3)
+    assert feed_in_chunks(counter, "Yes. No. Maybe. More.", size=1)
+    assert counter.answer() == "Yes. No. Maybe."
+
+    counter = SentenceCounter(1)
+    assert feed_in_chunks(counter, "No. You need a transcript.")
+    assert counter.answer() == "No."
+
+
+def test_no_before_a_number_is_an_abbreviation() -> None:
+    counter = SentenceCounter(1)
+    feed_in_chunks(counter, "Submit form No. 5 by Friday. Then wait.", size=1)
+    assert counter.answer() == "Submit form No. 5 by Friday."
+
+
+def test_dotted_abbreviations_do_not_end_a_sentence() -> None:
+    counter = SentenceCounter(1)
+    feed_in_chunks(counter, "Students from the U.S. and the U.K. can apply. Others too.")
+    assert counter.answer() == "Students from the U.S. and the U.K. can apply."
+
+
+def test_counter_without_a_limit_keeps_everything() -> None:
+    counter = SentenceCounter()
+    assert not feed_in_chunks(counter, "One. Two. Three. ")
+    assert counter.sentences == 3
+    assert counter.answer() == "One. Two. Three."
+
+
+def test_unfinished_last_sentence_is_kept() -> None:
+    counter = SentenceCounter(3)
+    feed_in_chunks(counter, "One. Two")
+    assert counter.answer() == "One. Two"
+
+
+class StreamingChain:
+    """Streams fixed chunks like prompt | llm | StrOutputParser, recording how far it was read."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.sent = 0
+        self.closed = False
+
+    async def astream(self, inputs):
+        try:
+            for chunk in self.chunks:
+                self.sent += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+
+def test_stream_answer_closes_the_stream_at_the_limit() -> None:
+    chain = StreamingChain(["Yes, it is. ", "Apply by June. ", "Fees vary. ", "This is never read. ", "Nor this."])
+    answer = asyncio.run(stream_answer(chain, {"question": "q"}, 2))
+    assert answer == "Yes, it is. Apply by June."
+    assert chain.sent == 2
+    assert chain.closed
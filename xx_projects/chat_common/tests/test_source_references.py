@@ -0,0 +1,51 @@
+from langchain_core.documents import Document
+
+from chat_common.source_references import compact_source_documents, find_source, make_snippet, source_id
+
+
+class Store:
+    """Answers `get(where=...)` like Chroma and the index snapshots, over a list of stored chunks."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def get(self, where=None, include=None):
+        rows = [doc for doc in self.documents if all(doc.metadata.get(key) == value for key, value in where.items())]
+        return {"ids": [doc.metadata["chunk_id"] for doc in rows], "documents": [doc.page_content for doc in rows],
+                "metadatas": [doc.metadata for doc in rows]}
+
+
+def chunk(chunk_id: str, text: str, **metadata) -> Document:
+    return Document(page_content=text, metadata={"chunk_id": chunk_id, **metadata})
+
+
+def test_source_id_is_the_stored_chunk_id() -> None:
+    assert source_id(chunk("a1b2", "Fees are due in June.")) == "a1b2"
+
+
+def test_chunks_without_an_id_get_a_stable_hash() -> None:
+    document = Document(page_content="Fees are due in June.", metadata={"source": "fees.pdf", "page": 2})
+    assert source_id(document) == source_id(Document(page_content=document.page_content, metadata=dict(document.metadata)))
+    assert len(source_id(document)) == 16
+    assert source_id(document) != source_id(Document(page_content="Other text.", metadata=document.metadata))
+
+
+def test_snippet_is_cut_at_a_word_boundary() -> None:
+    assert make_snippet("  short\n text ") == "short text"
+    assert make_snippet("alpha beta gamma", length=12) == "alpha beta..."
+
+
+def test_references_are_compact_and_deduplicated() -> None:
+    first = chunk("c1", "The admission fee is due in June.", source="app/assets/fees.pdf", page=0)
+    references = compact_source_documents([first, first, chunk("c2", "Hostel rooms are shared.", title="Hostels")])
+    assert [(ref.id, ref.title, ref.page) for ref in references] == [("c1", "fees", 1), ("c2", "Hostels", None)]
+    assert references[0].snippet == "The admission fee is due in June."
+
+
+def test_reference_ids_resolve_against_the_store() -> None:
+    store = Store([chunk("c1", "The admission fee is due in June.", source="fees.pdf"), chunk("c2", "Hostels.")])
+    reference = compact_source_documents([store.documents[0]])[0]
+    document = find_source(store, reference.id)
+    assert document.page_content == "The admission fee is due in June."
+    assert document.metadata["source"] == "fees.pdf"
+    assert find_source(store, "missing") is None
@@ -0,0 +1,146 @@
+"""Drives a /chat endpoint at a target request rate and reports throughput, latency percentiles and errors.
+
+Run with: poetry run python benchmarks/chat_load.py --url http://127.0.0.1:8000/chat --rps 20 --duration 60
+Requests are sent open-loop: they start on schedule whether or not earlier ones have finished, so a
+saturated backend shows up as growing latency and errors instead of a silently lower request rate.
+Point the backend at benchmarks/openai_standin.py (OPENAI_STANDIN_URL) to measure it without OpenAI.
+"""
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+import numpy as np
+
+QUERIES = [
+    "What programs does the university offer?",
+    "What are the admission requirements for the BS programs?",
+    "How much is the tuition fee per semester?",
+    "Is hostel accommodation available for students?",
+    "When does the admission process start?",
+    "What scholarships can students apply for?",
+    "Who is the vice chancellor of the university?",
+    "How can I contact the admissions office?",
+]
+
+
+@dataclass
+class LoadResult:
+    latencies: List[float] = field(default_factory=list)
+    errors: Counter = field(default_factory=Counter)
+    sent: int = 0
+    skipped: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+
+
+async def send(client: httpx.AsyncClient, url: str, payload: dict, result: LoadResult):
+    start = time.perf_counter()
+    try:
+        response = await client.post(url, json=payload)
+    except httpx.TimeoutException:
+        result.errors["timeout"] += 1
+        return
+    except httpx.HTTPError as e:
+        result.errors[type(e).__name__] += 1
+        return
+
+    if response.status_code != 200:
+        result.errors[f"http_{response.status_code}"] += 1
+    elif "chat_result" not in response.json():
+        # The chat routes report failures with a 200 and a message
+        result.errors["app_error"] += 1
+    else:
+        result.latencies.append(time.perf_counter() - start)
+
+
+async def run_load(url: str, rps: float, duration: float, queries: List[str], extra: Optional[dict] = None,
+                   timeout: float = 60.0, max_in_flight: int = 1000, poisson: bool = False) -> LoadResult:
+    """Sends `rps` requests per second for `duration` seconds and waits for the stragglers.
+
+    Args:
+        url (str): The chat endpoint.
+        rps (float): Target request rate.
+        duration (float): Seconds to send for.
+        queries (list): Questions to draw from at random.
+        extra (dict, optional): Fields added to every request body, e.g. tenant_id or response_mode.
+        timeout (float, optional): Per-request timeout in seconds.
+        max_in_flight (int, optional): Requests due while this many are outstanding are skipped and counted.
+        poisson (bool, optional): Exponential inter-arrival times instead of a fixed interval.
+
+    Returns:
+        LoadResult: Latencies of the successful requests and error counts by kind.
+    """
+    result = LoadResult()
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        in_flight = set()
+        result.started_at = time.perf_counter()
+        next_at = result.started_at
+        while next_at < result.started_at + duration:
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+            if len(in_flight) >= max_in_flight:
+                result.skipped += 1
+            else:
+                payload = {"query": random.choice(queries), **(extra or {})}
+                task = asyncio.create_task(send(client, url, payload, result))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                result.sent += 1
+            next_at += random.expovariate(rps) if poisson else 1 / rps
+        if in_flight:
+            await asyncio.wait(in_flight)
+        result.finished_at = time.perf_counter()
+    return result
+
+
+def report(result: LoadResult, rps: float) -> dict:
+    elapsed = result.finished_at - result.started_at
+    latencies = np.array(result.latencies) * 1000
+    failed = sum(result.errors.values())
+    percentile = lambda q: round(float(np.percentile(latencies, q)), 1) if len(latencies) else None
+    return {
+        "target_rps": rps,
+        "sent": result.sent,
+        "succeeded": len(result.latencies),
+        "failed": failed,
+        "skipped": result.skipped,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(result.latencies) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(failed / result.sent, 4) if result.sent else 0.0,
+        "errors": dict(result.errors),
+        "latency_ms": {"p50": percentile(50), "p90": percentile(90), "p95": percentile(95), "p99": percentile(99),
+                       "max": round(float(latencies.max()), 1) if len(latencies) else None},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000/chat")
+    parser.add_argument("--rps", type=float, default=5.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--poisson", action="store_true", help="random arrivals at the target rate")
+    parser.add_argument("--queries-file", help="file with one question per line")
+    parser.add_argument("--extra", default="{}", help='JSON merged into every request, e.g. \'{"response_mode": "slim"}\'')
+    args = parser.parse_args()
+
+    queries = QUERIES
+    if args.queries_file:
+        with open(args.queries_file, "r", encoding="utf-8") as file:
+            queries = [line.strip() for line in file if line.strip()]
+
+    result = asyncio.run(run_load(args.url, args.rps, args.duration, queries, json.loads(args.extra),
+                                  args.timeout, args.max_in_flight, args.poisson))
+    print(json.dumps(report(result, args.rps), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compares page parsing throughput and chunk counts of the old get_text scraping and the main-content extraction.
+
+Run with: poetry run python benchmarks/content_extraction.py [page.html ...]
+Without arguments synthetic pages with navigation, footers and scripts are used.
+"""
+import random
+import string
+import sys
+import time
+
+from bs4 import BeautifulSoup
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from app.rag_chatbot_pipeline.data_handler.data_operations import CHUNK_SEPARATORS
+from app.web_scrap.content_extraction import extract_main_content
+from app.web_scrap.wb_srcp import clean_data, normalize_text
+
+ITERATIONS = 3
+
+
+def sentence(words):
+    return " ".join(random.choices(words, k=random.randint(8, 20))).capitalize() + "."
+
+
+def sample_page(words, sections=8):
+    """Builds a page shaped like a typical university site: menus, sidebar, footer and a few sections of prose."""
+    links = "".join(f'<li><a href="/{w}">{w.title()}</a></li>' for w in random.choices(words, k=40))
+    body = "".join(
+        f"<h2>{' '.join(random.choices(words, k=3)).title()}</h2>"
+        + "".join(f"<p>{' '.join(sentence(words) for _ in range(4))}</p>" for _ in range(3))
+        + f"<ul>{''.join(f'<li>{sentence(words)}</li>' for _ in range(4))}</ul>"
+        for _ in range(sections)
+    )
+    return f"""<html><head><title>Sample</title><style>body {{ color: #333 }}</style>
+        <script>{"var x = 1;" * 200}</script></head><body>
+        <header><div class="top-menu"><ul>{links}</ul></div></header>
+        <nav class="navbar"><ul>{links}</ul></nav>
+        <div class="container"><aside class="sidebar"><ul>{links}</ul></aside>
+        <main><h1>Sample page</h1>{body}</main></div>
+        <div class="cookie-banner">We use cookies to improve your experience on this website.</div>
+        <footer><p>Copyright Dawood University. All rights reserved.</p><ul>{links}</ul></footer>
+        </body></html>"""
+
+
+def old_text(html):
+    return clean_data(BeautifulSoup(html, "html.parser").get_text())
+
+
+def lxml_text(html):
+    return clean_data(BeautifulSoup(html, "lxml").get_text())
+
+
+def new_text(html):
+    return normalize_text(extract_main_content(html).text)
+
+
+def measure(func, pages):
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        texts = [func(html) for html in pages]
+    return (time.perf_counter() - start) / ITERATIONS, texts
+
+
+def main():
+    if len(sys.argv) > 1:
+        pages = [open(path, encoding="utf-8", errors="replace").read() for path in sys.argv[1:]]
+    else:
+        random.seed(0)
+        words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10))) for _ in range(800)]
+        pages = [sample_page(words) for _ in range(50)]
+
+    megabytes = sum(len(html.encode("utf-8")) for html in pages) / 1e6
+    old_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    new_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150, separators=CHUNK_SEPARATORS)
+
+    print(f"{len(pages)} pages, {megabytes:.1f} MB of HTML\n")
+    print(f"{'method':<28}{'pages/s':>10}{'MB/s':>8}{'chars':>10}{'chunks':>8}")
+    for name, func, splitter in (("html.parser get_text", old_text, old_splitter),
+                                 ("lxml get_text", lxml_text, old_splitter),
+                                 ("lxml main content", new_text, new_splitter)):
+        seconds, texts = measure(func, pages)
+        chunks = sum(len(splitter.split_text(text)) for text in texts)
+        chars = sum(len(text) for text in texts)
+        print(f"{name:<28}{len(pages) / seconds:>10.1f}{megabytes / seconds:>8.1f}{chars:>10}{chunks:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Local OpenAI-compatible stand-in for load tests: chat completions (streaming too), completions and embeddings.
+
+Run with: poetry run python benchmarks/openai_standin.py --latency-ms 400 --tokens-per-second 40 --error-rate 0.01
+and start a backend with OPENAI_STANDIN_URL=http://127.0.0.1:8900/v1 so every ChatOpenAI, OpenAI and
+OpenAIEmbeddings client talks to it. Latency is time to first token, the rest of the answer is paced at the
+token rate. Embeddings are deterministic per input, so identical texts get identical vectors.
+Without network access OpenAIEmbeddings still needs tiktoken's cl100k_base file, cached via TIKTOKEN_CACHE_DIR.
+"""
+from dataclasses import asdict, dataclass
+from typing import List, Union
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = ("This is a simulated answer from the local stand-in. It has no knowledge of the documents. "
+          "Its length and pacing follow the configured token rate. ").split()
+
+
+@dataclass
+class StandinConfig:
+    latency_ms: float = 300.0
+    latency_jitter_ms: float = 100.0
+    tokens_per_second: float = 50.0
+    completion_tokens: int = 60
+    embedding_latency_ms: float = 30.0
+    embedding_dimensions: int = 1536
+    error_rate: float = 0.0
+    error_status: int = 500
+
+
+config = StandinConfig()
+stats = {"chat": 0, "chat_stream": 0, "completions": 0, "embeddings": 0, "embedded_inputs": 0, "injected_errors": 0}
+app = FastAPI(title="OpenAI stand-in")
+
+
+def injected_error():
+    if random.random() >= config.error_rate:
+        return None
+    stats["injected_errors"] += 1
+    status = config.error_status
+    return JSONResponse(status_code=status, headers={"retry-after": "1"} if status == 429 else None, content={
+        "error": {"message": f"Injected error ({status})", "type": "standin_error", "param": None, "code": None}})
+
+
+async def first_token_delay():
+    jitter = random.uniform(-config.latency_jitter_ms, config.latency_jitter_ms)
+    await asyncio.sleep(max(0.0, config.latency_ms + jitter) / 1000)
+
+
+def answer_tokens(max_tokens) -> List[str]:
+    count = min(config.completion_tokens, max_tokens or config.completion_tokens)
+    return [ANSWER[i % len(ANSWER)] + " " for i in range(count)]
+
+
+def usage(prompt: str, completion_tokens: int) -> dict:
+    prompt_tokens = len(prompt.split())
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+
+def embedding(value: Union[str, List[int]]) -> np.ndarray:
+    seed = hashlib.sha256(str(value).encode("utf-8")).digest()[:8]
+    vector = np.random.default_rng(int.from_bytes(seed, "little")).normal(size=config.embedding_dimensions)
+    return (vector / np.linalg.norm(vector)).astype(np.float32)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    error = injected_error()
+    if error:
+        return error
+
+    prompt = " ".join(str(message.get("content") or "") for message in body.get("messages", []))
+    tokens = answer_tokens(body.get("max_tokens") or body.get("max_completion_tokens"))
+    completion_id, created, model = f"chatcmpl-{uuid.uuid4().hex}", int(time.time()), body.get("model", "standin")
+
+    if not body.get("stream"):
+        stats["chat"] += 1
+        await first_token_delay()
+        await asyncio.sleep(len(tokens) / config.tokens_per_second)
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+            "usage": usage(prompt, len(tokens)),
+        }
+
+    stats["chat_stream"] += 1
+
+    async def events():
+        def chunk(delta, finish_reason=None):
+            return "data: " + json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + "\n\n"
+
+        await first_token_delay()
+        yield chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            yield chunk({"content": token})
+            await asyncio.sleep(1 / config.tokens_per_second)
+        yield chunk({}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/completions")
+async def completions(request: Request):
+    body = await request.json()
+    error = injected_error()
+    if error:
+        return error
+
+    stats["completions"] += 1
+    prompts = body.get("prompt", "")
+    prompts = prompts if isinstance(prompts, list) else [prompts]
+    tokens = answer_tokens(body.get("max_tokens"))
+    await first_token_delay()
+    await asyncio.sleep(len(tokens) / config.tokens_per_second)
+    return {
+        "id": f"cmpl-{uuid.uuid4().hex}", "object": "text_completion", "created": int(time.time()),
+        "model": body.get("model", "standin"),
+        "choices": [{"index": i, "text": "".join(tokens), "logprobs": None, "finish_reason": "stop"} for i in range(len(prompts))],
+        "usage": usage(" ".join(map(str, prompts)), len(tokens) * len(prompts)),
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    error = injected_error()
+    if error:
+        return error
+
+    inputs = body.get("input", [])
+    # A single string or a single token list is one input
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    stats["embeddings"] += 1
+    stats["embedded_inputs"] += len(inputs)
+    await asyncio.sleep(config.embedding_latency_ms / 1000)
+
+    vectors = [embedding(value) for value in inputs]
+    if body.get("encoding_format") == "base64":
+        data = [base64.b64encode(vector.tobytes()).decode("ascii") for vector in vectors]
+    else:
+        data = [vector.tolist() for vector in vectors]
+    return {
+        "object": "list", "model": body.get("model", "standin"),
+        "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(data)],
+        "usage": {"prompt_tokens": sum(len(str(value).split()) for value in inputs), "total_tokens": 0},
+    }
+
+
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": name, "object": "model", "owned_by": "standin"}
+                                       for name in ("gpt-4", "gpt-3.5-turbo", "text-embedding-ada-002")]}
+
+
+@app.get("/standin/stats")
+async def read_stats():
+    return {"config": asdict(config), **stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    for field, default in asdict(StandinConfig()).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(default), default=default)
+    args = parser.parse_args()
+    for field in asdict(config):
+        setattr(config, field, getattr(args, field))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,121 @@
+"""Reports recall@k and search latency of reduced-dimension indexes against exact full-dimension search.
+
+Run with: poetry run python benchmarks/reduced_index_recall.py --collection langchain --dimensions 64,128,256,384
+The collection's snapshot (see index_snapshot.py) is copied, so the serving snapshot is left untouched.
+Queries are corpus chunks held out of their own results, with a little noise added. Without a
+snapshot, --synthetic N builds a corpus whose spectrum decays like that of text embeddings.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import (
+    SnapshotIndex, add_reduced_index, export_snapshot, snapshot_directory)
+
+DIMENSIONS = 1536
+
+
+class SyntheticCollection:
+    """Just enough of a Chroma collection for `export_snapshot`, with vectors drawn from a few hundred latent topics."""
+
+    name = "benchmark"
+    metadata = {"hnsw:space": "cosine"}
+
+    def __init__(self, count, latent=256):
+        self.rows = count
+        self.rng = np.random.default_rng(0)
+        scales = 1.0 / np.sqrt(np.arange(1, latent + 1))
+        self.basis = self.rng.normal(size=(latent, DIMENSIONS)).astype(np.float32) * scales[:, np.newaxis]
+
+    def count(self):
+        return self.rows
+
+    def get(self, include, limit, offset):
+        size = max(0, min(limit, self.rows - offset))
+        vectors = self.rng.normal(size=(size, len(self.basis))) @ self.basis
+        vectors += self.rng.normal(scale=0.02, size=vectors.shape)
+        return {
+            "ids": [f"chunk-{offset + i}" for i in range(size)],
+            "embeddings": vectors.astype(np.float32),
+            "documents": ["" for _ in range(size)],
+            "metadatas": [{"page": offset + i} for i in range(size)],
+        }
+
+
+def held_out_queries(index, count, rng):
+    rows = rng.choice(len(index), min(count, len(index)), replace=False)
+    vectors = np.array(index.vectors[rows])
+    noise = rng.normal(size=vectors.shape).astype(np.float32)
+    vectors += 0.1 * noise * np.linalg.norm(vectors, axis=1, keepdims=True) / np.sqrt(vectors.shape[1])
+    return rows, vectors
+
+
+def search(index, rows, queries, k, exact=False):
+    """Returns the k nearest rows of every query other than the row it came from, and the seconds per query."""
+    start = time.perf_counter()
+    results = index.search_batch(queries, k + 1, exact=exact)
+    elapsed = (time.perf_counter() - start) / len(queries)
+    return [[i for i, _ in result if i != row][:k] for row, result in zip(rows, results)], elapsed
+
+
+def recall(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collection", default="langchain", help="collection whose snapshot is measured")
+    parser.add_argument("--snapshot", help="snapshot directory, defaults to the collection's")
+    parser.add_argument("--synthetic", type=int, help="measure a synthetic corpus of this many chunks instead")
+    parser.add_argument("--dimensions", default="64,128,256,384,512")
+    parser.add_argument("--reduction", choices=["pca", "truncate"], default="pca")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank-factors", default="4,8,16")
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    directory = os.path.join(root, "benchmark")
+    try:
+        if args.synthetic:
+            export_snapshot(SyntheticCollection(args.synthetic), directory, reduced_dimensions=0)
+        else:
+            shutil.copytree(args.snapshot or snapshot_directory(args.collection), directory)
+
+        rng = np.random.default_rng(1)
+        exact_index = SnapshotIndex(directory, reduced_search=False)
+        rows, queries = held_out_queries(exact_index, args.queries, rng)
+        truth, exact_seconds = search(exact_index, rows, queries, args.k, exact=True)
+        print(f"{len(exact_index)} chunks of {exact_index.manifest['dimensions']} dimensions, "
+              f"{len(queries)} held-out queries, exact search {exact_seconds * 1000:.2f} ms per query")
+
+        report = []
+        print(f"{'dims':>6} {'kept var':>9} {'rerank':>7} {f'recall@{args.k}':>10} {'ms/query':>9} {'speedup':>8} {'hot MB':>7}")
+        for dimensions in map(int, args.dimensions.split(",")):
+            manifest = add_reduced_index(directory, dimensions, args.reduction)
+            explained = manifest["reduced"]["explained_variance"]
+            hot_mb = len(exact_index) * (dimensions + 1) * 4 / 1024 / 1024
+            for factor in map(int, args.rerank_factors.split(",")):
+                index = SnapshotIndex(directory, rerank_factor=factor)
+                found, seconds = search(index, rows, queries, args.k)
+                row = {"dimensions": dimensions, "explained_variance": explained, "rerank_factor": factor,
+                       f"recall@{args.k}": round(recall(found, truth), 4), "ms_per_query": round(seconds * 1000, 3),
+                       "speedup": round(exact_seconds / seconds, 2), "reduced_mb": round(hot_mb, 1)}
+                report.append(row)
+                kept = f"{explained:.1%}" if explained is not None else "-"
+                print(f"{dimensions:>6} {kept:>9} {factor:>7} {row[f'recall@{args.k}']:>10.4f} "
+                      f"{row['ms_per_query']:>9.3f} {row['speedup']:>8.2f} {hot_mb:>7.1f}")
+                index.close()
+        exact_index.close()
+        print(json.dumps({"exact_ms_per_query": round(exact_seconds * 1000, 3), "results": report}))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Compares /chat payload size and serialisation cost for the full and slim response modes.
+
+Run with: poetry run python benchmarks/response_payload.py
+"""
+import json
+import random
+import string
+import time
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from langchain.schema import Document
+
+from chat_common.source_references import compact_source_documents
+
+ITERATIONS = 2000
+
+
+def sample_documents(count=6, min_chars=1000, max_chars=2000):
+    """Builds chunks shaped like the ones the retriever returns."""
+    words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(2, 10))) for _ in range(500)]
+    docs = []
+    for i in range(count):
+        text = ""
+        while len(text) < random.randint(min_chars, max_chars):
+            text += random.choice(words) + " "
+        docs.append(Document(page_content=text, metadata={"source": f"app/assets/data_{i}.pdf", "page": i}))
+    return docs
+
+
+def time_it(func, iterations=ITERATIONS):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    random.seed(0)
+    answer = "The university offers undergraduate and graduate engineering programs."
+    documents = sample_documents()
+
+    full = lambda: {"chat_result": answer, "source_documents": jsonable_encoder(documents)}
+    slim = lambda: {"chat_result": answer, "source_documents": jsonable_encoder(compact_source_documents(documents))}
+
+    full_bytes = len(orjson.dumps(full()))
+    slim_bytes = len(orjson.dumps(slim()))
+
+    print(f"{'mode':<6}{'bytes':>10}{'json us':>12}{'orjson us':>12}")
+    for name, build in (("full", full), ("slim", slim)):
+        payload = build()
+        print(f"{name:<6}{len(orjson.dumps(payload)):>10}"
+              f"{time_it(lambda: json.dumps(build())):>12.1f}"
+              f"{time_it(lambda: orjson.dumps(build())):>12.1f}")
+
+    print(f"\nanswer bytes: {len(answer)}")
+    print(f"payload reduction: {full_bytes / slim_bytes:.1f}x ({100 * (1 - slim_bytes / full_bytes):.0f}% smaller)")
+
+
+if __name__ == "__main__":
+    main()
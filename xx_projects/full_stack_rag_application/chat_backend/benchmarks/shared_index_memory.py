@@ -0,0 +1,97 @@
+"""Compares per-worker memory of a shared, memory-mapped index snapshot with private copies of the index.
+
+Run with: poetry run python benchmarks/shared_index_memory.py [chunks] [workers]
+Each worker opens the index and answers a few searches, which touches every vector, then
+reports its resident (RSS) and proportional (PSS) memory. PSS splits shared pages between
+the processes mapping them, so it is what the pod pays for each worker. Linux only.
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import SnapshotIndex, export_snapshot
+
+DIMENSIONS = 1536
+SEARCHES = 20
+
+
+class SyntheticCollection:
+    """Just enough of a Chroma collection for `export_snapshot`."""
+
+    name = "benchmark"
+    metadata = {"hnsw:space": "l2"}
+
+    def __init__(self, count):
+        self.rows = count
+        self.rng = np.random.default_rng(0)
+
+    def count(self):
+        return self.rows
+
+    def get(self, include, limit, offset):
+        size = max(0, min(limit, self.rows - offset))
+        return {
+            "ids": [f"chunk-{offset + i}" for i in range(size)],
+            "embeddings": self.rng.normal(size=(size, DIMENSIONS)).astype(np.float32),
+            "documents": ["lorem ipsum dolor sit amet " * 60 for _ in range(size)],
+            "metadatas": [{"source": "synthetic.pdf", "page": offset + i} for i in range(size)],
+        }
+
+
+def memory_kb():
+    values = {}
+    with open("/proc/self/smaps_rollup") as file:
+        for line in file:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+
+def worker(directory, private_copy, ready, results):
+    index = SnapshotIndex(directory)
+    vectors = np.array(index.vectors) if private_copy else index.vectors
+    texts = [index.text(i) for i in range(len(index))] if private_copy else None
+    for query in np.random.default_rng(os.getpid()).normal(size=(SEARCHES, DIMENSIONS)).astype(np.float32):
+        np.argmin(index.norms - 2.0 * (vectors @ query))
+    ready.wait()  # measure while every worker is alive, so shared pages are split between all of them
+    results.put(memory_kb())
+    del texts
+
+
+def run(directory, workers, private_copy):
+    ready = multiprocessing.Barrier(workers)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=worker, args=(directory, private_copy, ready, results)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    measured = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: sum(m[key] for m in measured) / 1024 for key in ("Rss", "Pss")}
+
+
+def main():
+    chunks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    root = tempfile.mkdtemp()
+    try:
+        manifest = export_snapshot(SyntheticCollection(chunks), os.path.join(root, "benchmark"))
+        size = sum(f["bytes"] for f in manifest["files"].values()) / 1024 / 1024
+        print(f"{chunks} chunks, snapshot {size:.0f} MB")
+        print("Totals over all workers")
+        print(f"{'workers':>8} {'copies PSS MB':>14} {'shared PSS MB':>14} {'shared RSS MB':>14}")
+        for workers in range(1, max_workers + 1):
+            private = run(os.path.join(root, "benchmark"), workers, private_copy=True)
+            shared = run(os.path.join(root, "benchmark"), workers, private_copy=False)
+            print(f"{workers:>8} {private['Pss']:>14.0f} {shared['Pss']:>14.0f} {shared['Rss']:>14.0f}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,21 @@
-from app.routes.main_routes import app
+import os
 import uvicorn
 
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    if WORKERS > 1:
+        # Every worker maps the same snapshot files instead of opening its own copy of the Chroma store,
+        # so the vectors and texts sit once in the shared page cache however many workers there are.
+        # Ingests re-export the snapshot they changed, and workers remap it within a minute
+        os.environ.setdefault("INDEX_SERVING_MODE", "snapshot")
+        from app.rag_chatbot_pipeline.data_handler.index_snapshot import export_missing_snapshots
+        from app.rag_chatbot_pipeline.interaction_handler.tenant_registry import load_tenant_configs
+
+        export_missing_snapshots(config.collection_name for config in load_tenant_configs().values())
+        uvicorn.run("app.routes.main_routes:app", host="0.0.0.0", port=8000, workers=WORKERS)
+    else:
+        from app.routes.main_routes import app
+
+        uvicorn.run(app, host="0.0.0.0", port=8000)
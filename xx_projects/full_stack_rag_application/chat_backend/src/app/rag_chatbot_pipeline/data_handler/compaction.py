@@ -0,0 +1,39 @@
+"""Compacts the vector store: drops duplicate, orphaned and legacy chunks and rebuilds the index files.
+
+Run offline, with the API stopped, as: poetry run python -m app.rag_chatbot_pipeline.data_handler.compaction
+"""
+from typing import Callable, Optional
+from chat_common import compaction
+from app.rag_chatbot_pipeline.data_handler.data_operations import CHROMA_PERSIST_DIRECTORY, chroma_client_settings
+
+import os
+
+import chromadb
+
+
+def open_client(persist_directory: str):
+    return chromadb.PersistentClient(path=persist_directory, settings=chroma_client_settings(persist_directory))
+
+
+def is_local_source_present(source: str) -> bool:
+    """Local files must still exist. Web pages are kept, the recrawl replaces their chunks when they change."""
+    if source.startswith(("http://", "https://")):
+        return True
+    return os.path.exists(source)
+
+
+def compact(persist_directory: str = CHROMA_PERSIST_DIRECTORY, is_live_source: Optional[Callable[[str], bool]] = None,
+            dry_run: bool = False) -> dict:
+    """Compacts the store with `chat_common.compaction.compact`.
+
+    Args:
+        persist_directory (str, optional): The Chroma directory to compact.
+        is_live_source (callable, optional): Tells whether a chunk's source still exists.
+            Defaults to checking that local files still exist.
+        dry_run (bool, optional): Only report what would be deleted.
+    """
+    return compaction.compact(persist_directory, open_client, is_live_source or is_local_source_present, dry_run=dry_run)
+
+
+if __name__ == "__main__":
+    compaction.main(CHROMA_PERSIST_DIRECTORY, open_client, is_local_source_present)
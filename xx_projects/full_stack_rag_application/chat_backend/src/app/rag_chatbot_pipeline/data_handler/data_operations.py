@@ -1,11 +1,33 @@
+import hashlib
 import os
 
+from chromadb.config import Settings
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from app.openai.openai_connectivity import OPENAI_API_KEY
 
+CHROMA_PERSIST_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "..", "chroma_store")
+CHROMA_MEMORY_LIMIT_BYTES = int(os.getenv("CHROMA_MEMORY_LIMIT_MB", "512")) * 1024 * 1024
+DEFAULT_COLLECTION_NAME = "langchain"
+# Markdown headings kept by the web content extraction are preferred chunk boundaries
+CHUNK_SEPARATORS = ["\n# ", "\n## ", "\n### ", "\n#### ", "\n\n", "\n", " ", ""]
+
+def chroma_client_settings(persist_directory=CHROMA_PERSIST_DIRECTORY):
+    """Returns the client settings shared by every Chroma handle in this process.
+
+    Chroma refuses to open one directory twice with different settings, so both the
+    ingestion and the serving side go through here. The LRU segment cache lets the
+    indexes of idle collections be unloaded once the memory limit is reached.
+    """
+    return Settings(
+        is_persistent=True,
+        persist_directory=persist_directory,
+        chroma_segment_cache_policy="LRU",
+        chroma_memory_limit_bytes=CHROMA_MEMORY_LIMIT_BYTES,
+    )
+
 def load_documents(folder_path):
     """Loads PDF documents from a specified folder.
 
@@ -29,6 +51,18 @@ def load_documents(folder_path):
         print("No PDF files found in the directory.")
         return None
 
+    return load_pdf_files(pdf_files)
+
+def load_pdf_files(pdf_files):
+    """Loads the given PDF files.
+
+    Args:
+        pdf_files (list): Paths of the PDF files to load.
+
+    Returns:
+        list: A list of loaded documents or None if nothing could be loaded.
+    """
+
     docs = []
     for pdf_path in pdf_files:
         loader = PyPDFLoader(pdf_path)
@@ -42,47 +76,108 @@ def load_documents(folder_path):
     
     return docs if docs else None
 
-def split_documents(documents):
-    """Splits documents into chunks and generates embeddings.
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def chunk_id(source, offset, digest):
+    """Returns the id of a chunk, stable for as long as the source has the same text at the same offset.
+
+    Args:
+        source (str): The file path or URL the chunk comes from.
+        offset (str): Where the chunk starts in the source, e.g. "<page>:<character>".
+        digest (str): The content hash of the chunk.
+
+    Returns:
+        str: A 32 character hex id.
+    """
+    return hashlib.sha256(f"{source}\x00{offset}\x00{digest}".encode("utf-8")).hexdigest()[:32]
+
+def split_documents(documents, collection_name=DEFAULT_COLLECTION_NAME):
+    """Splits documents into chunks and upserts their embeddings, see `ingest_documents`.
 
     Args:
         documents (list): List of loaded documents.
+        collection_name (str, optional): Chroma collection to write to. Defaults to the shared collection.
 
     Returns:
         Chroma: A Chroma vectorstore containing document embeddings.
     """
+    return ingest_documents(documents, collection_name)[0]
+
+def ingest_documents(documents, collection_name=DEFAULT_COLLECTION_NAME):
+    """Splits documents into chunks and upserts their embeddings.
+
+    Chunks get deterministic ids (`chunk_id`), so re-ingesting a source only
+    embeds the chunks that are new and never stores a second copy. Every
+    source in `documents` is taken to be complete: its stored chunks that are
+    not among the new ones are deleted.
+
+    Args:
+        documents (list): List of loaded documents.
+        collection_name (str, optional): Chroma collection to write to. Defaults to the shared collection.
+
+    Returns:
+        tuple: The Chroma vectorstore and the counts of the ingest: `sources`, `chunks`,
+        newly `embedded` chunks, `deleted` stale ones and `unchanged_sources`.
+    """
 
-    textsplitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    textsplitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150, separators=CHUNK_SEPARATORS, add_start_index=True)
     chunk_docs = textsplitter.split_documents(documents)
 
+    ids = []
+    for chunk in chunk_docs:
+        digest = chunk_hash(chunk.page_content)
+        offset = f"{chunk.metadata.get('page', 0)}:{chunk.metadata['start_index']}"
+        chunk.metadata.update(chunk_id=chunk_id(chunk.metadata.get("source", ""), offset, digest), content_hash=digest)
+        ids.append(chunk.metadata["chunk_id"])
+
     embeddings = OpenAIEmbeddings(openai_api_type=OPENAI_API_KEY)
-    persist_directory = os.path.join(os.path.dirname(__file__), "..", "..", "chroma_store")
 
     try:
-        database = Chroma.from_documents(
-            documents=chunk_docs,
-            embedding=embeddings,
-            persist_directory=persist_directory
+        database = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=CHROMA_PERSIST_DIRECTORY,
+            client_settings=chroma_client_settings(),
         )
+        stored = set(database._collection.get(ids=ids, include=[])["ids"]) if ids else set()
+        new_chunks = {id: chunk for id, chunk in zip(ids, chunk_docs) if id not in stored}
+        if new_chunks:
+            database.add_documents(list(new_chunks.values()), ids=list(new_chunks))
     except Exception as e:
         print(f"Error generating embeddings: {e}")
         raise  # Re-raise the exception for further handling
 
-    print({"collection count": database._collection.count()})
-    return database
+    current_ids = set(ids)
+    sources = {document.metadata.get("source") for document in documents if document.metadata.get("source")}
+    changed_sources = {chunk.metadata.get("source") for chunk in new_chunks.values()}
+    stale_ids = []
+    for source in sources:
+        source_stale_ids = [id for id in database._collection.get(where={"source": source}, include=[])["ids"] if id not in current_ids]
+        if source_stale_ids:
+            changed_sources.add(source)
+        stale_ids += source_stale_ids
+    if stale_ids:
+        database._collection.delete(ids=stale_ids)
+
+    print({"collection count": database._collection.count(), "embedded": len(new_chunks), "deleted": len(stale_ids)})
+    stats = {"sources": len(sources), "chunks": len(chunk_docs), "embedded": len(new_chunks), "deleted": len(stale_ids),
+             "unchanged_sources": len(sources - changed_sources)}
+    return database, stats
 
 
 # Example usage
-folder_path = os.path.join(os.path.dirname(__file__), "..", "..", "assets")  # Navigate up two directories
-try:
-    docs = load_documents(folder_path)
-    if docs:
-        num_docs = len(docs)
-        print({"Number of docs: ": num_docs})
-        print(docs[1].metadata)
-        database = split_documents(docs)
-        print(database)
-except (FileNotFoundError, Exception) as e:
-    print(f"An error occurred: {e}")
-else:
-    print("Processing completed successfully.")
+if __name__ == "__main__":
+    folder_path = os.path.join(os.path.dirname(__file__), "..", "..", "assets")  # Navigate up two directories
+    try:
+        docs = load_documents(folder_path)
+        if docs:
+            num_docs = len(docs)
+            print({"Number of docs: ": num_docs})
+            print(docs[1].metadata)
+            database = split_documents(docs)
+            print(database)
+    except (FileNotFoundError, Exception) as e:
+        print(f"An error occurred: {e}")
+    else:
+        print("Processing completed successfully.")
@@ -0,0 +1,172 @@
+"""Tunes the HNSW parameters of a collection for its own corpus instead of Chroma's defaults.
+
+Candidate indexes are built over a sample of the collection's embeddings with the
+hnswlib that Chroma uses, and searched with rows held out of the sample. Recall is
+measured against exact search. The parameters with the lowest query time that reach
+the target recall are written into the collection's metadata (the collection is
+rebuilt, Chroma only reads them when an index is created) and into its snapshot.
+The distance space is kept, it defines what the collection's scores mean.
+
+Run offline, with the API stopped, as:
+    poetry run python -m app.rag_chatbot_pipeline.data_handler.hnsw_tuning --collection langchain --target-recall 0.95 --apply
+"""
+from dataclasses import asdict, dataclass
+from typing import Iterable, List, Optional, Tuple
+from chat_common.compaction import rebuild_collection
+from app.rag_chatbot_pipeline.data_handler.data_operations import CHROMA_PERSIST_DIRECTORY, DEFAULT_COLLECTION_NAME, chroma_client_settings
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import INDEX_SNAPSHOT_DIRECTORY, MANIFEST, read_manifest, snapshot_directory, write_manifest
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import chromadb
+import hnswlib
+import numpy as np
+
+PAGE_SIZE = 1000
+SAMPLE_SIZE = 20000
+HELD_OUT_QUERIES = 200
+TARGET_RECALL = 0.95
+RECALL_AT = 5
+# Chroma's defaults are M=16, construction_ef=100 and search_ef=10
+M_VALUES = (8, 12, 16, 24, 32, 48)
+CONSTRUCTION_EF_VALUES = (64, 100, 200, 400)
+SEARCH_EF_VALUES = (10, 16, 24, 32, 48, 64, 96, 128, 192, 256, 384)
+
+
+@dataclass
+class Candidate:
+    M: int
+    construction_ef: int
+    search_ef: int
+    recall: float
+    query_ms: float
+    build_seconds: float
+
+    def metadata(self) -> dict:
+        return {"hnsw:M": self.M, "hnsw:construction_ef": self.construction_ef, "hnsw:search_ef": self.search_ef}
+
+
+def sample_embeddings(collection, sample_size: int = SAMPLE_SIZE, queries: int = HELD_OUT_QUERIES,
+                      seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns a random sample of the collection's embeddings and, disjoint from it, the held-out query vectors."""
+    count = collection.count()
+    rows = np.random.default_rng(seed).permutation(count)[:min(count, sample_size + queries)]
+    wanted = set(rows.tolist())
+    vectors = {}
+    for offset in range(0, count, PAGE_SIZE):
+        page = collection.get(include=["embeddings"], limit=PAGE_SIZE, offset=offset)
+        for i, embedding in enumerate(page["embeddings"]):
+            if offset + i in wanted:
+                vectors[offset + i] = embedding
+    matrix = np.asarray([vectors[row] for row in rows if row in vectors], dtype=np.float32)
+    held_out = min(queries, len(matrix) // 10 or 1)
+    return matrix[held_out:], matrix[:held_out]
+
+
+def exact_neighbours(data: np.ndarray, queries: np.ndarray, k: int, space: str = "l2") -> np.ndarray:
+    """Returns the rows of the `k` nearest data vectors of every query, nearest first, as hnswlib ranks them."""
+    if space == "cosine":
+        data = data / np.maximum(np.linalg.norm(data, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    products = queries @ data.T
+    if space == "l2":
+        distances = np.einsum("ij,ij->i", data, data) - 2.0 * products
+    else:
+        distances = -products
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(nearest, np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1), axis=1)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found.tolist(), truth.tolist())]))
+
+
+def autotune(data: np.ndarray, queries: np.ndarray, space: str = "l2", k: int = RECALL_AT,
+             target_recall: float = TARGET_RECALL, m_values: Iterable[int] = M_VALUES,
+             construction_ef_values: Iterable[int] = CONSTRUCTION_EF_VALUES,
+             search_ef_values: Iterable[int] = SEARCH_EF_VALUES) -> Tuple[Optional[Candidate], List[Candidate]]:
+    """Finds the cheapest HNSW parameters reaching `target_recall` at `k` on the held-out queries.
+
+    Every (M, construction_ef) pair is built once and searched with increasing
+    search_ef until it reaches the target, since a larger search_ef only costs more.
+    Queries are timed one at a time on one thread, like a chat request searches.
+
+    Returns:
+        tuple: The cheapest candidate meeting the target, or None when none does, and every candidate measured.
+    """
+    k = min(k, len(data))
+    truth = exact_neighbours(data, queries, k, space)
+    measured = []
+    for m in m_values:
+        for construction_ef in construction_ef_values:
+            started = time.perf_counter()
+            index = hnswlib.Index(space=space, dim=data.shape[1])
+            index.init_index(max_elements=len(data), ef_construction=construction_ef, M=m, random_seed=100)
+            index.add_items(data, np.arange(len(data)))
+            build_seconds = time.perf_counter() - started
+
+            for search_ef in search_ef_values:
+                index.set_ef(max(search_ef, k))
+                started = time.perf_counter()
+                found = np.vstack([index.knn_query(query, k=k, num_threads=1)[0] for query in queries])
+                query_ms = (time.perf_counter() - started) * 1000 / len(queries)
+                candidate = Candidate(m, construction_ef, search_ef, recall(found, truth), query_ms, build_seconds)
+                measured.append(candidate)
+                logging.info(f"M={m} construction_ef={construction_ef} search_ef={search_ef}: "
+                             f"recall@{k} {candidate.recall:.4f}, {query_ms:.3f} ms per query")
+                if candidate.recall >= target_recall:
+                    break
+
+    feasible = [candidate for candidate in measured if candidate.recall >= target_recall]
+    # Query time decides, smaller graphs (memory) and faster builds break near-ties
+    best = min(feasible, key=lambda c: (round(c.query_ms, 2), c.M, c.build_seconds)) if feasible else None
+    return best, measured
+
+
+def apply_parameters(client, collection_name: str, candidate: Candidate, snapshot_root: str = INDEX_SNAPSHOT_DIRECTORY) -> dict:
+    """Rebuilds the collection with the tuned parameters and records them in its snapshot, if it has one.
+
+    Returns:
+        dict: The new collection metadata.
+    """
+    collection = client.get_collection(collection_name)
+    metadata = {**(collection.metadata or {}), **candidate.metadata()}
+    rebuild_collection(client, collection_name, metadata=metadata)
+
+    directory = snapshot_directory(collection_name, snapshot_root)
+    if os.path.exists(os.path.join(directory, MANIFEST)):
+        manifest = read_manifest(directory)
+        manifest["collection_metadata"] = {**manifest["collection_metadata"], **candidate.metadata()}
+        write_manifest(directory, manifest)
+    return metadata
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION_NAME)
+    parser.add_argument("--persist-directory", default=CHROMA_PERSIST_DIRECTORY)
+    parser.add_argument("--target-recall", type=float, default=TARGET_RECALL)
+    parser.add_argument("--k", type=int, default=RECALL_AT, help="recall is measured at this many neighbours")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE)
+    parser.add_argument("--queries", type=int, default=HELD_OUT_QUERIES)
+    parser.add_argument("--apply", action="store_true", help="rebuild the collection with the chosen parameters")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    client = chromadb.PersistentClient(path=args.persist_directory, settings=chroma_client_settings(args.persist_directory))
+    collection = client.get_collection(args.collection)
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+    data, queries = sample_embeddings(collection, args.sample_size, args.queries)
+    best, measured = autotune(data, queries, space, args.k, args.target_recall)
+
+    print(json.dumps({"collection": args.collection, "space": space, "sample": len(data), "queries": len(queries),
+                      "target_recall": args.target_recall, "chosen": asdict(best) if best else None,
+                      "measured": [asdict(candidate) for candidate in measured]}, indent=2))
+    if best is None:
+        print(f"No candidate reached recall@{args.k} {args.target_recall}, the collection is left as it is")
+    elif args.apply:
+        print(f"Rebuilt {args.collection} with {json.dumps(apply_parameters(client, args.collection, best))}")
@@ -0,0 +1,699 @@
+"""Compact, memory-mapped snapshots of a Chroma collection for fast replica start.
+
+A snapshot is a directory of flat files:
+
+- vectors.f32: the embeddings as one contiguous row-major float32 matrix (count x dimensions)
+- norms.f32: the squared norm of every vector, so l2 search needs a single matrix-vector product
+- texts.bin / text_offsets.u64: the chunk texts as one utf-8 blob, row i is texts[offsets[i]:offsets[i + 1]]
+- records.bin / record_offsets.u64: the id and metadata of every row as one JSON object each
+- manifest.json: shape, collection metadata and the size and sha256 of every file
+
+and optionally a reduced-dimension copy of the vectors for a cheaper first pass:
+
+- reduced.f32 / reduced_norms.f32: the vectors projected to fewer dimensions, and their squared norms
+- projection.f32 / projection_mean.f32: the projection (PCA components or a truncation) and the centre it applies
+
+Opening a snapshot reads the manifest and maps the files, nothing else. Pages are
+loaded by the kernel on first touch, so start time doesn't grow with the corpus.
+
+Export, add a reduced index, import back into Chroma, or verify with:
+    poetry run python -m app.rag_chatbot_pipeline.data_handler.index_snapshot export --collection langchain
+    poetry run python -m app.rag_chatbot_pipeline.data_handler.index_snapshot reduce --collection langchain --dimensions 256
+    poetry run python -m app.rag_chatbot_pipeline.data_handler.index_snapshot import --snapshot <directory>
+    poetry run python -m app.rag_chatbot_pipeline.data_handler.index_snapshot verify --snapshot <directory>
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langchain.schema import Document
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from app.rag_chatbot_pipeline.data_handler.data_operations import CHROMA_PERSIST_DIRECTORY, DEFAULT_COLLECTION_NAME, chroma_client_settings
+
+import argparse
+import fcntl
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+import threading
+import time
+
+import chromadb
+import numpy as np
+
+INDEX_SNAPSHOT_DIRECTORY = os.getenv("INDEX_SNAPSHOT_DIRECTORY", os.path.join(os.path.dirname(__file__), "..", "..", "index_snapshots"))
+SNAPSHOT_FORMAT = "rag-index-snapshot"
+SNAPSHOT_VERSION = 1
+PAGE_SIZE = 1000
+
+MANIFEST = "manifest.json"
+VECTORS = "vectors.f32"
+NORMS = "norms.f32"
+TEXTS = "texts.bin"
+TEXT_OFFSETS = "text_offsets.u64"
+RECORDS = "records.bin"
+RECORD_OFFSETS = "record_offsets.u64"
+SNAPSHOT_FILES = (VECTORS, NORMS, TEXTS, TEXT_OFFSETS, RECORDS, RECORD_OFFSETS)
+REDUCED_VECTORS = "reduced.f32"
+REDUCED_NORMS = "reduced_norms.f32"
+PROJECTION = "projection.f32"
+PROJECTION_MEAN = "projection_mean.f32"
+REDUCED_FILES = (REDUCED_VECTORS, REDUCED_NORMS, PROJECTION, PROJECTION_MEAN)
+# Metadata keys looked up without a scan: sources by source_chunks, chunk ids by find_source
+INDEXED_METADATA = ("chunk_id", "source")
+
+# Dimensions of the reduced index added to every exported snapshot, 0 exports full vectors only
+INDEX_REDUCED_DIMENSIONS = int(os.getenv("INDEX_REDUCED_DIMENSIONS", "0"))
+# "pca" fits a projection on the corpus, "truncate" keeps the leading dimensions of Matryoshka-style embeddings
+INDEX_REDUCTION = os.getenv("INDEX_REDUCTION", "pca")
+# Set to "false" to search the full vectors even when a snapshot has a reduced index
+INDEX_REDUCED_SEARCH = os.getenv("INDEX_REDUCED_SEARCH", "true").lower() == "true"
+# Rows shortlisted on the reduced vectors and re-ranked on the full ones, per requested neighbour
+INDEX_RERANK_FACTOR = int(os.getenv("INDEX_RERANK_FACTOR", "8"))
+PCA_SAMPLE_SIZE = 50000
+
+
+def snapshot_directory(collection_name: str, root: str = INDEX_SNAPSHOT_DIRECTORY) -> str:
+    return os.path.join(root, collection_name)
+
+
+def read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST), "r", encoding="utf-8") as file:
+        manifest = json.load(file)
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"{directory} is not a version {SNAPSHOT_VERSION} index snapshot")
+    if manifest["byte_order"] != sys.byteorder:
+        raise ValueError(f"{directory} was written on a {manifest['byte_order']}-endian machine")
+    return manifest
+
+
+def write_manifest(directory: str, manifest: dict):
+    """Replaces the manifest of a snapshot atomically, which also marks it changed for processes mapping it."""
+    with open(os.path.join(directory, f"{MANIFEST}.tmp"), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(os.path.join(directory, f"{MANIFEST}.tmp"), os.path.join(directory, MANIFEST))
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def verify_snapshot(directory: str) -> List[str]:
+    """Checks every file of a snapshot against the sizes and checksums in its manifest.
+
+    Reads the whole snapshot, so it belongs in deployment checks rather than on the serving path.
+
+    Returns:
+        list: The names of the files that are missing or don't match, empty when the snapshot is intact.
+    """
+    manifest = read_manifest(directory)
+    damaged = []
+    for name, expected in manifest["files"].items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path) or os.path.getsize(path) != expected["bytes"] or file_sha256(path) != expected["sha256"]:
+            damaged.append(name)
+    return damaged
+
+
+class _HashingWriter:
+    """Appends to a file while keeping its size and sha256, so the manifest costs no second pass."""
+
+    def __init__(self, path: str):
+        self.file = open(path, "wb")
+        self.digest = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.digest.update(data)
+        self.bytes += len(data)
+
+    def close(self) -> dict:
+        self.file.close()
+        return {"bytes": self.bytes, "sha256": self.digest.hexdigest()}
+
+
+def _write_blob_rows(blob: _HashingWriter, offsets: _HashingWriter, rows: List[bytes]):
+    ends = blob.bytes + np.cumsum([len(row) for row in rows], dtype=np.uint64)
+    blob.write(b"".join(rows))
+    offsets.write(ends.tobytes())
+
+
+def export_snapshot(collection, directory: str, page_size: int = PAGE_SIZE,
+                    reduced_dimensions: int = INDEX_REDUCED_DIMENSIONS, reduction: str = INDEX_REDUCTION) -> dict:
+    """Writes a Chroma collection out as a snapshot, replacing any previous snapshot in `directory`.
+
+    The files are written next to the target and swapped in at the end, so a reader
+    never sees a half-written snapshot. Processes that still map the old files keep
+    reading them until they reopen. Exports of the same directory, from any process,
+    run one at a time.
+
+    Args:
+        collection: The Chroma collection to export.
+        directory (str): Where the snapshot goes.
+        page_size (int, optional): Rows read from Chroma at a time.
+        reduced_dimensions (int, optional): Also write a reduced index with this many dimensions, see
+            `add_reduced_index`. Defaults to INDEX_REDUCED_DIMENSIONS, 0 for none.
+        reduction (str, optional): "pca" or "truncate". Defaults to INDEX_REDUCTION.
+
+    Returns:
+        dict: The manifest of the new snapshot.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(directory)), exist_ok=True)
+    with open(f"{directory}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _export_snapshot(collection, directory, page_size, reduced_dimensions, reduction)
+
+
+def _export_snapshot(collection, directory: str, page_size: int, reduced_dimensions: int, reduction: str) -> dict:
+    staging = f"{directory}.staging"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    writers = {name: _HashingWriter(os.path.join(staging, name)) for name in SNAPSHOT_FILES}
+    writers[TEXT_OFFSETS].write(np.zeros(1, dtype=np.uint64).tobytes())
+    writers[RECORD_OFFSETS].write(np.zeros(1, dtype=np.uint64).tobytes())
+    count, dimensions = 0, None
+
+    try:
+        for offset in range(0, collection.count(), page_size):
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            if not page["ids"]:
+                break
+
+            vectors = np.ascontiguousarray(page["embeddings"], dtype=np.float32)
+            if dimensions is None:
+                dimensions = vectors.shape[1]
+            elif vectors.shape[1] != dimensions:
+                raise ValueError(f"Collection {collection.name} mixes {dimensions}-d and {vectors.shape[1]}-d embeddings")
+            writers[VECTORS].write(vectors.tobytes())
+            writers[NORMS].write(np.einsum("ij,ij->i", vectors, vectors).astype(np.float32).tobytes())
+
+            _write_blob_rows(writers[TEXTS], writers[TEXT_OFFSETS],
+                             [(text or "").encode("utf-8") for text in page["documents"]])
+            _write_blob_rows(writers[RECORDS], writers[RECORD_OFFSETS], [
+                json.dumps({"id": id, "metadata": metadata or {}}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+                for id, metadata in zip(page["ids"], page["metadatas"])
+            ])
+            count += len(page["ids"])
+    finally:
+        files = {name: writer.close() for name, writer in writers.items()}
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "collection": collection.name,
+        "collection_metadata": collection.metadata or {},
+        "count": count,
+        "dimensions": dimensions or 0,
+        "dtype": "float32",
+        "byte_order": sys.byteorder,
+        "created_at": time.time(),
+        "files": files,
+    }
+    with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as file:
+        json.dump(manifest, file, indent=2)
+    if reduced_dimensions and count:
+        manifest = add_reduced_index(staging, reduced_dimensions, reduction)
+
+    previous = f"{directory}.previous"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, previous)
+    os.rename(staging, directory)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    logging.info(f"Exported {count} chunks of {collection.name} to {directory}")
+    return manifest
+
+
+def export_missing_snapshots(collection_names: Iterable[str], persist_directory: str = CHROMA_PERSIST_DIRECTORY,
+                             root: str = INDEX_SNAPSHOT_DIRECTORY) -> List[str]:
+    """Exports the collections that exist in the Chroma store but have no snapshot yet.
+
+    Returns:
+        list: The names of the collections that were exported.
+    """
+    client = chromadb.PersistentClient(path=persist_directory, settings=chroma_client_settings(persist_directory))
+    existing = {collection.name for collection in client.list_collections()}
+    exported = []
+    for name in dict.fromkeys(collection_names):
+        directory = snapshot_directory(name, root)
+        if name in existing and not os.path.exists(os.path.join(directory, MANIFEST)):
+            export_snapshot(client.get_collection(name), directory)
+            exported.append(name)
+    return exported
+
+
+def ingest_stamp_path(collection_name: str, root: str = INDEX_SNAPSHOT_DIRECTORY) -> str:
+    return os.path.join(root, f"{collection_name}.ingested")
+
+
+def mark_ingested(collection_name: str, root: str = INDEX_SNAPSHOT_DIRECTORY):
+    """Records that an ingest changed the collection, for every worker to see."""
+    os.makedirs(root, exist_ok=True)
+    with open(ingest_stamp_path(collection_name, root), "w") as stamp:
+        stamp.write(str(time.time()))
+
+
+def ingested_at(collection_name: str, root: str = INDEX_SNAPSHOT_DIRECTORY) -> Optional[float]:
+    """When an ingest last changed the collection, None if none has been stamped."""
+    try:
+        return os.path.getmtime(ingest_stamp_path(collection_name, root))
+    except FileNotFoundError:
+        return None
+
+
+def refresh_snapshot(collection_name: str, persist_directory: str = CHROMA_PERSIST_DIRECTORY,
+                     root: str = INDEX_SNAPSHOT_DIRECTORY) -> Optional[dict]:
+    """Re-exports the snapshot of a collection after an ingest changed it.
+
+    The ingest is stamped first (`mark_ingested`), so indexes built from the collection's
+    text, like the condenser's keyword index, are rebuilt by every worker. Collections
+    without a snapshot are left alone, `export_missing_snapshots` creates the first one.
+    Workers (`TenantIndexCache.drop_stale_snapshots`) and the retrieval service map the
+    new files on their next check.
+
+    Returns:
+        dict: The manifest of the new snapshot, None when the collection has none.
+    """
+    mark_ingested(collection_name, root)
+    directory = snapshot_directory(collection_name, root)
+    if not os.path.exists(os.path.join(directory, MANIFEST)):
+        return None
+    client = chromadb.PersistentClient(path=persist_directory, settings=chroma_client_settings(persist_directory))
+    return export_snapshot(client.get_collection(collection_name), directory)
+
+
+def fit_projection(vectors: np.ndarray, dimensions: int, method: str = "pca", normalize: bool = False,
+                   sample_size: int = PCA_SAMPLE_SIZE) -> Tuple[np.ndarray, np.ndarray, Optional[float]]:
+    """Fits the projection of a reduced index.
+
+    Args:
+        vectors (np.ndarray): The full vectors, may be memory-mapped.
+        dimensions (int): Dimensions to keep.
+        method (str, optional): "pca" projects onto the top principal components of a sample of the vectors,
+            "truncate" keeps the leading dimensions, for embeddings trained Matryoshka-style.
+        normalize (bool, optional): Fit on unit vectors, for cosine collections.
+        sample_size (int, optional): Rows the principal components are estimated from.
+
+    Returns:
+        tuple: The centre (full dimensions), the projection matrix (full x reduced dimensions) and, for PCA,
+            the share of the variance it keeps.
+
+    Raises:
+        ValueError: For an unknown method or a dimension that doesn't reduce anything.
+    """
+    full = vectors.shape[1]
+    if not 0 < dimensions < full:
+        raise ValueError(f"Reduced dimensions must be between 1 and {full - 1}, got {dimensions}")
+    if method == "truncate":
+        return np.zeros(full, dtype=np.float32), np.eye(full, dimensions, dtype=np.float32), None
+    if method != "pca":
+        raise ValueError(f"Unknown reduction {method}, expected pca or truncate")
+
+    rows = np.random.default_rng(0).choice(len(vectors), min(sample_size, len(vectors)), replace=False)
+    sample = np.asarray(vectors[np.sort(rows)], dtype=np.float64)
+    if normalize:
+        sample /= np.maximum(np.linalg.norm(sample, axis=1, keepdims=True), 1e-12)
+    mean = sample.mean(axis=0)
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(sample - mean, rowvar=False))
+    top = np.argsort(eigenvalues)[::-1][:dimensions]
+    explained = float(eigenvalues[top].sum() / max(eigenvalues.sum(), 1e-12))
+    return mean.astype(np.float32), np.ascontiguousarray(eigenvectors[:, top], dtype=np.float32), explained
+
+
+def add_reduced_index(directory: str, dimensions: int, method: str = INDEX_REDUCTION, page_size: int = 10000) -> dict:
+    """Adds a reduced-dimension copy of the vectors to a snapshot, replacing any previous one.
+
+    Searches then rank every row on the reduced vectors and re-rank a shortlist on
+    the full ones, see `SnapshotIndex.search_batch`. The files are swapped in and the
+    manifest rewritten last, so processes mapping the snapshot keep a consistent view
+    and `TenantIndexCache.drop_stale_snapshots` remaps it.
+
+    Returns:
+        dict: The updated manifest.
+    """
+    manifest = read_manifest(directory)
+    vectors = _map_array(os.path.join(directory, VECTORS), np.float32, (manifest["count"], manifest["dimensions"]))
+    normalize = manifest["collection_metadata"].get("hnsw:space", "l2") == "cosine"
+    mean, projection, explained = fit_projection(vectors, dimensions, method, normalize)
+
+    writers = {name: _HashingWriter(os.path.join(directory, f"{name}.tmp")) for name in REDUCED_FILES}
+    try:
+        writers[PROJECTION].write(projection.tobytes())
+        writers[PROJECTION_MEAN].write(mean.tobytes())
+        for start in range(0, len(vectors), page_size):
+            block = np.asarray(vectors[start:start + page_size])
+            if normalize:
+                block = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+            reduced = np.ascontiguousarray((block - mean) @ projection, dtype=np.float32)
+            writers[REDUCED_VECTORS].write(reduced.tobytes())
+            writers[REDUCED_NORMS].write(np.einsum("ij,ij->i", reduced, reduced).astype(np.float32).tobytes())
+    finally:
+        files = {name: writer.close() for name, writer in writers.items()}
+    for name in REDUCED_FILES:
+        os.replace(os.path.join(directory, f"{name}.tmp"), os.path.join(directory, name))
+
+    manifest["files"].update(files)
+    manifest["reduced"] = {"method": method, "dimensions": dimensions, "normalized": normalize,
+                           "explained_variance": explained}
+    write_manifest(directory, manifest)
+
+    logging.info(f"Added a {dimensions}-d {method} index to {directory}"
+                 + (f", keeping {explained:.1%} of the variance" if explained is not None else ""))
+    return manifest
+
+
+def import_snapshot(directory: str, client, collection_name: Optional[str] = None, page_size: int = PAGE_SIZE) -> int:
+    """Upserts the rows of a verified snapshot into a Chroma collection, creating it if needed.
+
+    Returns:
+        int: The number of chunks imported.
+
+    Raises:
+        ValueError: If any snapshot file fails its checksum.
+    """
+    damaged = verify_snapshot(directory)
+    if damaged:
+        raise ValueError(f"Snapshot {directory} is damaged: {', '.join(damaged)}")
+
+    index = SnapshotIndex(directory)
+    name = collection_name or index.manifest["collection"]
+    collection = client.get_or_create_collection(name, metadata=index.manifest["collection_metadata"] or None)
+    for start in range(0, len(index), page_size):
+        rows = range(start, min(start + page_size, len(index)))
+        records = [index.record(i) for i in rows]
+        collection.upsert(
+            ids=[record["id"] for record in records],
+            embeddings=index.vectors[rows.start:rows.stop].tolist(),
+            documents=[index.text(i) for i in rows],
+            metadatas=[record["metadata"] or None for record in records],
+        )
+    imported = len(index)
+    index.close()
+    return imported
+
+
+def _map_file(path: str):
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _map_array(path: str, dtype, shape: tuple) -> np.ndarray:
+    if not np.prod(shape):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def _nearest(distances: np.ndarray, k: int) -> np.ndarray:
+    """Returns the columns of the `k` smallest distances of every row, smallest first."""
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(nearest, np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1), axis=1)
+
+
+class SnapshotIndex:
+    """Read-only, memory-mapped view of a snapshot with exact nearest-neighbour search.
+
+    Only the manifest is parsed when opening. Vectors are searched in place, texts
+    and records are decoded per returned row. Lookups by chunk id or source use maps
+    built by one pass over the records on the first such lookup. A snapshot with a reduced index is
+    searched on the short vectors first and only the shortlist is scored on the
+    full ones, which then stay mostly on disk.
+    """
+
+    def __init__(self, directory: str, verify: bool = False, reduced_search: bool = INDEX_REDUCED_SEARCH,
+                 rerank_factor: int = INDEX_RERANK_FACTOR):
+        """Maps a snapshot.
+
+        Args:
+            directory (str): The snapshot directory.
+            verify (bool, optional): Check every file against its checksum first, which reads the whole snapshot.
+                File sizes are always checked.
+            reduced_search (bool, optional): Use the reduced index when the snapshot has one.
+                Defaults to INDEX_REDUCED_SEARCH.
+            rerank_factor (int, optional): Shortlisted rows per requested neighbour. Defaults to INDEX_RERANK_FACTOR.
+
+        Raises:
+            ValueError: If the snapshot is damaged or was written by an incompatible version.
+        """
+        self.directory = directory
+        self.manifest = read_manifest(directory)
+        for name, expected in self.manifest["files"].items():
+            if os.path.getsize(os.path.join(directory, name)) != expected["bytes"]:
+                raise ValueError(f"Snapshot {directory} is damaged: {name} has the wrong size")
+        damaged = verify_snapshot(directory) if verify else []
+        if damaged:
+            raise ValueError(f"Snapshot {directory} is damaged: {', '.join(damaged)}")
+
+        count, dimensions = self.manifest["count"], self.manifest["dimensions"]
+        path = lambda name: os.path.join(directory, name)
+        self.vectors = _map_array(path(VECTORS), np.float32, (count, dimensions))
+        self.norms = _map_array(path(NORMS), np.float32, (count,))
+        self.text_offsets = _map_array(path(TEXT_OFFSETS), np.uint64, (count + 1,))
+        self.record_offsets = _map_array(path(RECORD_OFFSETS), np.uint64, (count + 1,))
+        self._texts = _map_file(path(TEXTS))
+        self._records = _map_file(path(RECORDS))
+        # Same distance functions as the Chroma collection the snapshot came from
+        self.space = self.manifest["collection_metadata"].get("hnsw:space", "l2")
+
+        self._lookup_lock = threading.Lock()
+        self._row_of_id: Optional[Dict[str, int]] = None
+        self._rows_of: Optional[Dict[str, Dict[Any, List[int]]]] = None
+
+        self.reduced = None
+        self.rerank_factor = rerank_factor
+        reduced = self.manifest.get("reduced")
+        if reduced and reduced_search:
+            self.reduced = _map_array(path(REDUCED_VECTORS), np.float32, (count, reduced["dimensions"]))
+            self.reduced_norms = _map_array(path(REDUCED_NORMS), np.float32, (count,))
+            self.projection = np.array(_map_array(path(PROJECTION), np.float32, (dimensions, reduced["dimensions"])))
+            self.projection_mean = np.array(_map_array(path(PROJECTION_MEAN), np.float32, (dimensions,)))
+
+    def __len__(self) -> int:
+        return self.manifest["count"]
+
+    def text(self, i: int) -> str:
+        return self._texts[int(self.text_offsets[i]):int(self.text_offsets[i + 1])].decode("utf-8")
+
+    def record(self, i: int) -> dict:
+        return json.loads(self._records[int(self.record_offsets[i]):int(self.record_offsets[i + 1])])
+
+    def document(self, i: int) -> Document:
+        return Document(page_content=self.text(i), metadata=self.record(i)["metadata"])
+
+    def _build_lookups(self):
+        with self._lookup_lock:
+            if self._row_of_id is not None:
+                return
+            row_of_id, rows_of = {}, {key: {} for key in INDEXED_METADATA}
+            for i in range(len(self)):
+                record = self.record(i)
+                row_of_id[record["id"]] = i
+                metadata = record["metadata"] or {}
+                for key in INDEXED_METADATA:
+                    if key in metadata:
+                        rows_of[key].setdefault(metadata[key], []).append(i)
+            self._rows_of, self._row_of_id = rows_of, row_of_id
+
+    def row(self, chunk_id: str) -> Optional[int]:
+        """Returns the row of a chunk id, None when the snapshot has no such chunk."""
+        if self._row_of_id is None:
+            self._build_lookups()
+        return self._row_of_id.get(chunk_id)
+
+    def rows_where(self, key: str, value: Any) -> Optional[List[int]]:
+        """Returns the rows, in order, whose metadata has `value` under `key`, None for keys not in INDEXED_METADATA."""
+        if key not in INDEXED_METADATA:
+            return None
+        if self._rows_of is None:
+            self._build_lookups()
+        return self._rows_of[key].get(value, [])
+
+    def distances(self, query_vectors, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns the distance of every row to the query, as Chroma computes it for the collection's space.
+
+        A matrix of queries gives one row of distances per query, computed with a single matrix product.
+        `rows` limits the distances to those rows, in that order.
+        """
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        vectors, norms = (self.vectors, self.norms) if rows is None else (self.vectors[rows], self.norms[rows])
+        products = queries @ vectors.T
+        if self.space == "ip":
+            return 1.0 - products
+        query_norms = np.einsum("...i,...i->...", queries, queries)[..., np.newaxis]
+        if self.space == "cosine":
+            return 1.0 - products / np.maximum(np.sqrt(norms * query_norms), 1e-12)
+        return norms - 2.0 * products + query_norms
+
+    def reduced_distances(self, query_vectors) -> np.ndarray:
+        """Approximate distances of every row on the reduced index, for ranking only.
+
+        Cosine collections are reduced from unit vectors, where l2 ranks like cosine.
+        Inner products skip the centre on the query side, which shifts every row of a
+        query by the same amount and keeps the ranking.
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        if self.space == "ip":
+            return -((queries @ self.projection) @ self.reduced.T)
+        if self.space == "cosine":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        projected = (queries - self.projection_mean) @ self.projection
+        return self.reduced_norms - 2.0 * (projected @ self.reduced.T) + np.einsum("ij,ij->i", projected, projected)[:, np.newaxis]
+
+    def search_batch(self, query_vectors, k: int = 4, exact: bool = False) -> List[List[Tuple[int, float]]]:
+        """Returns, for every query of a matrix, (row, distance) pairs of its `k` nearest rows, nearest first.
+
+        With a reduced index, `k * rerank_factor` rows are shortlisted on it and re-ranked
+        on the full vectors, so the distances are always exact. `exact` skips the shortlist.
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        k = min(k, len(self))
+        if k <= 0:
+            return [[] for _ in queries]
+
+        shortlist_size = k * self.rerank_factor
+        if exact or self.reduced is None or shortlist_size >= len(self):
+            distances = self.distances(queries)
+            return [[(int(i), float(row[i])) for i in rows] for row, rows in zip(distances, _nearest(distances, k))]
+
+        results = []
+        for query, shortlist in zip(queries, _nearest(self.reduced_distances(queries), shortlist_size)):
+            shortlist = np.sort(shortlist)  # gathers the full vectors in file order
+            distances = self.distances(query, shortlist)
+            order = np.argsort(distances)[:k]
+            results.append([(int(shortlist[i]), float(distances[i])) for i in order])
+        return results
+
+    def search(self, query_vector, k: int = 4) -> List[Tuple[int, float]]:
+        """Returns (row, distance) pairs of the `k` nearest rows, nearest first."""
+        return self.search_batch([query_vector], k)[0]
+
+    def close(self):
+        for blob in (self._texts, self._records):
+            if isinstance(blob, mmap.mmap):
+                blob.close()
+
+
+class SnapshotVectorStore(VectorStore):
+    """LangChain vector store over a `SnapshotIndex`, a read-only stand-in for the Chroma store when serving."""
+
+    def __init__(self, index: SnapshotIndex, embedding_function: Embeddings):
+        self.index = index
+        self.embedding_function = embedding_function
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.embedding_function
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("Snapshots are read-only, ingest into Chroma and export a new snapshot")
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None, **kwargs: Any):
+        raise NotImplementedError("Snapshots are built with export_snapshot from a Chroma collection")
+
+    def count(self) -> int:
+        return len(self.index)
+
+    def get(self, include: Optional[List[str]] = None, where: Optional[dict] = None) -> dict:
+        """Returns every row in the shape of Chroma's `get`, for building in-memory indexes such as BM25.
+
+        `where` keeps the rows whose metadata has all of the given values, like Chroma's equality filter.
+        """
+        include = include or ["documents", "metadatas"]
+        where = dict(where or {})
+        # Narrow down with the index's lookup maps, only the remaining conditions need the records
+        rows = None
+        for key in [key for key in where if key in INDEXED_METADATA]:
+            matching = self.index.rows_where(key, where.pop(key))
+            rows = matching if rows is None else sorted(set(rows) & set(matching))
+        if rows is None:
+            rows = range(len(self.index))
+        records = [self.index.record(i) for i in rows]
+        if where:
+            matches = [(i, record) for i, record in zip(rows, records)
+                       if all((record["metadata"] or {}).get(key) == value for key, value in where.items())]
+            rows, records = [i for i, _ in matches], [record for _, record in matches]
+        result = {"ids": [record["id"] for record in records]}
+        if "documents" in include:
+            result["documents"] = [self.index.text(i) for i in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [record["metadata"] for record in records]
+        return result
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        return [(self.index.document(i), distance) for i, distance in self.index.search(embedding, k)]
+
+    def similarity_search_by_vectors(self, embeddings: List[List[float]], k: int = 4) -> List[List[Document]]:
+        """Returns the `k` nearest documents of every query vector, all scored in one matrix product."""
+        return [[self.index.document(i) for i, _ in rows] for rows in self.index.search_batch(embeddings, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding_function.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [document for document, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k)
+
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = 20,
+                                                lambda_mult: float = 0.5, **kwargs: Any) -> List[Document]:
+        candidates = [i for i, _ in self.index.search(embedding, fetch_k)]
+        selected = maximal_marginal_relevance(
+            np.array(embedding, dtype=np.float32), self.index.vectors[candidates], lambda_mult=lambda_mult, k=k)
+        return [self.index.document(candidates[i]) for i in selected]
+
+    def max_marginal_relevance_search(self, query: str, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+                                      **kwargs: Any) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self.embedding_function.embed_query(query), k, fetch_k, lambda_mult)
+
+    def _select_relevance_score_fn(self):
+        if self.index.space == "cosine":
+            return self._cosine_relevance_score_fn
+        if self.index.space == "ip":
+            return self._max_inner_product_relevance_score_fn
+        return self._euclidean_relevance_score_fn
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["export", "reduce", "import", "verify"])
+    parser.add_argument("--collection", help=f"collection to export or import into, defaults to {DEFAULT_COLLECTION_NAME} "
+                                             "for export and to the snapshot's own collection for import")
+    parser.add_argument("--snapshot", help="snapshot directory, defaults to the collection's folder under INDEX_SNAPSHOT_DIRECTORY")
+    parser.add_argument("--persist-directory", default=CHROMA_PERSIST_DIRECTORY)
+    parser.add_argument("--dimensions", type=int, default=INDEX_REDUCED_DIMENSIONS,
+                        help="dimensions of the reduced index, for export and reduce")
+    parser.add_argument("--reduction", choices=["pca", "truncate"], default=INDEX_REDUCTION)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    directory = args.snapshot or snapshot_directory(args.collection or DEFAULT_COLLECTION_NAME)
+    if args.command == "verify":
+        damaged = verify_snapshot(directory)
+        print(f"Damaged files: {', '.join(damaged)}" if damaged else f"{directory} is intact")
+        sys.exit(1 if damaged else 0)
+    if args.command == "reduce":
+        manifest = add_reduced_index(directory, args.dimensions, args.reduction)
+        print(json.dumps(manifest["reduced"], indent=2))
+        sys.exit(0)
+
+    client = chromadb.PersistentClient(path=args.persist_directory, settings=chroma_client_settings(args.persist_directory))
+    if args.command == "export":
+        manifest = export_snapshot(client.get_collection(args.collection or DEFAULT_COLLECTION_NAME), directory,
+                                   reduced_dimensions=args.dimensions, reduction=args.reduction)
+        print(json.dumps({key: manifest.get(key) for key in ("collection", "count", "dimensions", "reduced", "files")}, indent=2))
+    else:
+        print(f"Imported {import_snapshot(directory, client, args.collection)} chunks")
@@ -0,0 +1,68 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+from chat_common.ingestion_jobs import IngestionJobQueue
+from app.rag_chatbot_pipeline.data_handler.data_operations import ingest_documents, load_documents
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import refresh_snapshot
+from app.rag_chatbot_pipeline.interaction_handler.chat_operations import tenant_indexes
+from app.rag_chatbot_pipeline.interaction_handler.tenant_registry import TenantConfig
+
+import asyncio
+import logging
+import os
+
+STAGES = ["extract", "chunk", "upsert"]
+
+
+@dataclass
+class IngestionProgress:
+    stage_counts: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(STAGES, 0))
+    errors: List[str] = field(default_factory=list)
+    skipped_sources: int = 0
+    deleted_chunks: int = 0
+
+
+class TenantAssetsIngestion:
+    """Ingests the PDFs of every tenant's assets folder into the tenant's collection.
+
+    Chunks keep their deterministic ids, so only new and changed PDFs are embedded
+    and the chunks of changed ones are replaced. A tenant that fails is reported in
+    `progress.errors` and the others are still ingested. Collections served from a
+    snapshot get it re-exported once they changed.
+
+    Args:
+        tenants (Callable): Returns the tenant configs to ingest, read when the job starts.
+    """
+
+    def __init__(self, tenants: Callable[[], Dict[str, TenantConfig]] = lambda: tenant_indexes.tenants):
+        self.tenants = tenants
+        self.progress = IngestionProgress()
+
+    async def run(self):
+        for config in list(self.tenants().values()):
+            if not config.assets_folder or not os.path.exists(config.assets_folder):
+                continue
+            try:
+                await self._ingest(config)
+            except Exception as e:
+                logging.exception(f"Ingestion of tenant {config.tenant_id} failed")
+                self.progress.errors.append(f"{config.tenant_id}: {type(e).__name__}: {e}")
+        logging.info(f"Ingestion finished: {self.progress.stage_counts}, {self.progress.skipped_sources} sources unchanged, "
+                     f"{self.progress.deleted_chunks} stale chunks deleted")
+
+    async def _ingest(self, config: TenantConfig):
+        documents = await asyncio.to_thread(load_documents, config.assets_folder)
+        if not documents:
+            return
+        _, stats = await asyncio.to_thread(ingest_documents, documents, config.collection_name)
+
+        counts = self.progress.stage_counts
+        counts["extract"] += stats["sources"]
+        counts["chunk"] += stats["chunks"]
+        counts["upsert"] += stats["embedded"]
+        self.progress.skipped_sources += stats["unchanged_sources"]
+        self.progress.deleted_chunks += stats["deleted"]
+        if stats["embedded"] or stats["deleted"]:
+            await asyncio.to_thread(refresh_snapshot, config.collection_name)
+
+
+ingestion_jobs = IngestionJobQueue(TenantAssetsIngestion, STAGES)
@@ -4,53 +4,133 @@ from langchain.chains import RetrievalQA, ConversationalRetrievalChain
 from langchain_openai import ChatOpenAI
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import PromptTemplate
-from app.rag_chatbot_pipeline.data_handler.data_operations import load_documents, split_documents
-from app.rag_chatbot_pipeline.interaction_handler.interaction_operations import initialize_compression_retriever, document_retrieval, initialize_vector_database, retrieve_and_compress_documents
+from langchain.schema import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from app.rag_chatbot_pipeline.interaction_handler.conversation_store import conversation_store
+from chat_common.deadlines import MIN_GENERATION_SECONDS, Deadline, StageTimeout, deadline_metrics, partial_answer
+from chat_common.intent_router import intent_router
+from app.rag_chatbot_pipeline.interaction_handler.interaction_operations import batch_similarity_search, initialize_compression_retriever, document_retrieval, merge_neighbouring_chunks, retrieve_and_compress_documents, source_chunks, summarize_documents
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import ingested_at
+from app.rag_chatbot_pipeline.interaction_handler.keyword_index import KeywordIndex
+from app.rag_chatbot_pipeline.interaction_handler.question_condenser import condense_question
+from chat_common.retrieval_client import retrieval_client
+from chat_common.sentence_limit import max_answer_tokens, sentence_limit, stream_answer
+from app.rag_chatbot_pipeline.interaction_handler.tenant_registry import DEFAULT_TENANT_ID, TenantIndexCache, load_tenant_configs
 
 from app.openai.openai_connectivity import OPENAI_API_KEY
+from collections import Counter
+import logging
 import os
+import re
 
-vector_database = None  
-compression_retriever = None
+# "local" rewrites follow-ups with heuristics, "llm" lets ConversationalRetrievalChain spend a call on it
+QUESTION_CONDENSE_MODE = os.getenv("QUESTION_CONDENSE_MODE", "local")
+# Requests like "summarise the admission policy" get a summary of a whole source instead of a three-chunk answer.
+# Only messages that ask for one qualify, questions merely mentioning a summary or overview are answered as usual.
+SUMMARY_REQUEST_PATTERN = re.compile(
+    r"^\W*(?:(?:please|kindly|can you|could you|would you|will you)\W+)*"
+    r"(?:summari[sz]e\b"
+    r"|(?:give|write|provide|show|send)\s+(?:me\s+|us\s+)?an?\s+(?:short\s+|brief\s+|quick\s+)?(?:summary|overview)\s+of\b"
+    r"|(?:i\s+(?:want|need)|i'd\s+like)\s+an?\s+(?:short\s+|brief\s+|quick\s+)?(?:summary|overview)\s+of\b"
+    r"|tl;?dr\b"
+    r"|what(?:'s|\s+is)\s+the\s+gist\s+of\b)",
+    re.IGNORECASE)
+# Map calls of one summary. Longer sources have neighbouring chunks merged, see merge_neighbouring_chunks
+SUMMARY_MAX_CHUNKS = int(os.getenv("SUMMARY_MAX_CHUNKS", "64"))
+# LLM calls of /chat/batch in flight at once, shared by every batch of this worker
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
+# Chunks retrieved as context for each question of a batch
+CHAT_BATCH_TOP_K = int(os.getenv("CHAT_BATCH_TOP_K", "4"))
+# Time a batch gets for all of its answers unless the client sends its own X-Deadline-Ms
+CHAT_BATCH_DEADLINE_SECONDS = float(os.getenv("CHAT_BATCH_DEADLINE_SECONDS", "120"))
 
-async def load_and_initialize_vector_database():
-    global vector_database
-    if not vector_database:
-        folder_path = os.path.join(os.path.dirname(__file__), "..", "..", "assets")
-        docs = load_documents(folder_path)
-        vector_database = split_documents(docs)
-    else:
-        vector_database = initialize_vector_database()
+tenant_indexes = TenantIndexCache(load_tenant_configs())
+batch_llm_slots = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
 
-async def question_answer(query, chat_history=None, chain_type="stuff"):
+async def question_answer(query, chat_history=None, chain_type="stuff", tenant_id=DEFAULT_TENANT_ID, conversation_id=None,
+                          condense_mode=QUESTION_CONDENSE_MODE, mode="auto", deadline=None):
     """Answers a question based on the content of documents and chat history.
 
     Args:
         query (str): The question to answer.
         chat_history (list, optional): List of previous chat interactions. Defaults to None.
+        tenant_id (str, optional): Tenant whose collection and prompt are used. Defaults to DEFAULT_TENANT_ID.
+        conversation_id (str, optional): Server-side conversation to read the history from and record this turn in.
+            Takes precedence over chat_history. Defaults to None.
+        condense_mode (str, optional): How follow-ups become standalone questions, "local" or "llm".
+            Defaults to QUESTION_CONDENSE_MODE.
+        mode (str, optional): "qa" answers from the retrieved chunks, "summary" summarises the source they
+            mostly come from, "auto" picks "summary" for requests matching SUMMARY_REQUEST_PATTERN.
+        deadline (Deadline, optional): When the answer is due, split into retrieval, compression and generation
+            budgets. Defaults to CHAT_DEADLINE_SECONDS from now.
 
     Returns:
-        dict: A dictionary containing the answer and source documents.
+        dict: A dictionary containing the answer and source documents. When generation would miss the deadline,
+            the top retrieved passages instead, with `partial` set.
+
+    Raises:
+        StageTimeout: If retrieval ran out of time, there is nothing to answer with.
     """
 
-    await load_and_initialize_vector_database()
+    # Small talk is answered from templates, without retrieval or an LLM call
+    fast_answer = intent_router.answer(query)
+    if fast_answer is not None:
+        if conversation_id:
+            conversation_store.append(conversation_id, "user", query)
+            conversation_store.append(conversation_id, "assistant", fast_answer)
+        return {"result": fast_answer, "source_documents": []}
+
+    deadline = deadline or Deadline()
+    tenant = await tenant_indexes.get(tenant_id)
+    vector_database = tenant.vector_database
 
-    global vector_database
-    all_retrieved_documents = document_retrieval(query, vector_database)
-    all_retrieved_documents = [doc.page_content for doc in all_retrieved_documents]
+    # The server-side store only hands back the summary and a token-bounded window of recent turns
+    if conversation_id:
+        chat_history = conversation_store.history(conversation_id)
 
-    global compression_retriever
-    if not compression_retriever:
-        compression_retriever = initialize_compression_retriever(vector_database)
+    user_message = query
+    retrieval_query = query
+    if chat_history and condense_mode == "local":
+        # Standalone question without an extra LLM round-trip, answered by the plain RetrievalQA chain below.
+        # The index is searched with the conversation's keywords too, the LLM only sees the question
+        condensed = condense_question(query, chat_history, await tenant_keyword_index(tenant))
+        query, retrieval_query = condensed.question, condensed.retrieval_query()
+        chat_history = None
+
+    if retrieval_client.enabled:
+        retrieved_documents = await deadline.run("retrieval", retrieval_client.retrieve(retrieval_query, tenant.config.collection_name))
+    else:
+        retrieved_documents = await deadline.run("retrieval", asyncio.to_thread(document_retrieval, retrieval_query, vector_database))
+
+    if mode == "summary" or (mode == "auto" and SUMMARY_REQUEST_PATTERN.match(query)):
+        try:
+            response = await deadline.run("generation", summarize_source(retrieved_documents, vector_database),
+                                          MIN_GENERATION_SECONDS)
+        except StageTimeout:
+            deadline_metrics.record(degraded=True)
+            return partial_answer(retrieved_documents)
+        deadline_metrics.record(degraded=False)
+        if conversation_id:
+            conversation_store.append(conversation_id, "user", user_message)
+            conversation_store.append(conversation_id, "assistant", response["result"])
+        return response
+
+    all_retrieved_documents = [doc.page_content for doc in retrieved_documents]
+
+    if not tenant.compression_retriever:
+        base_retriever = None
+        if retrieval_client.enabled:
+            base_retriever = retrieval_client.as_retriever(tenant.config.collection_name, search_type="mmr")
+        tenant.compression_retriever = initialize_compression_retriever(vector_database, base_retriever)
+    compression_retriever = tenant.compression_retriever
 
     # NOTE : Do not remove any comments. they are method that can be used if needed.
     # compressed_retriever, all_retrieved_documents = retrieve_and_compress_documents(query=query, all_retrieved_documents=all_retrieved_documents, compression_retriever=compression_retriever)
 
-    template = """You are Dawood University's assistant chatbot. Use the following pieces of context to answer the question at the end and instructions given to you here. If you don't know the answer, just say that you don't know, don't try to make up an answer. Use three sentences maximum. Keep the answer as concise as possible. Greet properly in response to a greet.
-    {context}
-    Question: {question}
-    Helpful Answer:"""
-    QA_CHAIN_PROMPT = PromptTemplate.from_template(template)
+    QA_CHAIN_PROMPT = PromptTemplate.from_template(tenant.config.prompt_template)
+    # The prompt's sentence limit caps the answer's tokens, the "stuff" answer below also stops streaming at it
+    llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", openai_api_key=OPENAI_API_KEY,
+                     max_tokens=max_answer_tokens(tenant.config.prompt_template))
 
     memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
     if chat_history:
@@ -59,34 +139,183 @@ async def question_answer(query, chat_history=None, chain_type="stuff"):
                 memory.chat_memory.add_user_message(message["content"])
             elif message["role"] == "assistant":
                 memory.chat_memory.add_ai_message(message["content"])
+            elif message["role"] == "system":
+                memory.chat_memory.add_message(SystemMessage(content=message["content"]))
 
     if chat_history:
         qa = ConversationalRetrievalChain.from_llm(
-            ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", openai_api_key=OPENAI_API_KEY),
+            llm,
             retriever=compression_retriever,
             memory=memory,
-            chain_type_kwargs={'prompt': QA_CHAIN_PROMPT},
+            combine_docs_chain_kwargs={'prompt': QA_CHAIN_PROMPT},
         )
+        inputs = {"question": query}
     else:
         qa = RetrievalQA.from_chain_type(
-            llm=ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", openai_api_key=OPENAI_API_KEY),
+            llm=llm,
             chain_type=chain_type,
             retriever=compression_retriever,
             chain_type_kwargs={'prompt': QA_CHAIN_PROMPT},
             return_source_documents=True,
             verbose=True
         )
-    
-    # Using ainvoke instead of arun
-    response = await qa.ainvoke({"query": query}, {"context": all_retrieved_documents})
+        inputs = {"query": query}
+
+    degraded = False
+    if not chat_history:
+        # Compression has its own budget, without it the answer is based on the plain retrieved chunks
+        try:
+            compressed_documents = await deadline.run("compression", compression_retriever.ainvoke(retrieval_query))
+        except StageTimeout:
+            compressed_documents, degraded = retrieved_documents, True
+
+    try:
+        if chat_history:
+            # Using ainvoke instead of arun
+            response = await deadline.run("generation", qa.ainvoke(inputs), MIN_GENERATION_SECONDS)
+        elif chain_type == "stuff":
+            # What qa.ainvoke does, with the documents compressed above, streamed to stop at the sentence limit
+            context = "\n\n".join(document.page_content for document in compressed_documents)
+            result = await deadline.run("generation", stream_answer(
+                QA_CHAIN_PROMPT | llm | StrOutputParser(), {"context": context, "question": query},
+                sentence_limit(tenant.config.prompt_template)), MIN_GENERATION_SECONDS)
+            response = {"result": result, "source_documents": compressed_documents}
+        else:
+            # What qa.ainvoke does, with the documents compressed above
+            answer = await deadline.run("generation", qa.combine_documents_chain.ainvoke(
+                {"input_documents": compressed_documents, "question": query}), MIN_GENERATION_SECONDS)
+            response = {"result": answer["output_text"], "source_documents": compressed_documents}
+    except StageTimeout:
+        deadline_metrics.record(degraded=True)
+        return partial_answer(retrieved_documents)
+    deadline_metrics.record(degraded=degraded)
     
     # Extracting result and source_document from response
-    result = response.get("result")
+    # (ConversationalRetrievalChain returns the answer under "answer")
+    result = response.get("result") or response.get("answer")
     source_documents = response.get("source_documents", [])
+
+    if conversation_id:
+        conversation_store.append(conversation_id, "user", user_message)
+        conversation_store.append(conversation_id, "assistant", result)
     
     # Returning a dictionary containing the result and source_documents
     return {"result": result, "source_documents": source_documents}
 
+async def tenant_keyword_index(tenant):
+    """Returns the keyword index of a tenant's corpus, rebuilt once an ingest changed the collection.
+
+    Returns:
+        KeywordIndex: The index, None for tenants served by the retrieval service.
+    """
+    if tenant.vector_database is None:
+        return None
+    # Read before building, an ingest finishing meanwhile makes the next request rebuild again
+    stamp = ingested_at(tenant.config.collection_name)
+    if tenant.keyword_index is None or tenant.keyword_stamp != stamp:
+        tenant.keyword_index = await asyncio.to_thread(KeywordIndex.from_vector_database, tenant.vector_database)
+        tenant.keyword_stamp = stamp
+    return tenant.keyword_index
+
+async def summarize_source(retrieved_documents, vector_database, max_chunks=SUMMARY_MAX_CHUNKS):
+    """Summarises the source most of the retrieved chunks come from, all of its chunks with map-reduce.
+
+    Sources of more than `max_chunks` chunks have neighbouring chunks merged, so the map step
+    makes at most `max_chunks` calls. Through the retrieval service only the retrieved chunks
+    of the source are available and summarised.
+
+    Returns:
+        dict: The summary as `result`, the retrieved chunks of the source as `source_documents`,
+        and `partial` when the source was too long to summarise all of it.
+    """
+    sources = Counter(doc.metadata.get("source") for doc in retrieved_documents if doc.metadata.get("source"))
+    if not sources:
+        return {"result": await summarize_documents(retrieved_documents), "source_documents": retrieved_documents}
+
+    source = sources.most_common(1)[0][0]
+    source_documents = [doc for doc in retrieved_documents if doc.metadata.get("source") == source]
+    chunks = source_documents
+    if vector_database is not None:
+        chunks = await asyncio.to_thread(source_chunks, vector_database, source) or source_documents
+    parts, complete = merge_neighbouring_chunks(chunks, max_chunks)
+    if not complete:
+        logging.info(f"{source} is too long to summarise whole, summarising {len(parts)} parts spread across it")
+    logging.info(f"Summarising {len(chunks)} chunks of {source} in {len(parts)} parts")
+    return {"result": await summarize_documents(parts), "source_documents": source_documents, "partial": not complete}
+
+async def question_answer_batch(queries, tenant_id=DEFAULT_TENANT_ID, k=CHAT_BATCH_TOP_K, deadline=None):
+    """Answers independent questions together, yielding each answer as soon as it is ready.
+
+    All questions are embedded in one provider call and searched against the index
+    together, then answered by concurrent LLM calls, at most `CHAT_BATCH_CONCURRENCY`
+    across the batches of this worker. Questions carry no chat history.
+
+    Args:
+        queries (list): The questions to answer.
+        tenant_id (str, optional): Tenant whose collection and prompt are used. Defaults to DEFAULT_TENANT_ID.
+        k (int, optional): Chunks retrieved as context for each question. Defaults to CHAT_BATCH_TOP_K.
+        deadline (Deadline, optional): When the whole batch is due. Retrieval gets its stage budget, and a question
+            whose answer would miss the deadline gets its top passages instead. Defaults to CHAT_BATCH_DEADLINE_SECONDS.
+
+    Yields:
+        dict: In completion order, the question's `index` in `queries` with either `result` and
+            `source_documents` (and `partial` when the deadline cut it short) or `error`.
+
+    Raises:
+        StageTimeout: If retrieval ran out of its budget, no question has been answered beyond small talk then.
+    """
+
+    pending = []
+    for index, query in enumerate(queries):
+        # Small talk is answered from templates, without retrieval or an LLM call
+        fast_answer = intent_router.answer(query)
+        if fast_answer is not None:
+            yield {"index": index, "result": fast_answer, "source_documents": []}
+        else:
+            pending.append(index)
+    if not pending:
+        return
+
+    deadline = deadline or Deadline(CHAT_BATCH_DEADLINE_SECONDS)
+    tenant = await tenant_indexes.get(tenant_id)
+    questions = [queries[index] for index in pending]
+    if retrieval_client.enabled:
+        retrieved = await deadline.run("retrieval", retrieval_client.retrieve_batch([
+            {"query": query, "collection": tenant.config.collection_name, "mode": "similarity", "k": k} for query in questions]))
+    else:
+        retrieved = await deadline.run("retrieval", batch_similarity_search(questions, tenant.vector_database, k))
+
+    chain = (PromptTemplate.from_template(tenant.config.prompt_template)
+             | ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", openai_api_key=OPENAI_API_KEY,
+                          max_tokens=max_answer_tokens(tenant.config.prompt_template))
+             | StrOutputParser())
+    limit = sentence_limit(tenant.config.prompt_template)
+
+    async def answer(index, query, documents):
+        try:
+            async with batch_llm_slots:
+                context = "\n\n".join(document.page_content for document in documents)
+                result = await deadline.run("generation", stream_answer(chain, {"context": context, "question": query}, limit),
+                                            MIN_GENERATION_SECONDS)
+            deadline_metrics.record(degraded=False)
+            return {"index": index, "result": result, "source_documents": documents}
+        except StageTimeout:
+            deadline_metrics.record(degraded=True)
+            return {"index": index, **partial_answer(documents)}
+        except Exception as e:
+            logging.exception(f"Batch question {index} failed")
+            return {"index": index, "error": str(e)}
+
+    tasks = [asyncio.create_task(answer(index, query, documents))
+             for index, query, documents in zip(pending, questions, retrieved)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The client went away mid-stream, don't keep paying for answers nobody reads
+        for task in tasks:
+            task.cancel()
+
 async def main():
     query = "What is the name of university?"
     response = await question_answer(query)
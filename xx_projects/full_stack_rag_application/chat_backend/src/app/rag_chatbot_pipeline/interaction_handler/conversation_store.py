@@ -0,0 +1,244 @@
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Awaitable, Callable, List, Optional
+from langchain_openai import ChatOpenAI
+from app.openai.openai_connectivity import OPENAI_API_KEY
+
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import tiktoken
+
+CONVERSATION_STORE_PATH = os.getenv("CONVERSATION_STORE_PATH", os.path.join(os.path.dirname(__file__), "..", "..", "conversation_store.sqlite3"))
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1200"))
+CONVERSATION_TTL_SECONDS = int(os.getenv("CONVERSATION_TTL_SECONDS", "3600"))
+# Turns waiting for summarisation are capped so a failing summariser can't grow a session forever
+MAX_PENDING_TOKENS = 4 * CONVERSATION_TOKEN_BUDGET
+# How long a worker may take to summarise a session before another worker takes the turns over
+SUMMARY_LEASE_SECONDS = 120
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads its tables on first use, which fails on hosts without egress
+        logging.warning(f"Falling back to approximate token counts: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        # Roughly four characters per token for English text
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass
+class ConversationTurn:
+    role: str
+    content: str
+    tokens: int
+
+
+@dataclass
+class ConversationSession:
+    conversation_id: str
+    turns: List[ConversationTurn] = field(default_factory=list)
+    pending: List[ConversationTurn] = field(default_factory=list)
+    summary: str = ""
+    last_access: float = field(default_factory=time.time)
+
+    def window_tokens(self) -> int:
+        return sum(turn.tokens for turn in self.turns)
+
+
+async def summarise_turns(summary: str, turns: List[ConversationTurn]) -> str:
+    """Folds older turns into the running conversation summary with one LLM call."""
+    transcript = "\n".join(f"{turn.role}: {turn.content}" for turn in turns)
+    prompt = f"""Update the summary of a conversation between a user and an assistant chatbot. Keep names, programs, dates and other facts the user may refer back to. Answer with the new summary only, in at most five sentences.
+    Current summary: {summary or "(empty)"}
+    New turns:
+    {transcript}
+    New summary:"""
+
+    llm = ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", openai_api_key=OPENAI_API_KEY)
+    response = await llm.ainvoke(prompt)
+    return response.content.strip()
+
+
+class ConversationStore:
+    """Server-side chat history keyed by conversation id, shared by every worker through sqlite.
+
+    Each session keeps a rolling window of recent turns under `token_budget`.
+    Turns pushed out of the window are compressed into a running summary by a
+    background task, so the request path never waits on summarisation. The
+    worker that summarises holds a lease on the session, so two workers never
+    fold the same turns twice, and a worker that dies mid-summary only blocks
+    the session until the lease runs out. Sessions idle for longer than
+    `ttl_seconds` are dropped by `evict_expired`.
+    """
+
+    def __init__(self, token_budget: int = CONVERSATION_TOKEN_BUDGET, ttl_seconds: int = CONVERSATION_TTL_SECONDS,
+                 summariser: Callable[[str, List[ConversationTurn]], Awaitable[str]] = summarise_turns,
+                 path: str = CONVERSATION_STORE_PATH):
+        self.token_budget = token_budget
+        self.ttl_seconds = ttl_seconds
+        self.summariser = summariser
+        self._tasks: set = set()
+        self._lock = threading.Lock()
+        # Autocommit, transactions are opened explicitly with BEGIN IMMEDIATE so workers don't interleave
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                summary TEXT NOT NULL DEFAULT '',
+                last_access REAL NOT NULL,
+                summarising_until REAL NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS turns (
+                turn_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                tokens INTEGER NOT NULL,
+                pending INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS turns_by_conversation ON turns (conversation_id, turn_id);
+        """)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def _touch(self, connection, conversation_id: str):
+        connection.execute(
+            "INSERT INTO conversations (conversation_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT (conversation_id) DO UPDATE SET last_access = excluded.last_access",
+            (conversation_id, time.time()))
+
+    def _turns(self, connection, conversation_id: str, pending: bool) -> List[tuple]:
+        return connection.execute(
+            "SELECT turn_id, role, content, tokens FROM turns WHERE conversation_id = ? AND pending = ? ORDER BY turn_id",
+            (conversation_id, int(pending))).fetchall()
+
+    def session(self, conversation_id: Optional[str] = None) -> ConversationSession:
+        """Returns the session for the id, starting a new one if it is unknown or missing."""
+        conversation_id = conversation_id or uuid.uuid4().hex
+        with self._transaction() as connection:
+            self._touch(connection, conversation_id)
+            (summary, last_access) = connection.execute(
+                "SELECT summary, last_access FROM conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
+            turns = [ConversationTurn(*row[1:]) for row in self._turns(connection, conversation_id, pending=False)]
+            pending = [ConversationTurn(*row[1:]) for row in self._turns(connection, conversation_id, pending=True)]
+        return ConversationSession(conversation_id, turns, pending, summary, last_access)
+
+    def history(self, conversation_id: str) -> List[dict]:
+        """Returns the summary and the recent window as chat_history messages."""
+        session = self.session(conversation_id)
+        messages = [{"role": "system", "content": f"Summary of the earlier conversation: {session.summary}"}] if session.summary else []
+        messages.extend({"role": turn.role, "content": turn.content} for turn in session.turns)
+        return messages
+
+    def append(self, conversation_id: str, role: str, content: str):
+        """Adds a turn and moves the oldest turns out of the window once it exceeds the budget."""
+        tokens = count_tokens(content)
+        with self._transaction() as connection:
+            self._touch(connection, conversation_id)
+            connection.execute("INSERT INTO turns (conversation_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                               (conversation_id, role, content, tokens))
+
+            window = self._turns(connection, conversation_id, pending=False)
+            window_tokens = sum(row[3] for row in window)
+            moved = []
+            while len(window) > 1 and window_tokens > self.token_budget:
+                turn = window.pop(0)
+                window_tokens -= turn[3]
+                moved.append(turn[0])
+            connection.executemany("UPDATE turns SET pending = 1 WHERE turn_id = ?", [(turn_id,) for turn_id in moved])
+
+            pending = self._turns(connection, conversation_id, pending=True)
+            pending_tokens = sum(row[3] for row in pending)
+            dropped = []
+            while pending and pending_tokens > MAX_PENDING_TOKENS:
+                turn = pending.pop(0)
+                pending_tokens -= turn[3]
+                dropped.append(turn[0])
+            connection.executemany("DELETE FROM turns WHERE turn_id = ?", [(turn_id,) for turn_id in dropped])
+
+            # Take the summary lease unless another summary of this session is in flight
+            claimed = pending and connection.execute(
+                "UPDATE conversations SET summarising_until = ? WHERE conversation_id = ? AND summarising_until < ?",
+                (time.time() + SUMMARY_LEASE_SECONDS, conversation_id, time.time())).rowcount
+
+        if claimed:
+            self._schedule_summary(conversation_id)
+
+    def _schedule_summary(self, conversation_id: str):
+        task = asyncio.get_running_loop().create_task(self._summarise(conversation_id))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _summarise(self, conversation_id: str):
+        try:
+            while True:
+                with self._transaction() as connection:
+                    row = connection.execute(
+                        "SELECT summary FROM conversations WHERE conversation_id = ?", (conversation_id,)).fetchone()
+                    pending = self._turns(connection, conversation_id, pending=True)
+                if row is None or not pending:
+                    return
+                try:
+                    summary = await self.summariser(row[0], [ConversationTurn(*turn[1:]) for turn in pending])
+                except Exception as e:
+                    # The turns stay pending, so the next append retries them
+                    logging.error(f"Failed to summarise conversation {conversation_id}: {e}")
+                    return
+                with self._transaction() as connection:
+                    connection.execute("UPDATE conversations SET summary = ? WHERE conversation_id = ?", (summary, conversation_id))
+                    connection.executemany("DELETE FROM turns WHERE turn_id = ?", [(turn[0],) for turn in pending])
+        finally:
+            with self._transaction() as connection:
+                connection.execute("UPDATE conversations SET summarising_until = 0 WHERE conversation_id = ?", (conversation_id,))
+
+    def evict_expired(self):
+        """Drops sessions that have been idle for longer than `ttl_seconds`."""
+        cutoff = time.time() - self.ttl_seconds
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM turns WHERE conversation_id IN "
+                               "(SELECT conversation_id FROM conversations WHERE last_access < ?)", (cutoff,))
+            connection.execute("DELETE FROM conversations WHERE last_access < ?", (cutoff,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (sessions,) = self._connection.execute("SELECT COUNT(*) FROM conversations").fetchone()
+        return {
+            "sessions": sessions,
+            "summaries_in_flight": len(self._tasks),
+            "token_budget": self.token_budget,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+conversation_store = ConversationStore()
@@ -1,12 +1,27 @@
 from langchain_openai import OpenAIEmbeddings
+from langchain.schema import Document
 from app.openai.openai_connectivity import OPENAI_API_KEY  # Assuming correct import
 from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAI
+from langchain_openai import ChatOpenAI, OpenAI
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import LLMChainExtractor
 from langchain.chains.summarize import load_summarize_chain
-
+from app.rag_chatbot_pipeline.data_handler.data_operations import CHROMA_PERSIST_DIRECTORY, DEFAULT_COLLECTION_NAME, chroma_client_settings, chunk_hash
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import SnapshotIndex, SnapshotVectorStore
+from app.rag_chatbot_pipeline.interaction_handler.summary_cache import SummaryCache, summary_cache, summary_key
+import asyncio
+import logging
+import math
 import os
+import random
+
+# Chunk and partial summaries requested from the LLM at once by one summary
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "8"))
+SUMMARY_MAX_RETRIES = int(os.getenv("SUMMARY_MAX_RETRIES", "3"))
+# Summaries combined by one reduce call, more levels are added until one summary is left
+SUMMARY_REDUCE_FAN_IN = int(os.getenv("SUMMARY_REDUCE_FAN_IN", "8"))
+# Text one map call of a summary may get when neighbouring chunks are merged, about 3000 tokens
+SUMMARY_MAP_MAX_CHARS = int(os.getenv("SUMMARY_MAP_MAX_CHARS", "12000"))
 
 # Module 1: Document Retrieval
 def document_retrieval(query, vector_database):
@@ -34,15 +49,33 @@ def document_retrieval(query, vector_database):
     return all_retrieved_documents
 
 
+async def batch_similarity_search(queries, vector_database, k=4):
+    """Retrieves the `k` most similar chunks of every query, with all queries embedded in one provider call.
+
+    A snapshot scores the whole query matrix against the index at once, Chroma answers all query
+    embeddings of one `query` call together.
+    """
+
+    vectors = await vector_database.embeddings.aembed_documents(queries)
+    if isinstance(vector_database, SnapshotVectorStore):
+        return await asyncio.to_thread(vector_database.similarity_search_by_vectors, vectors, k)
+
+    results = await asyncio.to_thread(vector_database._collection.query, query_embeddings=vectors, n_results=k,
+                                      include=["documents", "metadatas"])
+    return [[Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+            for texts, metadatas in zip(results["documents"], results["metadatas"])]
+
+
 # Module 2: Vector Database Initialization
-def initialize_vector_database():
+def initialize_vector_database(collection_name=DEFAULT_COLLECTION_NAME):
     """Initializes and returns a Chroma vector database with OpenAI embeddings."""
 
     embeddings = OpenAIEmbeddings(openai_api_type=OPENAI_API_KEY)
-    directory_to_persist = os.path.join(os.path.dirname(__file__), "..", "..", "chroma_store")
     vector_database = Chroma(
-        persist_directory=directory_to_persist,
-        embedding_function=embeddings
+        collection_name=collection_name,
+        persist_directory=CHROMA_PERSIST_DIRECTORY,
+        embedding_function=embeddings,
+        client_settings=chroma_client_settings(),
     )
 
     # (Optional) Print statement for debugging
@@ -51,15 +84,28 @@ def initialize_vector_database():
     return vector_database
 
 
+def initialize_snapshot_vector_database(snapshot_directory):
+    """Returns a read-only vector database over a memory-mapped index snapshot, with OpenAI embeddings for queries."""
+
+    embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+    vector_database = SnapshotVectorStore(SnapshotIndex(snapshot_directory), embeddings)
+    logging.info(f"Mapped snapshot {snapshot_directory} ({vector_database.count()} chunks)")
+
+    return vector_database
+
+
 # Module 3: Compression Retriever Initialization
-def initialize_compression_retriever(vector_database):
-    """Initializes and returns a ContextualCompressionRetriever for document compression."""
+def initialize_compression_retriever(vector_database, base_retriever=None):
+    """Initializes and returns a ContextualCompressionRetriever for document compression.
+
+    `base_retriever` replaces the MMR retriever of the vector database, e.g. with one of the retrieval service.
+    """
 
     llm = OpenAI(api_key=OPENAI_API_KEY)
     compressor = LLMChainExtractor.from_llm(llm)
     compression_retriever = ContextualCompressionRetriever(
         base_compressor=compressor,
-        base_retriever=vector_database.as_retriever(search_type="mmr")
+        base_retriever=base_retriever or vector_database.as_retriever(search_type="mmr")
     )
 
     return compression_retriever
@@ -76,6 +122,103 @@ def retrieve_and_compress_documents(query, all_retrieved_documents, compression_
 
 
 
+# Module 5: Map-Reduce Summarisation
+def source_chunks(vector_database, source):
+    """Returns every chunk of a source in document order."""
+
+    result = vector_database.get(where={"source": source}, include=["documents", "metadatas"])
+    chunks = [Document(page_content=text, metadata=metadata or {})
+              for text, metadata in zip(result["documents"], result["metadatas"])]
+    return sorted(chunks, key=lambda chunk: (chunk.metadata.get("page", 0), chunk.metadata.get("start_index", 0)))
+
+
+def merge_neighbouring_chunks(chunks, max_parts, max_chars=SUMMARY_MAP_MAX_CHARS):
+    """Merges neighbouring chunks into at most `max_parts` parts, each summarised by one map call.
+
+    Parts stay within `max_chars` where possible. A source too long for that is split into
+    parts of `max_chars` and `max_parts` of them are taken evenly spread across it.
+
+    Args:
+        chunks (list): The chunks of one source, in document order.
+        max_parts (int): Map calls the summary may make.
+        max_chars (int, optional): Text one part should hold at most.
+
+    Returns:
+        tuple: The parts as documents, and whether they cover the whole source.
+    """
+
+    if len(chunks) <= max_parts:
+        return chunks, True
+
+    average_chars = sum(len(chunk.page_content) for chunk in chunks) / len(chunks)
+    per_part = min(math.ceil(len(chunks) / max_parts), max(1, int(max_chars // max(average_chars, 1))))
+    parts = []
+    for i in range(0, len(chunks), per_part):
+        group = chunks[i:i + per_part]
+        text = "\n".join(chunk.page_content for chunk in group)
+        parts.append(Document(page_content=text, metadata={**group[0].metadata, "content_hash": chunk_hash(text)}))
+
+    if len(parts) <= max_parts:
+        return parts, True
+    step = len(parts) / max_parts
+    return [parts[int(i * step)] for i in range(max_parts)], False
+
+
+async def summarize_documents(documents, llm=None, cache: SummaryCache = summary_cache, concurrency=SUMMARY_CONCURRENCY,
+                              max_retries=SUMMARY_MAX_RETRIES, fan_in=SUMMARY_REDUCE_FAN_IN, backoff_factor=0.5):
+    """Summarises any number of chunks with a concurrent map and a hierarchical reduce.
+
+    Every chunk is summarised on its own, at most `concurrency` LLM calls at a time,
+    and each summary is cached by the chunk's content hash so unchanged chunks are
+    never summarised twice. The summaries are then combined `fan_in` at a time,
+    level by level, so no call gets more than `fan_in` summaries however long the
+    source is. Failed calls are retried with exponential backoff and jitter.
+
+    Args:
+        documents (list): The chunks, in document order.
+        llm (optional): The chat model. Defaults to gpt-3.5-turbo.
+        cache (SummaryCache, optional): Where chunk summaries are kept.
+
+    Returns:
+        str: The summary, empty without documents.
+    """
+
+    llm = llm or ChatOpenAI(temperature=0, model_name="gpt-3.5-turbo", openai_api_key=OPENAI_API_KEY)
+    chain = load_summarize_chain(llm, chain_type="stuff")
+    model = getattr(llm, "model_name", type(llm).__name__)
+    prompt = chain.llm_chain.prompt.template
+    limit = asyncio.Semaphore(concurrency)
+
+    async def summarize(texts):
+        for attempt in range(max_retries + 1):
+            try:
+                async with limit:
+                    response = await chain.ainvoke({"input_documents": [Document(page_content=text) for text in texts]})
+                return response["output_text"].strip()
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                logging.warning(f"Summary call failed ({type(e).__name__}: {e}), retrying")
+            # Sleep outside the semaphore so waiting retries don't hold slots
+            await asyncio.sleep(backoff_factor * (2 ** attempt) * (0.5 + random.random()))
+
+    async def summarize_chunk(document):
+        key = summary_key(document.metadata.get("content_hash") or chunk_hash(document.page_content), model, prompt)
+        summary = cache.get(key)
+        if summary is None:
+            summary = await summarize([document.page_content])
+            cache.put(key, summary)
+        return summary
+
+    summaries = list(await asyncio.gather(*(summarize_chunk(document) for document in documents)))
+    while len(summaries) > 1:
+        groups = [summaries[i:i + max(fan_in, 2)] for i in range(0, len(summaries), max(fan_in, 2))]
+        summaries = list(await asyncio.gather(*(summarize(group) if len(group) > 1 else asyncio.sleep(0, group[0])
+                                               for group in groups)))
+    return summaries[0] if summaries else ""
+
+
+
 # Helper Function
 def pretty_print_docs(docs):
     """Prints the document contents in a more readable format."""
@@ -0,0 +1,71 @@
+from collections import Counter
+from typing import Dict, List, Tuple
+
+import math
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9\-]*")
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how
+i if in into is it its itself just me more most my no nor not now of off on once only or other our ours out over own
+please same she should so some such tell than that the their theirs them then there these they this those through to
+too under until up very was we were what when where which while who whom why will with would you your yours
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+class KeywordIndex:
+    """BM25 term index over the chunk texts of a collection.
+
+    Complements the vector store: `idf` tells which words of a question are
+    distinctive for the corpus, and `search` gives lexical matches for hybrid
+    retrieval.
+    """
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies: List[Counter] = [Counter(tokenize(text)) for text in texts]
+        self.lengths = [sum(tf.values()) for tf in self.term_frequencies]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.document_frequency: Dict[str, int] = Counter(term for tf in self.term_frequencies for term in tf)
+        self.postings: Dict[str, List[int]] = {}
+        for i, tf in enumerate(self.term_frequencies):
+            for term in tf:
+                self.postings.setdefault(term, []).append(i)
+
+    @classmethod
+    def from_vector_database(cls, vector_database) -> "KeywordIndex":
+        """Builds the index from every chunk stored in a Chroma collection."""
+        documents = vector_database.get(include=["documents"])["documents"]
+        return cls([text or "" for text in documents])
+
+    def __len__(self) -> int:
+        return len(self.term_frequencies)
+
+    def idf(self, term: str) -> float:
+        df = self.document_frequency.get(term, 0)
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def keywords(self, text: str, limit: int = 5) -> List[str]:
+        """Returns the most distinctive corpus terms of the text, best first.
+
+        Terms the corpus has never seen are skipped, they can't help retrieval.
+        """
+        terms = {term for term in tokenize(text) if term in self.document_frequency}
+        return sorted(terms, key=self.idf, reverse=True)[:limit]
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[int, float]]:
+        """Returns (chunk position, BM25 score) pairs for the best lexical matches."""
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            idf = self.idf(term)
+            for i in self.postings.get(term, ()):
+                tf = self.term_frequencies[i][term]
+                norm = tf + self.k1 * (1 - self.b + self.b * self.lengths[i] / (self.average_length or 1))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from typing import List, Optional
+from app.rag_chatbot_pipeline.interaction_handler.keyword_index import STOPWORDS, KeywordIndex, tokenize
+
+import re
+
+HISTORY_TURNS = 4
+MAX_KEYWORDS = 6
+
+# Only pronouns standing for a whole noun phrase, "this fee" or "her office" already name their noun
+PRONOUN_PATTERN = re.compile(r"\b(it|they|them)\b", re.IGNORECASE)
+ELLIPSIS_PATTERN = re.compile(r"^\s*(?:and\s+)?(?:what|how)\s+about\s+(.+?)\??\s*$", re.IGNORECASE)
+ENTITY_PATTERN = re.compile(r"[A-Z][\w'&\-]*(?:\s+(?:of|for|and|&)?\s*[A-Z][\w'&\-]*)*")
+WORD_PATTERN = re.compile(r"[\w'&\-]+")
+DETERMINERS = {"the", "a", "an"}
+# Join two nouns into one phrase, as in "fee for the BS program"
+CONNECTORS = {"of", "for", "and", "&"}
+
+
+@dataclass
+class CondensedQuestion:
+    question: str
+    keywords: List[str]
+    rewritten: bool
+
+    def retrieval_query(self) -> str:
+        """The question followed by the keywords it doesn't already contain, for searching the index."""
+        contained = set(tokenize(self.question))
+        missing = [keyword for keyword in self.keywords if keyword not in contained]
+        return " ".join([self.question.rstrip()] + missing)
+
+
+def extract_entities(text: str) -> List[str]:
+    """Returns capitalised spans such as "Dawood University" or "BS Computer Science".
+
+    A single capitalised word at the start of a sentence is only kept when it is
+    not a stopword, so "What" or "The" aren't mistaken for entities.
+    """
+    entities = []
+    for match in ENTITY_PATTERN.finditer(text):
+        span = match.group(0).strip()
+        if " " not in span and span.lower() in STOPWORDS:
+            continue
+        entities.append(span)
+    return entities
+
+
+def extract_noun_phrases(text: str) -> List[str]:
+    """Returns noun phrases such as "the admission fee for the BS program" or "Dawood University".
+
+    A phrase starts at an article and takes the content words after it, continuing
+    across "of", "for" and "and" when another content word follows. Capitalised
+    spans are phrases of their own, except a single word starting a sentence, which
+    is more likely a verb such as "Explain".
+    """
+    words = list(WORD_PATTERN.finditer(text))
+    phrases, i = [], 0
+    while i < len(words):
+        if words[i].group(0).lower() not in DETERMINERS:
+            i += 1
+            continue
+        start, end, i = i, None, i + 1
+        while i < len(words):
+            lowered = words[i].group(0).lower()
+            if lowered not in STOPWORDS and lowered not in CONNECTORS:
+                end = i
+            elif not (lowered in CONNECTORS or lowered in DETERMINERS) or end is None:
+                break
+            # A trailing connector or article isn't part of the phrase, `end` stays at the last content word
+            i += 1
+        if end is not None:
+            phrases.append(text[words[start].start():words[end].end()])
+
+    for match in ENTITY_PATTERN.finditer(text):
+        span = match.group(0).strip()
+        before = text[:match.start()].rstrip()
+        sentence_start = not before or before[-1] in ".?!"
+        if " " not in span and (span.lower() in STOPWORDS or sentence_start):
+            continue
+        if not any(span in phrase for phrase in phrases):
+            phrases.append(span)
+    return phrases
+
+
+def _best_phrase(messages: List[dict], keyword_index: Optional[KeywordIndex], extract=extract_noun_phrases) -> Optional[str]:
+    # The latest user turn is the most likely antecedent, then the assistant's answers
+    ordered = [m for m in reversed(messages) if m["role"] == "user"] + [m for m in reversed(messages) if m["role"] == "assistant"]
+    for message in ordered:
+        phrases = extract(message["content"])
+        if phrases:
+            if keyword_index is None:
+                return max(phrases, key=lambda p: len(tokenize(p)))
+            return max(phrases, key=lambda p: sum(keyword_index.idf(t) for t in tokenize(p)))
+    return None
+
+
+def _substitute(question: str, pronoun: re.Match, phrase: str) -> str:
+    first, rest = phrase.split(" ", 1) if " " in phrase else (phrase, "")
+    # "The fee" is "the fee" inside a sentence and the other way round at its start
+    if first.lower() in DETERMINERS:
+        first = first.capitalize() if pronoun.start() == 0 else first.lower()
+    replacement = f"{first} {rest}" if rest else first
+    return question[:pronoun.start()] + replacement + question[pronoun.end():]
+
+
+def _keywords(text: str, keyword_index: Optional[KeywordIndex], limit: int = MAX_KEYWORDS) -> List[str]:
+    if keyword_index is not None:
+        return keyword_index.keywords(text, limit)
+    return list(dict.fromkeys(tokenize(text)))[:limit]
+
+
+def condense_question(question: str, chat_history: Optional[List[dict]], keyword_index: Optional[KeywordIndex] = None) -> CondensedQuestion:
+    """Rewrites a follow-up into a standalone question without calling the LLM.
+
+    "it", "they" and "them" are replaced with the most salient noun phrase of the
+    recent turns, elliptical follow-ups ("what about the MBA?") reuse the previous
+    question with its entity swapped, and distinctive corpus keywords of the recent
+    turns are carried over to the retrieval query when the question has few of its own.
+
+    Args:
+        question (str): The user's latest message.
+        chat_history (list, optional): Previous messages as {"role", "content"} dicts.
+        keyword_index (KeywordIndex, optional): Term statistics of the tenant's corpus.
+
+    Returns:
+        CondensedQuestion: The standalone question and the keywords to retrieve with, see `retrieval_query`.
+    """
+    recent = [m for m in (chat_history or []) if m["role"] in ("user", "assistant")][-HISTORY_TURNS:]
+    own_keywords = _keywords(question, keyword_index)
+
+    pronoun = PRONOUN_PATTERN.search(question)
+    ellipsis = ELLIPSIS_PATTERN.match(question)
+    if not recent or not (pronoun or ellipsis or not own_keywords):
+        return CondensedQuestion(question, own_keywords, False)
+
+    entity = _best_phrase(recent, keyword_index, extract_entities)
+    previous_question = next((m["content"] for m in reversed(recent) if m["role"] == "user"), None)
+    standalone = question
+
+    if ellipsis and previous_question:
+        subject = ellipsis.group(1).strip()
+        if entity and entity in previous_question:
+            preceding = previous_question[:previous_question.index(entity)].split()
+            if preceding and preceding[-1].lower() in DETERMINERS and subject.split()[0].lower() in DETERMINERS:
+                subject = subject.split(" ", 1)[1] if " " in subject else subject  # no "the the MBA"
+            standalone = previous_question.replace(entity, subject, 1)
+        else:
+            standalone = f"{previous_question.rstrip(' ?')} for {subject}?"
+    elif pronoun:
+        phrase = _best_phrase(recent, keyword_index)
+        if phrase:
+            standalone = _substitute(question, pronoun, phrase)
+
+    keywords = _keywords(standalone, keyword_index)
+    carried = []
+    if len(keywords) < 2:
+        # Searched with, see `retrieval_query`, but kept out of the question the LLM answers
+        history_text = " ".join(m["content"] for m in recent if m["role"] == "user")
+        carried = [k for k in _keywords(history_text, keyword_index) if k not in keywords][:MAX_KEYWORDS - len(keywords)]
+        keywords += carried
+
+    return CondensedQuestion(standalone, keywords, standalone != question or bool(carried))
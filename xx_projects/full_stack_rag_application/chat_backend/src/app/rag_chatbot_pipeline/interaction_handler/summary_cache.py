@@ -0,0 +1,63 @@
+from typing import Optional
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", os.path.join(os.path.dirname(__file__), "..", "..", "summary_cache.sqlite3"))
+
+
+def summary_key(content_hash: str, model: str, prompt: str) -> str:
+    """Key of a chunk summary: the chunk's content, and the model and prompt that summarised it."""
+    return hashlib.sha256(f"{content_hash}\x00{model}\x00{prompt}".encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    """Persistent summaries of single chunks, keyed by `summary_key`.
+
+    A chunk keeps its key for as long as its text is unchanged, so summarising a
+    re-ingested source only calls the LLM for the chunks that actually changed.
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                key TEXT PRIMARY KEY,
+                summary TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._connection.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._connection.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return row[0] if row else None
+
+    def put(self, key: str, summary: str):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created_at) VALUES (?, ?, ?)", (key, summary, time.time()))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            (count,) = self._connection.execute("SELECT COUNT(*) FROM summaries").fetchone()
+        return {"summaries": count, "hits": self.hits, "misses": self.misses}
+
+
+summary_cache = SummaryCache()
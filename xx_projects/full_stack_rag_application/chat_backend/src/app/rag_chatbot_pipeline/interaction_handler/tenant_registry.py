@@ -0,0 +1,195 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from app.rag_chatbot_pipeline.data_handler.data_operations import DEFAULT_COLLECTION_NAME, load_documents, split_documents
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import MANIFEST, snapshot_directory
+from app.rag_chatbot_pipeline.interaction_handler.interaction_operations import initialize_snapshot_vector_database, initialize_vector_database
+from chat_common.retrieval_client import retrieval_client
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+ASSETS_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "..", "assets")
+TENANTS_CONFIG_PATH = os.getenv("TENANTS_CONFIG", os.path.join(os.path.dirname(__file__), "..", "..", "tenants.json"))
+DEFAULT_TENANT_ID = os.getenv("DEFAULT_TENANT_ID", "dawood")
+TENANT_CACHE_MAX_BYTES = int(os.getenv("TENANT_CACHE_MAX_MB", "512")) * 1024 * 1024
+TENANT_IDLE_SECONDS = int(os.getenv("TENANT_IDLE_SECONDS", "1800"))
+# "chroma" opens the persisted store, "snapshot" maps the exported index snapshot and falls back to Chroma without one
+INDEX_SERVING_MODE = os.getenv("INDEX_SERVING_MODE", "chroma")
+
+# Rough resident cost of one chunk: a 1536-d float32 vector, its text and HNSW links
+BYTES_PER_CHUNK = 1536 * 4 + 2048
+# A mapped snapshot lives in the page cache shared by every worker, only the decoded rows are private
+MAPPED_BYTES_PER_CHUNK = 64
+
+DAWOOD_TEMPLATE = """You are Dawood University's assistant chatbot. Use the following pieces of context to answer the question at the end and instructions given to you here. If you don't know the answer, just say that you don't know, don't try to make up an answer. Use three sentences maximum. Keep the answer as concise as possible. Greet properly in response to a greet.
+    {context}
+    Question: {question}
+    Helpful Answer:"""
+
+SCOUTS_TEMPLATE = """You are Scout's assistant chatbot. Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer. Use three sentences maximum. Keep the answer as concise as possible. Greet properly in response to a greet.
+    {context}
+    Question: {question}
+    Helpful Answer:"""
+
+
+@dataclass
+class TenantConfig:
+    tenant_id: str
+    collection_name: str
+    prompt_template: str
+    assets_folder: Optional[str] = None
+
+
+@dataclass
+class LoadedTenant:
+    config: TenantConfig
+    vector_database: Any
+    size_bytes: int
+    last_used: float
+    compression_retriever: Any = None
+    keyword_index: Any = None
+    # Ingest stamp of the collection when keyword_index was built, see index_snapshot.mark_ingested
+    keyword_stamp: Optional[float] = None
+    snapshot_mtime: Optional[float] = None
+
+
+def load_tenant_configs(config_path: str = TENANTS_CONFIG_PATH) -> Dict[str, TenantConfig]:
+    """Returns the built-in tenants, extended or overridden by the entries of `tenants.json`.
+
+    The file holds a list of objects with `tenant_id`, `collection_name`,
+    `prompt_template` and optionally `assets_folder`.
+    """
+    tenants = {
+        "dawood": TenantConfig("dawood", DEFAULT_COLLECTION_NAME, DAWOOD_TEMPLATE, ASSETS_DIRECTORY),
+        "scouts": TenantConfig("scouts", "scouts", SCOUTS_TEMPLATE, os.path.join(ASSETS_DIRECTORY, "scouts")),
+    }
+
+    if os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as file:
+            for entry in json.load(file):
+                tenants[entry["tenant_id"]] = TenantConfig(**entry)
+
+    return tenants
+
+
+class TenantIndexCache:
+    """Memory-bounded LRU of the vector databases of the tenants served by this process.
+
+    Collections are opened lazily from the persisted store on first use. Least
+    recently used tenants are dropped once the estimated size exceeds `max_bytes`,
+    and tenants idle for longer than `idle_seconds` are dropped by `evict_idle`.
+    """
+
+    def __init__(self, tenants: Dict[str, TenantConfig], max_bytes: int = TENANT_CACHE_MAX_BYTES,
+                 idle_seconds: int = TENANT_IDLE_SECONDS):
+        self.tenants = tenants
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._loaded: "OrderedDict[str, LoadedTenant]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    async def get(self, tenant_id: str) -> LoadedTenant:
+        """Returns the loaded tenant, opening its collection if needed.
+
+        Raises:
+            KeyError: If the tenant id is not configured.
+        """
+        if tenant_id not in self.tenants:
+            raise KeyError(tenant_id)
+
+        loaded = self._touch(tenant_id)
+        if loaded:
+            return loaded
+
+        lock = self._locks.setdefault(tenant_id, asyncio.Lock())
+        async with lock:
+            loaded = self._touch(tenant_id)
+            if loaded:
+                return loaded
+
+            # Opening a collection hits sqlite and may embed documents, keep it off the event loop
+            loaded = await asyncio.to_thread(self._load, self.tenants[tenant_id])
+            self._loaded[tenant_id] = loaded
+            self.loads += 1
+            self._evict_to_fit()
+            return loaded
+
+    def _touch(self, tenant_id: str) -> Optional[LoadedTenant]:
+        loaded = self._loaded.get(tenant_id)
+        if loaded:
+            loaded.last_used = time.monotonic()
+            self._loaded.move_to_end(tenant_id)
+        return loaded
+
+    def _load(self, config: TenantConfig) -> LoadedTenant:
+        if retrieval_client.enabled:
+            # The retrieval service holds the index, this process only keeps the tenant's config
+            return LoadedTenant(config, None, 0, time.monotonic())
+
+        if INDEX_SERVING_MODE == "snapshot":
+            manifest_path = os.path.join(snapshot_directory(config.collection_name), MANIFEST)
+            if os.path.exists(manifest_path):
+                snapshot_mtime = os.path.getmtime(manifest_path)
+                vector_database = initialize_snapshot_vector_database(os.path.dirname(manifest_path))
+                count = vector_database.count()
+                logging.info(f"Mapped snapshot of tenant {config.tenant_id} ({count} chunks)")
+                return LoadedTenant(config, vector_database, count * MAPPED_BYTES_PER_CHUNK, time.monotonic(),
+                                    snapshot_mtime=snapshot_mtime)
+            logging.warning(f"No index snapshot for {config.collection_name}, opening the Chroma store")
+
+        vector_database = initialize_vector_database(config.collection_name)
+        count = vector_database._collection.count()
+
+        if count == 0 and config.assets_folder and os.path.exists(config.assets_folder):
+            docs = load_documents(config.assets_folder)
+            if docs:
+                vector_database = split_documents(docs, collection_name=config.collection_name)
+                count = vector_database._collection.count()
+
+        logging.info(f"Loaded tenant {config.tenant_id} ({count} chunks)")
+        return LoadedTenant(config, vector_database, count * BYTES_PER_CHUNK, time.monotonic())
+
+    def _evict_to_fit(self):
+        # Always keep the most recently used tenant, even if it alone exceeds the budget
+        while len(self._loaded) > 1 and self.total_bytes() > self.max_bytes:
+            tenant_id, _ = self._loaded.popitem(last=False)
+            self.evictions += 1
+            logging.info(f"Evicted tenant {tenant_id} to stay under the memory budget")
+
+    def evict_idle(self):
+        """Drops tenants that have not served a request within `idle_seconds`."""
+        cutoff = time.monotonic() - self.idle_seconds
+        for tenant_id in [tid for tid, loaded in self._loaded.items() if loaded.last_used < cutoff]:
+            del self._loaded[tenant_id]
+            self.evictions += 1
+            logging.info(f"Evicted idle tenant {tenant_id}")
+
+    def drop_stale_snapshots(self):
+        """Drops tenants whose snapshot was re-exported since it was mapped, the next request maps the new one."""
+        for tenant_id, loaded in list(self._loaded.items()):
+            if loaded.snapshot_mtime is None:
+                continue
+            manifest_path = os.path.join(snapshot_directory(loaded.config.collection_name), MANIFEST)
+            if not os.path.exists(manifest_path) or os.path.getmtime(manifest_path) != loaded.snapshot_mtime:
+                del self._loaded[tenant_id]
+                logging.info(f"Snapshot of tenant {tenant_id} changed, remapping on next use")
+
+    def total_bytes(self) -> int:
+        return sum(loaded.size_bytes for loaded in self._loaded.values())
+
+    def stats(self) -> dict:
+        return {
+            "serving_mode": "retrieval_service" if retrieval_client.enabled else INDEX_SERVING_MODE,
+            "configured": sorted(self.tenants),
+            "loaded": list(self._loaded),
+            "estimated_bytes": self.total_bytes(),
+            "max_bytes": self.max_bytes,
+            "loads": self.loads,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,209 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import INDEX_SNAPSHOT_DIRECTORY, MANIFEST, SnapshotIndex, snapshot_directory
+from app.rag_chatbot_pipeline.interaction_handler.keyword_index import KeywordIndex
+from app.schema.models import RetrievalQuery
+
+import asyncio
+import logging
+import os
+import threading
+
+import numpy as np
+
+# Queries arriving within the window share one embedding call and one matrix product
+RETRIEVAL_BATCH_SIZE = int(os.getenv("RETRIEVAL_BATCH_SIZE", "64"))
+RETRIEVAL_BATCH_WINDOW_SECONDS = float(os.getenv("RETRIEVAL_BATCH_WINDOW_MS", "5")) / 1000
+# Rank constant of reciprocal rank fusion, the usual 60 keeps single-list outliers from dominating
+RRF_K = 60
+
+
+@dataclass
+class MappedCollection:
+    index: SnapshotIndex
+    snapshot_mtime: float
+    keyword_index: Optional[KeywordIndex] = None
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int, rrf_k: int = RRF_K) -> List[Tuple[int, float]]:
+    """Merges ranked lists of rows into one, scoring each row by the sum of 1 / (rrf_k + rank)."""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class RetrievalEngine:
+    """Answers retrieval queries from memory-mapped index snapshots in micro-batches.
+
+    Queries from every connection go through one queue. A batch is cut when it
+    reaches `batch_size` or `batch_window` seconds after its first query, its
+    distinct query texts are embedded in one call, and each collection is
+    searched with one matrix-matrix product. Snapshots are remapped when they
+    are re-exported.
+    """
+
+    def __init__(self, embeddings, snapshot_root: str = INDEX_SNAPSHOT_DIRECTORY,
+                 batch_size: int = RETRIEVAL_BATCH_SIZE, batch_window: float = RETRIEVAL_BATCH_WINDOW_SECONDS):
+        self.embeddings = embeddings
+        self.snapshot_root = snapshot_root
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self._collections: Dict[str, MappedCollection] = {}
+        self._lock = threading.Lock()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+        self._batches = set()
+        self.queries = 0
+        self.batches = 0
+        self.largest_batch = 0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def collection(self, name: str) -> MappedCollection:
+        """Returns the mapped snapshot of a collection, mapping it again if it was re-exported.
+
+        Raises:
+            KeyError: If the collection has no snapshot.
+        """
+        manifest_path = os.path.join(snapshot_directory(name, self.snapshot_root), MANIFEST)
+        if os.path.basename(os.path.dirname(manifest_path)) != name or not os.path.exists(manifest_path):
+            raise KeyError(name)
+
+        snapshot_mtime = os.path.getmtime(manifest_path)
+        with self._lock:
+            mapped = self._collections.get(name)
+            if mapped is None or mapped.snapshot_mtime != snapshot_mtime:
+                mapped = MappedCollection(SnapshotIndex(os.path.dirname(manifest_path)), snapshot_mtime)
+                self._collections[name] = mapped
+                logging.info(f"Mapped snapshot of {name} ({len(mapped.index)} chunks)")
+        return mapped
+
+    async def retrieve(self, query: RetrievalQuery) -> List[dict]:
+        """Queues a query for the next batch and returns its chunks, best first."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((query, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), max(0.0, deadline - loop.time())))
+                except asyncio.TimeoutError:
+                    break
+            # Answer in the background so the next batch fills while this one waits on the embedding call
+            task = loop.create_task(self._answer(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _answer(self, batch: List[Tuple[RetrievalQuery, asyncio.Future]]):
+        self.batches += 1
+        self.queries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        try:
+            texts = list(dict.fromkeys(query.query for query, _ in batch))
+            vectors = np.asarray(await self.embeddings.aembed_documents(texts), dtype=np.float32)
+            positions = {text: i for i, text in enumerate(texts)}
+
+            by_collection: Dict[str, list] = {}
+            for query, future in batch:
+                by_collection.setdefault(query.collection, []).append((query, future))
+
+            for name, items in by_collection.items():
+                query_vectors = vectors[[positions[query.query] for query, _ in items]]
+                try:
+                    results = await asyncio.to_thread(self._search, name, [query for query, _ in items], query_vectors)
+                except Exception as e:
+                    results = [e] * len(items)
+                for (_, future), result in zip(items, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        except Exception as e:
+            logging.exception("Retrieval batch failed")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def chunk(self, name: str, chunk_id: str) -> Optional[dict]:
+        """Returns a chunk of a collection by its id, None when the snapshot has no such chunk.
+
+        Raises:
+            KeyError: If the collection has no snapshot.
+        """
+        mapped = self.collection(name)
+        row = mapped.index.row(chunk_id)
+        if row is None:
+            return None
+        return {"id": chunk_id, "page_content": mapped.index.text(row), "metadata": mapped.index.record(row)["metadata"]}
+
+    def _search(self, name: str, queries: List[RetrievalQuery], query_vectors: np.ndarray) -> List[List[dict]]:
+        mapped = self.collection(name)
+        if any(query.mode == "hybrid" for query in queries) and mapped.keyword_index is None:
+            mapped.keyword_index = KeywordIndex([mapped.index.text(i) for i in range(len(mapped.index))])
+
+        fetch = max(max(query.k, query.fetch_k) for query in queries)
+        candidates = mapped.index.search_batch(query_vectors, fetch)
+        return [self._select(mapped, query, vector, nearest)
+                for query, vector, nearest in zip(queries, query_vectors, candidates)]
+
+    def _select(self, mapped: MappedCollection, query: RetrievalQuery, vector: np.ndarray,
+                nearest: List[Tuple[int, float]]) -> List[dict]:
+        index = mapped.index
+        distances = dict(nearest)
+        similar = [row for row, _ in nearest[:query.k]]
+
+        if query.mode == "similarity":
+            rows = similar
+        elif query.mode == "hybrid":
+            lexical = [row for row, _ in mapped.keyword_index.search(query.query, query.fetch_k)]
+            rows = [row for row, _ in reciprocal_rank_fusion([[row for row, _ in nearest[:query.fetch_k]], lexical], query.k)]
+        else:
+            pool = [row for row, _ in nearest[:query.fetch_k]]
+            selected = maximal_marginal_relevance(vector, index.vectors[pool], lambda_mult=query.lambda_mult, k=query.k)
+            rows = [pool[i] for i in selected]
+            if query.mode == "document_retrieval":
+                rows = rows + similar
+
+        chunks, seen = [], set()
+        for row in rows:
+            text = index.text(row)
+            if text in seen:
+                continue
+            seen.add(text)
+            record = index.record(row)
+            chunks.append({"id": record["id"], "page_content": text, "metadata": record["metadata"],
+                           "distance": distances.get(row)})
+        return chunks
+
+    def stats(self) -> dict:
+        with self._lock:
+            collections = {name: len(mapped.index) for name, mapped in self._collections.items()}
+        return {
+            "collections": collections,
+            "queries": self.queries,
+            "batches": self.batches,
+            "average_batch": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
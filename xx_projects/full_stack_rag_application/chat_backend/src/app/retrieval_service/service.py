@@ -0,0 +1,61 @@
+"""Retrieval service shared by the chat backends.
+
+Serves similarity, MMR, hybrid (vector + BM25) and the chat backends' combined
+`document_retrieval` search over memory-mapped index snapshots, so the API tier
+holds no index and both tiers scale on their own. Replicas only need the snapshot
+directory (INDEX_SNAPSHOT_DIRECTORY) and start in constant time.
+
+Run with: poetry run uvicorn app.retrieval_service.service:app --port 8100 --workers 4
+"""
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from langchain_openai import OpenAIEmbeddings
+from app.openai.openai_connectivity import OPENAI_API_KEY
+from app.retrieval_service.engine import RetrievalEngine
+from app.schema.models import RetrievalRequest
+from contextlib import asynccontextmanager
+
+import asyncio
+
+engine = RetrievalEngine(OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    engine.start()
+    yield
+    await engine.stop()
+
+app = FastAPI(
+    title="RAG retrieval service",
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+
+@app.post('/retrieve')
+async def retrieve(request: RetrievalRequest):
+    """Answers a batch of queries, one list of chunks per query in request order."""
+    try:
+        results = await asyncio.gather(*(engine.retrieve(query) for query in request.queries))
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"No index snapshot for collection: {e.args[0]}")
+    return {"results": results}
+
+
+@app.get('/chunks/{chunk_id}')
+async def read_chunk(chunk_id: str, collection: str = "langchain"):
+    """Returns a stored chunk by id, for resolving the source ids of slim chat responses."""
+    try:
+        chunk = await asyncio.to_thread(engine.chunk, collection, chunk_id)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"No index snapshot for collection: {e.args[0]}")
+    if chunk is None:
+        raise HTTPException(status_code=404, detail=f"Unknown chunk id: {chunk_id}")
+    return chunk
+
+
+@app.get('/health')
+async def health():
+    return engine.stats()
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException
+from app.rag_chatbot_pipeline.data_handler.ingestion_jobs import ingestion_jobs
+
+router = APIRouter()
+
+
+@router.post("/ingest", status_code=202)
+async def submit_ingestion():
+    """
+    Enqueues an ingestion of the new and changed PDFs of every tenant and returns its job id.
+    """
+    job = ingestion_jobs.submit()
+    return {"job_id": job.job_id, "status": job.status}
+
+
+@router.get("/ingest/{job_id}")
+async def read_ingestion(job_id: str):
+    """
+    Reports the status, per-stage progress, throughput and errors of an ingestion job.
+    """
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingestion job: {job_id}")
+    return job.report()
@@ -1,9 +1,30 @@
-from fastapi import FastAPI, logger
+from fastapi import Body, Depends, FastAPI, Header, HTTPException, logger
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from chat_common.admission_control import chat_admission, chat_slot
+from app.routes.ingestion_routes import router as ingestion_routes
 from app.routes.webscrap_routes import router as webscrap_routes
-from app.routes.webscrap_routes import scrape_and_create_pdfs
-from app.rag_chatbot_pipeline.interaction_handler.chat_operations import question_answer
-from contextlib import asynccontextmanager
+from app.rag_chatbot_pipeline.interaction_handler.chat_operations import CHAT_BATCH_DEADLINE_SECONDS, question_answer, question_answer_batch, tenant_indexes
+from app.rag_chatbot_pipeline.interaction_handler.conversation_store import conversation_store
+from app.rag_chatbot_pipeline.data_handler.ingestion_jobs import ingestion_jobs
+from chat_common.deadlines import Deadline, StageTimeout, deadline_metrics
+from chat_common.intent_router import intent_router
+from chat_common.retrieval_client import retrieval_client
+from app.rag_chatbot_pipeline.interaction_handler.tenant_registry import DEFAULT_TENANT_ID
+from chat_common.source_references import compact_source_documents, find_source
+from app.schema.models import ChatBatchRequest, ChatRequest
+from app.web_scrap.crawler import close_crawler
+from app.web_scrap.http_cache import HttpCache
+from app.web_scrap.recrawl_frontier import RecrawlFrontier, recrawl_due
+from contextlib import AsyncExitStack, asynccontextmanager
+from starlette.background import BackgroundTask
+from typing import List, Optional
+import asyncio
+import fcntl
 import logging
+import os
+
+import orjson
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
@@ -11,61 +32,203 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 app = FastAPI(title="RAG chat application", version="0.1.0")
 # Initialize scheduler
 scheduler = AsyncIOScheduler()
+# Taken by the one uvicorn worker that runs the jobs writing shared state, see owns_shared_jobs
+SCHEDULER_LOCK_PATH = os.getenv("SCHEDULER_LOCK_PATH", os.path.join(os.path.dirname(__file__), "..", "scheduler.lock"))
+scheduler_lock = None
 
 # Lifespan context manager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.info("Starting scheduler")
     scheduler.start()
+    ingestion_jobs.start()
     yield
     logging.info("Stopping scheduler")
     scheduler.shutdown()
+    await ingestion_jobs.stop()
+    if scheduler_lock:
+        scheduler_lock.close()
+    await close_crawler()
+    await retrieval_client.close()
+    http_cache.close()
+    conversation_store.close()
+    recrawl_frontier.close()
 
 # Update FastAPI app with lifespan
 app = FastAPI(
     title="RAG chat application", 
     version="0.1.0",
     lifespan=lifespan, 
+    default_response_class=ORJSONResponse,
 )
 
-# Your scheduled task (no changes here)
+http_cache = HttpCache()
+recrawl_frontier = RecrawlFrontier()
+
+# Seed URLs of the recrawl frontier, each is then refetched on its own adaptive schedule
+recrawl_frontier.add([
+    #urls you want to schedule
+])
+
+def owns_shared_jobs() -> bool:
+    """Whether this worker runs the jobs that write the shared stores, like the recrawl.
+
+    Every worker runs the lifespan and its own scheduler. The first to take the file
+    lock keeps it until it exits, then another worker takes the jobs over on its next tick.
+    Jobs that only touch the worker's own memory run in every worker.
+    """
+    global scheduler_lock
+    if scheduler_lock is None:
+        lock = open(SCHEDULER_LOCK_PATH, "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return False
+        scheduler_lock = lock
+        logging.info(f"Worker {os.getpid()} runs the shared scheduler jobs")
+    return True
+
+# Your scheduled task
 async def scheduled_task():
-    urls = [
-        #urls you want to schedule
-    ]
-    await scrape_and_create_pdfs(urls)
+    if not owns_shared_jobs():
+        return
+    # Only URLs that are due are checked, and only the ones whose content changed are re-embedded
+    await recrawl_due(recrawl_frontier, http_cache=http_cache)
 
 # Add job to scheduler 
-scheduler.add_job(scheduled_task, 'interval', weeks=1) 
+scheduler.add_job(scheduled_task, 'interval', minutes=5, max_instances=1, coalesce=True)
+scheduler.add_job(tenant_indexes.evict_idle, 'interval', minutes=5)
+scheduler.add_job(tenant_indexes.drop_stale_snapshots, 'interval', minutes=1)
+scheduler.add_job(conversation_store.evict_expired, 'interval', minutes=5)
 
 # Include your routers
 app.include_router(webscrap_routes,prefix="/webscrap")
+app.include_router(ingestion_routes)
 
 @app.get('/')
 def read_root():
     return {'Message': 'This is a RAG-architecture based AI application-backend'}
 
-from pydantic import BaseModel
-
-class ChatRequest(BaseModel):
-    query: str
+@app.post('/chat')
+async def read_chat(request: ChatRequest, deadline: Deadline = Depends(chat_slot)):
+    tenant_id = request.tenant_id or DEFAULT_TENANT_ID
+    if tenant_id not in tenant_indexes.tenants:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {tenant_id}")
 
+    # Only clients that continue or ask for a conversation get a session, stateless calls leave nothing behind
+    conversation_id = None
+    if request.conversation_id or request.new_conversation:
+        conversation_id = conversation_store.session(request.conversation_id).conversation_id
 
-@app.post('/chat')
-async def read_chat(request: ChatRequest):
     try:
         req: str = request.query
         print(req)
-        response = await question_answer(query=req)
+        response = await question_answer(query=req, tenant_id=tenant_id, conversation_id=conversation_id, mode=request.mode,
+                                         deadline=deadline)
 
         if response:
             chat_result = response['result']
             source_documents = response['source_documents']
+            if request.response_mode == "slim":
+                source_documents = compact_source_documents(source_documents)
 
-            return {"chat_result": chat_result, "source_documents": source_documents}
+            return {"chat_result": chat_result, "source_documents": source_documents, "conversation_id": conversation_id,
+                    "partial": response.get("partial", False)}
         else:
             return {"message": "No results found!"}
         
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.exception("Error in chat retrieval:")  
-        return {"message": "An error occurred while retrieving the chat."} 
\ No newline at end of file
+        return {"message": "An error occurred while retrieving the chat."}
+
+
+@app.get('/tenants')
+async def read_tenants():
+    return {**tenant_indexes.stats(), "retrieval": retrieval_client.stats()}
+
+
+@app.post('/chat/batch')
+async def read_chat_batch(request: ChatBatchRequest, x_deadline_ms: Optional[float] = Header(None)):
+    tenant_id = request.tenant_id or DEFAULT_TENANT_ID
+    if tenant_id not in tenant_indexes.tenants:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {tenant_id}")
+
+    # The slot is held until the stream ends, a chat_slot dependency would release it as soon as streaming starts
+    slot = AsyncExitStack()
+    deadline = await slot.enter_async_context(
+        chat_admission.admit(x_deadline_ms / 1000 if x_deadline_ms else CHAT_BATCH_DEADLINE_SECONDS))
+
+    def encode(answer):
+        if "error" in answer:
+            line = {"index": answer["index"], "message": "An error occurred while retrieving the chat."}
+        else:
+            source_documents = answer["source_documents"]
+            if request.response_mode == "slim":
+                source_documents = compact_source_documents(source_documents)
+            line = {"index": answer["index"], "chat_result": answer["result"], "source_documents": source_documents,
+                    "partial": answer.get("partial", False)}
+        return orjson.dumps(jsonable_encoder(line)) + b"\n"
+
+    async def answers():
+        # One JSON object per line, in the order the answers complete, each tagged with its query's index
+        answered = set()
+        try:
+            async for answer in question_answer_batch(request.queries, tenant_id=tenant_id, deadline=deadline):
+                answered.add(answer["index"])
+                yield encode(answer)
+        except Exception as e:
+            # Every question still unanswered gets its error line rather than a silently truncated stream
+            logging.exception("Error in batch chat retrieval:")
+            for index in range(len(request.queries)):
+                if index not in answered:
+                    yield encode({"index": index, "error": str(e)})
+        finally:
+            await slot.aclose()
+
+    # Also released when the client leaves before the stream starts, closing the stack twice is harmless
+    return StreamingResponse(answers(), media_type="application/x-ndjson", background=BackgroundTask(slot.aclose))
+
+
+@app.get('/admission')
+async def read_admission():
+    return chat_admission.stats()
+
+
+@app.get('/deadlines')
+async def read_deadlines():
+    return deadline_metrics.stats()
+
+
+@app.get('/intents')
+async def read_intents():
+    return intent_router.stats()
+
+
+@app.get('/sources/{source_id}')
+async def read_source(source_id: str, tenant_id: Optional[str] = None):
+    tenant_id = tenant_id or DEFAULT_TENANT_ID
+    if tenant_id not in tenant_indexes.tenants:
+        raise HTTPException(status_code=404, detail=f"Unknown tenant: {tenant_id}")
+
+    # Resolved against the tenant's collection, so any worker can answer for ids another one handed out
+    tenant = await tenant_indexes.get(tenant_id)
+    if retrieval_client.enabled:
+        document = await retrieval_client.get_chunk(source_id, tenant.config.collection_name)
+    else:
+        document = await asyncio.to_thread(find_source, tenant.vector_database, source_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail=f"Unknown source id: {source_id}")
+    return {"id": source_id, "page_content": document.page_content, "metadata": document.metadata}
+
+
+@app.get('/recrawl')
+async def read_recrawl():
+    return recrawl_frontier.stats()
+
+
+@app.post('/recrawl/urls')
+async def add_recrawl_urls(urls: List[str] = Body(...)):
+    return {"added": recrawl_frontier.add(urls)}
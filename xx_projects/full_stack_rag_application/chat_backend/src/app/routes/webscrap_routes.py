@@ -3,7 +3,9 @@ import logging
 
 from fastapi import APIRouter, Body, HTTPException
 from typing import List
-from app.web_scrap.wb_srcp import scrape_and_create_pdfs
+from app.schema.models import SiteCrawlRequest
+from app.web_scrap.site_crawler import crawl_site, get_site_crawl_store
+from app.web_scrap.wb_srcp import scrape_and_create_pdfs, scrape_and_ingest
 
 router = APIRouter()
 
@@ -20,3 +22,35 @@ async def scrap_endpoint(urls: List[str] = Body(...)) -> dict[str, List[str]]:
         # Return a dictionary with an error message
         logging.error(f"Unexpected error during web scraping: {e}")
         return {"error": "Internal server error"}
+
+
+@router.post("/scrape_and_ingest")
+async def scrape_and_ingest_endpoint(urls: List[str] = Body(...)) -> dict:
+    try:
+        return await scrape_and_ingest(urls)
+    except Exception as e:
+        # Return a dictionary with an error message
+        logging.error(f"Unexpected error during web scraping: {e}")
+        return {"error": "Internal server error"}
+
+
+@router.post("/crawl_site")
+async def crawl_site_endpoint(request: SiteCrawlRequest) -> dict:
+    try:
+        return await crawl_site(request.start_url, request.sitemap_url, request.max_depth, request.max_pages,
+                                crawl_id=request.crawl_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Unexpected error during site crawl: {e}")
+        return {"error": "Internal server error"}
+
+
+@router.get("/crawl_site/{crawl_id}")
+async def crawl_site_status(crawl_id: str) -> dict:
+    store = get_site_crawl_store()
+    crawl = store.get(crawl_id)
+    if crawl is None:
+        raise HTTPException(status_code=404, detail=f"Unknown crawl: {crawl_id}")
+    return {"crawl_id": crawl_id, "seeds": crawl.seeds, "finished": crawl.finished_at is not None,
+            "pages": store.counts(crawl_id)}
@@ -0,0 +1,42 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+class ChatRequest(BaseModel):
+    query: str
+    # "slim" returns compact source references instead of full documents
+    response_mode: Literal["full", "slim"] = "full"
+    # selects the tenant's collection and prompt, defaults to DEFAULT_TENANT_ID
+    tenant_id: Optional[str] = None
+    # server-side conversation to continue. Without one the request is answered statelessly
+    conversation_id: Optional[str] = None
+    # starts a server-side conversation, its id comes back in the response
+    new_conversation: bool = False
+    # "summary" summarises the whole source the question is about, "auto" does so for requests like "summarise ..."
+    mode: Literal["auto", "qa", "summary"] = "auto"
+
+class ChatBatchRequest(BaseModel):
+    # independent questions, answered without conversation history
+    queries: List[str] = Field(..., min_length=1, max_length=1000)
+    response_mode: Literal["full", "slim"] = "full"
+    tenant_id: Optional[str] = None
+
+class SiteCrawlRequest(BaseModel):
+    start_url: Optional[str] = None
+    sitemap_url: Optional[str] = None
+    max_depth: int = Field(3, ge=0)
+    max_pages: int = Field(500, ge=1)
+    # resumes an interrupted crawl with its stored frontier, seeds and limits
+    crawl_id: Optional[str] = None
+
+class RetrievalQuery(BaseModel):
+    query: str
+    # snapshot to search, see INDEX_SNAPSHOT_DIRECTORY
+    collection: str = "langchain"
+    # "document_retrieval" merges the similarity and MMR results like the chat backends do
+    mode: Literal["similarity", "mmr", "hybrid", "document_retrieval"] = "document_retrieval"
+    k: int = Field(3, ge=1, le=50)
+    fetch_k: int = Field(20, ge=1, le=200)
+    lambda_mult: float = Field(0.5, ge=0.0, le=1.0)
+
+class RetrievalRequest(BaseModel):
+    queries: List[RetrievalQuery] = Field(..., min_length=1, max_length=256)
@@ -0,0 +1,134 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from urllib.parse import urljoin
+from lxml import etree, html as lxml_html
+
+import re
+
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "form", "nav", "footer", "aside"]
+BOILERPLATE_PATTERN = re.compile(r"(^|[\s_-])(nav|navbar|menu|footer|sidebar|breadcrumbs?|cookie|banner|social|share|advert|ads|popup|modal)([\s_-]|$)", re.IGNORECASE)
+BLOCK_TAGS = ["p", "div", "section", "article", "main", "li", "td", "th", "dd", "dt", "blockquote", "pre", "figcaption",
+              "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "table", "tr"]
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# A block is boilerplate when most of its text is link text or when it is too short to be prose
+MAX_LINK_DENSITY = 0.33
+MIN_BLOCK_WORDS = 5
+
+# Pages are decoded by the HTTP client already, so the parser must not re-decode them from a <meta charset>
+_PARSER = lxml_html.HTMLParser(encoding="utf-8", remove_comments=True)
+
+
+@dataclass
+class ExtractedPage:
+    title: Optional[str]
+    text: str
+
+
+def _squash(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _is_boilerplate_container(element) -> bool:
+    attributes = " ".join(filter(None, (element.get("id"), element.get("class"), element.get("role"))))
+    return bool(attributes) and bool(BOILERPLATE_PATTERN.search(attributes))
+
+
+def _is_leaf(block) -> bool:
+    return next(block.iterdescendants(*BLOCK_TAGS), None) is None
+
+
+def _keep_block(text: str, link_chars: int) -> bool:
+    link_density = link_chars / len(text) if text else 1.0
+    if link_density > MAX_LINK_DENSITY:
+        return False
+    return len(text.split()) >= MIN_BLOCK_WORDS or text.endswith((".", "?", "!", ":"))
+
+
+def _parse(html: str):
+    if not html or not html.strip():
+        return None
+    try:
+        return lxml_html.document_fromstring(html.encode("utf-8"), parser=_PARSER)
+    except etree.ParserError:
+        return None
+
+
+def _links(document, base_url: str) -> List[str]:
+    links = []
+    for anchor in document.iter("a"):
+        href = (anchor.get("href") or "").strip()
+        if href and not href.startswith(("#", "mailto:", "tel:", "javascript:")):
+            links.append(urljoin(base_url, href))
+    return list(dict.fromkeys(links))
+
+
+def _main_content(document) -> ExtractedPage:
+    title = _squash(document.findtext(".//title") or "") or None
+
+    for element in list(document.iter(*BOILERPLATE_TAGS)):
+        element.drop_tree()
+    for element in document.xpath("//*[@id or @class or @role]"):
+        if element.tag not in ("body", "main") and element.getparent() is not None and _is_boilerplate_container(element):
+            element.drop_tree()
+
+    root = document.find(".//main")
+    if root is None:
+        root = document.find(".//article")
+    if root is None:
+        root = document.body
+
+    lines = []
+    # Text sitting directly in the root, outside any block element
+    loose_text = _squash(" ".join(root.xpath("text()")))
+    if loose_text and _keep_block(loose_text, 0):
+        lines.append(loose_text)
+
+    for block in root.iter(*BLOCK_TAGS):
+        if not _is_leaf(block):
+            continue
+        text = _squash(block.text_content())
+        if not text:
+            continue
+        if block.tag in HEADING_TAGS:
+            lines.append("#" * int(block.tag[1]) + " " + text)
+            continue
+        link_chars = sum(len(_squash(link.text_content())) for link in block.iter("a"))
+        if _keep_block(text, link_chars):
+            lines.append(text)
+
+    return ExtractedPage(title, "\n\n".join(lines))
+
+
+def extract_main_content(html: str) -> ExtractedPage:
+    """Extracts the main content of a page, dropping navigation, footers and other boilerplate.
+
+    The page is parsed with lxml. Boilerplate tags and containers whose
+    id/class mark them as menus, footers, banners and the like are removed
+    first. The remaining leaf blocks are kept when their text is dense enough
+    and mostly not link text. Headings are kept as markdown `#` lines so the
+    splitter can use them as chunk boundaries.
+
+    Args:
+        html (str): The raw HTML of the page.
+
+    Returns:
+        ExtractedPage: The page title and its main text.
+    """
+    document = _parse(html)
+    if document is None:
+        return ExtractedPage(None, "")
+    return _main_content(document)
+
+
+def extract_content_and_links(html: str, base_url: str) -> Tuple[ExtractedPage, List[str]]:
+    """Like `extract_main_content`, also returning the absolute URLs the page links to.
+
+    Links are collected before boilerplate removal, so menus still count for
+    link discovery.
+    """
+    document = _parse(html)
+    if document is None:
+        return ExtractedPage(None, ""), []
+    links = _links(document, base_url)
+    return _main_content(document), links
@@ -0,0 +1,206 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from bs4 import BeautifulSoup
+from app.web_scrap.content_extraction import extract_content_and_links, extract_main_content
+
+import asyncio
+import logging
+import os
+import random
+
+import httpx
+
+MAX_CONCURRENCY = int(os.getenv("CRAWLER_MAX_CONCURRENCY", "32"))
+PER_HOST_CONCURRENCY = int(os.getenv("CRAWLER_PER_HOST_CONCURRENCY", "4"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest wait before a retry, whatever a server asks for in Retry-After
+MAX_BACKOFF = float(os.getenv("CRAWLER_MAX_BACKOFF_SECONDS", "60"))
+USER_AGENT = "rag-chat-backend-crawler/0.1"
+
+
+def extract_text(html: str) -> str:
+    """Parses HTML and returns its text. Runs in the parser worker processes."""
+    return BeautifulSoup(html, "html.parser").get_text()
+
+
+def extract_page(html: str) -> Tuple[Optional[str], str]:
+    """Returns the title and main content of a page. Runs in the parser worker processes."""
+    page = extract_main_content(html)
+    return page.title, page.text
+
+
+def extract_page_and_links(html: str, base_url: str) -> Tuple[Optional[str], str, List[str]]:
+    """Returns the title, main content and outgoing links of a page. Runs in the parser worker processes."""
+    page, links = extract_content_and_links(html, base_url)
+    return page.title, page.text, links
+
+
+def retry_after_seconds(retry_after: Optional[str], now: Optional[datetime] = None) -> Optional[float]:
+    """Returns the seconds a Retry-After header asks to wait, given as seconds or as an HTTP date.
+
+    Dates in the past give 0, values that are neither give None.
+    """
+    if not retry_after:
+        return None
+    retry_after = retry_after.strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+    try:
+        until = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if until.tzinfo is None:
+        until = until.replace(tzinfo=timezone.utc)
+    return max(0.0, (until - (now or datetime.now(timezone.utc))).total_seconds())
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: Optional[int] = None
+    text: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.text is not None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class AsyncCrawler:
+    """Concurrent fetcher shared by every scraping path of the backend.
+
+    One pooled `httpx.AsyncClient` serves all requests. A global semaphore caps
+    the requests in flight and a semaphore per host keeps any single site from
+    being hammered. Failed requests are retried with exponential backoff and
+    jitter, and HTML parsing runs in a process pool so it never blocks the
+    event loop serving the API.
+    """
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, per_host_concurrency: int = PER_HOST_CONCURRENCY,
+                 max_retries: int = 3, backoff_factor: float = 0.5, timeout: float = 10.0,
+                 parse_workers: Optional[int] = None):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.per_host_concurrency = per_host_concurrency
+        self._global_limit = asyncio.Semaphore(max_concurrency)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self._parser_pool = ProcessPoolExecutor(max_workers=parse_workers)
+
+    async def __aenter__(self) -> "AsyncCrawler":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+        self._parser_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_limits[host]
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        seconds = retry_after_seconds(retry_after)
+        if seconds is None:
+            seconds = self.backoff_factor * (2 ** attempt) * (0.5 + random.random())
+        return min(seconds, MAX_BACKOFF)
+
+    async def fetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """Fetches a URL, retrying transport errors and retryable statuses with backoff.
+
+        A 304 answer to conditional `headers` comes back as a result without text
+        whose `not_modified` is set.
+        """
+        error = None
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            # The host slot comes first, so URLs queued for a busy host wait without holding a global slot
+            async with self._host_limit(url), self._global_limit:
+                try:
+                    response = await self._client.get(url, headers=headers)
+                    if response.status_code == 304:
+                        return FetchResult(url, 304, headers=dict(response.headers))
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return FetchResult(url, response.status_code, response.text, dict(response.headers))
+                    error = f"HTTP {response.status_code}"
+                    retry_after = response.headers.get("Retry-After")
+                except httpx.HTTPStatusError as e:
+                    return FetchResult(url, e.response.status_code, error=f"HTTP {e.response.status_code}")
+                except httpx.TransportError as e:
+                    error = f"{type(e).__name__}: {e}"
+
+            if attempt < self.max_retries:
+                # Sleep outside the semaphores so waiting retries don't hold slots
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        logging.warning(f"Failed to fetch URL {url}: {error}")
+        return FetchResult(url, error=error)
+
+    async def parse(self, html: str) -> str:
+        """Extracts the text of a page in the parser process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._parser_pool, extract_text, html)
+
+    async def parse_page(self, html: str) -> Tuple[Optional[str], str]:
+        """Extracts the title and text of a page in the parser process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._parser_pool, extract_page, html)
+
+    async def parse_page_and_links(self, html: str, base_url: str) -> Tuple[Optional[str], str, List[str]]:
+        """Extracts the title, text and absolute outgoing links of a page in the parser process pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._parser_pool, extract_page_and_links, html, base_url)
+
+    async def scrape(self, url: str) -> Tuple[str, Optional[str]]:
+        """Fetches and parses one URL, returning (url, text) with text None on failure."""
+        result = await self.fetch(url)
+        if not result.ok:
+            return url, None
+        return url, await self.parse(result.text)
+
+    async def crawl(self, urls: Iterable[str]) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """Scrapes all URLs concurrently, yielding (url, text) in completion order."""
+        tasks = [asyncio.ensure_future(self.scrape(url)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+_crawler: Optional[AsyncCrawler] = None
+
+
+def get_crawler() -> AsyncCrawler:
+    """Returns the process-wide crawler, creating it on first use."""
+    global _crawler
+    if _crawler is None:
+        _crawler = AsyncCrawler()
+    return _crawler
+
+
+async def close_crawler():
+    global _crawler
+    if _crawler is not None:
+        await _crawler.aclose()
+        _crawler = None
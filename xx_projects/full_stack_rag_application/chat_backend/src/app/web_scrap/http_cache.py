@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.join(os.path.dirname(__file__), "..", "http_cache.sqlite3"))
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    content_hash: Optional[str]
+    checked_at: float
+    changed_at: float
+
+
+class HttpCache:
+    """Persistent validators and content hashes of the pages scraped so far.
+
+    `conditional_headers` turns a stored entry into If-None-Match /
+    If-Modified-Since headers so unchanged pages come back as 304. Servers that
+    ignore validators are caught by comparing the hash of the cleaned text.
+    """
+
+    def __init__(self, path: str = HTTP_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                checked_at REAL NOT NULL,
+                changed_at REAL NOT NULL
+            )
+        """)
+        self._connection.commit()
+
+    def lookup(self, url: str) -> Optional[CacheEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT url, etag, last_modified, content_hash, checked_at, changed_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        entry = self.lookup(url)
+        headers = {}
+        if entry and entry.etag:
+            headers["If-None-Match"] = entry.etag
+        if entry and entry.last_modified:
+            headers["If-Modified-Since"] = entry.last_modified
+        return headers
+
+    def is_unchanged(self, url: str, digest: str) -> bool:
+        entry = self.lookup(url)
+        return entry is not None and entry.content_hash == digest
+
+    def store(self, url: str, etag: Optional[str], last_modified: Optional[str], digest: str):
+        """Records a page whose new content has been processed."""
+        now = time.time()
+        with self._lock:
+            self._connection.execute("""
+                INSERT INTO pages (url, etag, last_modified, content_hash, checked_at, changed_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    etag = excluded.etag,
+                    last_modified = excluded.last_modified,
+                    changed_at = CASE WHEN pages.content_hash = excluded.content_hash THEN pages.changed_at ELSE excluded.changed_at END,
+                    content_hash = excluded.content_hash,
+                    checked_at = excluded.checked_at
+            """, (url, etag, last_modified, digest, now, now))
+            self._connection.commit()
+
+    def touch(self, url: str):
+        """Records that a page was checked and found unchanged."""
+        with self._lock:
+            self._connection.execute("UPDATE pages SET checked_at = ? WHERE url = ?", (time.time(), url))
+            self._connection.commit()
+
+    def close(self):
+        self._connection.close()
@@ -0,0 +1,200 @@
+from dataclasses import dataclass
+from typing import Iterable, List, Optional
+from app.rag_chatbot_pipeline.data_handler.data_operations import DEFAULT_COLLECTION_NAME
+from app.web_scrap.http_cache import HttpCache
+from app.web_scrap.wb_srcp import scrape_and_ingest
+
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+RECRAWL_FRONTIER_PATH = os.getenv("RECRAWL_FRONTIER_PATH", os.path.join(os.path.dirname(__file__), "..", "recrawl_frontier.sqlite3"))
+# New URLs start at the old weekly schedule and adapt from there
+INITIAL_INTERVAL_SECONDS = float(os.getenv("RECRAWL_INITIAL_INTERVAL_HOURS", "168")) * 3600
+MIN_INTERVAL_SECONDS = float(os.getenv("RECRAWL_MIN_INTERVAL_HOURS", "6")) * 3600
+MAX_INTERVAL_SECONDS = float(os.getenv("RECRAWL_MAX_INTERVAL_HOURS", "720")) * 3600
+FAILURE_RETRY_SECONDS = float(os.getenv("RECRAWL_FAILURE_RETRY_HOURS", "1")) * 3600
+RECRAWL_BATCH_SIZE = int(os.getenv("RECRAWL_BATCH_SIZE", "50"))
+
+# A change halves the interval, every unchanged check stretches it by half
+CHANGED_FACTOR = 0.5
+UNCHANGED_FACTOR = 1.5
+# Each fetch lands somewhere in +/- 20% of its interval so URLs don't fire together
+JITTER = 0.2
+
+
+@dataclass
+class FrontierEntry:
+    url: str
+    interval: float
+    next_fetch_at: float
+    checks: int
+    changes: int
+    failures: int
+    last_checked_at: Optional[float]
+    last_changed_at: Optional[float]
+
+
+class RecrawlFrontier:
+    """Persistent recrawl schedule that adapts to how often each page actually changes.
+
+    Every URL carries its own interval. A check that finds new content (by
+    content hash) halves it, an unchanged check stretches it, both within
+    [`min_interval`, `max_interval`]. Next fetch times are jittered, and new URLs
+    get a random first fetch within their interval, so the load is spread out
+    instead of arriving as one weekly spike.
+    """
+
+    def __init__(self, path: str = RECRAWL_FRONTIER_PATH, initial_interval: float = INITIAL_INTERVAL_SECONDS,
+                 min_interval: float = MIN_INTERVAL_SECONDS, max_interval: float = MAX_INTERVAL_SECONDS):
+        self.initial_interval = initial_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS frontier (
+                url TEXT PRIMARY KEY,
+                interval REAL NOT NULL,
+                next_fetch_at REAL NOT NULL,
+                checks INTEGER NOT NULL DEFAULT 0,
+                changes INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                last_checked_at REAL,
+                last_changed_at REAL
+            )
+        """)
+        self._connection.execute("CREATE INDEX IF NOT EXISTS frontier_next_fetch_at ON frontier (next_fetch_at)")
+        self._connection.commit()
+
+    def _jittered(self, interval: float) -> float:
+        return interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def add(self, urls: Iterable[str]) -> int:
+        """Adds URLs to the frontier, leaving already known ones untouched.
+
+        Returns:
+            int: The number of URLs that were new.
+        """
+        now = time.time()
+        rows = [(url, self.initial_interval, now + random.uniform(0, self.initial_interval)) for url in dict.fromkeys(urls)]
+        with self._lock:
+            before = self._connection.total_changes
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO frontier (url, interval, next_fetch_at) VALUES (?, ?, ?)", rows)
+            self._connection.commit()
+            return self._connection.total_changes - before
+
+    def remove(self, urls: Iterable[str]):
+        with self._lock:
+            self._connection.executemany("DELETE FROM frontier WHERE url = ?", [(url,) for url in urls])
+            self._connection.commit()
+
+    def due(self, limit: int = RECRAWL_BATCH_SIZE, now: Optional[float] = None) -> List[str]:
+        """Returns the URLs whose next fetch time has passed, most overdue first."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT url FROM frontier WHERE next_fetch_at <= ? ORDER BY next_fetch_at LIMIT ?", (now, limit)
+            ).fetchall()
+        return [url for (url,) in rows]
+
+    def lookup(self, url: str) -> Optional[FrontierEntry]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT url, interval, next_fetch_at, checks, changes, failures, last_checked_at, last_changed_at "
+                "FROM frontier WHERE url = ?", (url,)
+            ).fetchone()
+        return FrontierEntry(*row) if row else None
+
+    def record(self, url: str, status: str):
+        """Reschedules a URL after a check.
+
+        Args:
+            url (str): The URL that was checked.
+            status (str): "changed", "unchanged" or "failed", as reported by the scrape.
+        """
+        entry = self.lookup(url)
+        if entry is None:
+            return
+
+        now = time.time()
+        interval = entry.interval
+        if status == "changed":
+            interval = max(self.min_interval, interval * CHANGED_FACTOR)
+        elif status == "unchanged":
+            interval = min(self.max_interval, interval * UNCHANGED_FACTOR)
+
+        # Failures keep the learned interval and retry sooner
+        delay = min(FAILURE_RETRY_SECONDS, interval) if status == "failed" else interval
+        with self._lock:
+            self._connection.execute("""
+                UPDATE frontier SET
+                    interval = ?,
+                    next_fetch_at = ?,
+                    checks = checks + 1,
+                    changes = changes + ?,
+                    failures = failures + ?,
+                    last_checked_at = ?,
+                    last_changed_at = CASE WHEN ? THEN ? ELSE last_changed_at END
+                WHERE url = ?
+            """, (interval, now + self._jittered(delay), int(status == "changed"), int(status == "failed"),
+                  now, status == "changed", now, url))
+            self._connection.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            urls, due, min_interval, avg_interval, max_interval, changes, checks = self._connection.execute(
+                "SELECT COUNT(*), SUM(next_fetch_at <= ?), MIN(interval), AVG(interval), MAX(interval), "
+                "SUM(changes), SUM(checks) FROM frontier", (time.time(),)
+            ).fetchone()
+        hours = lambda seconds: round(seconds / 3600, 1) if seconds is not None else None
+        return {
+            "urls": urls,
+            "due": due or 0,
+            "interval_hours": {"min": hours(min_interval), "avg": hours(avg_interval), "max": hours(max_interval)},
+            "checks": checks or 0,
+            "changes": changes or 0,
+        }
+
+    def close(self):
+        self._connection.close()
+
+
+async def recrawl_due(frontier: RecrawlFrontier, http_cache: Optional[HttpCache] = None,
+                      limit: int = RECRAWL_BATCH_SIZE, collection_name: str = DEFAULT_COLLECTION_NAME) -> dict:
+    """Checks the URLs that are due and ingests the ones whose content changed.
+
+    Args:
+        frontier (RecrawlFrontier): The recrawl schedule.
+        http_cache (HttpCache, optional): Validators and content hashes from earlier runs. Defaults to None.
+        limit (int, optional): The most URLs to check in this run.
+        collection_name (str, optional): Collection to ingest into. Defaults to the shared collection.
+
+    Returns:
+        dict: The result of `scrape_and_ingest` for the due URLs, empty when nothing was due.
+    """
+    urls = frontier.due(limit)
+    if not urls:
+        return {}
+
+    try:
+        result = await scrape_and_ingest(urls, http_cache=http_cache, collection_name=collection_name)
+    except Exception:
+        # Don't retry a failing ingest on every tick
+        for url in urls:
+            frontier.record(url, "failed")
+        raise
+
+    statuses = dict.fromkeys(urls, "unchanged")  # pages that came back empty count as unchanged
+    for status, key in (("changed", "ingested_urls"), ("unchanged", "unchanged_urls"), ("failed", "failed_urls")):
+        statuses.update(dict.fromkeys(result[key], status))
+    for url, status in statuses.items():
+        frontier.record(url, status)
+
+    logging.info(f"Recrawl: {len(result['ingested_urls'])} changed, "
+                 f"{len(result['unchanged_urls'])} unchanged, {len(result['failed_urls'])} failed")
+    return result
@@ -0,0 +1,398 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from lxml import etree
+from app.rag_chatbot_pipeline.data_handler.data_operations import DEFAULT_COLLECTION_NAME, split_documents
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import refresh_snapshot
+from app.web_scrap.crawler import USER_AGENT, AsyncCrawler, get_crawler
+from app.web_scrap.http_cache import HttpCache
+from app.web_scrap.wb_srcp import ScrapedPage, page_to_document, remember_page, scrape_page
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+SITE_CRAWL_PATH = os.getenv("SITE_CRAWL_PATH", os.path.join(os.path.dirname(__file__), "..", "site_crawls.sqlite3"))
+SITE_CRAWL_CONCURRENCY = int(os.getenv("SITE_CRAWL_CONCURRENCY", "8"))
+SITE_CRAWL_MAX_DEPTH = int(os.getenv("SITE_CRAWL_MAX_DEPTH", "3"))
+SITE_CRAWL_MAX_PAGES = int(os.getenv("SITE_CRAWL_MAX_PAGES", "500"))
+# Changed pages are embedded in batches of this size while the crawl goes on
+INGEST_BATCH_SIZE = int(os.getenv("SITE_CRAWL_INGEST_BATCH_SIZE", "16"))
+INGEST_FLUSH_SECONDS = 2.0
+MAX_SITEMAPS = 20
+
+TRACKING_PARAMS = {"gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl", "igshid", "ref", "ref_src"}
+DEFAULT_PORTS = {"http": 80, "https": 443}
+SKIPPED_EXTENSIONS = re.compile(
+    r"\.(pdf|docx?|xlsx?|pptx?|zip|rar|gz|tar|7z|jpe?g|png|gif|svg|webp|ico|bmp|mp3|mp4|avi|mov|wmv|css|js|xml|json|rss)$",
+    re.IGNORECASE,
+)
+
+
+def normalize_url(url: str, scheme: Optional[str] = None) -> Optional[str]:
+    """Returns the canonical form of a URL, or None when it is not an http(s) URL.
+
+    Scheme and host are lowercased, default ports, fragments and tracking
+    parameters (utm_*, gclid, fbclid, ...) are dropped, the remaining query
+    parameters are sorted and trailing slashes are removed from the path.
+
+    Args:
+        url (str): The URL to normalise.
+        scheme (str, optional): Scheme to force, e.g. the one of the seed for links on the same host.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    scheme = scheme or parts.scheme.lower()
+    netloc = parts.hostname.lower()
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc += f":{port}"
+    path = re.sub(r"/{2,}", "/", parts.path) or "/"
+    if path != "/":
+        path = path.rstrip("/")
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS)
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+@dataclass
+class SiteCrawl:
+    crawl_id: str
+    seeds: List[str]
+    max_depth: int
+    max_pages: int
+    created_at: float
+    finished_at: Optional[float] = None
+
+
+class SiteCrawlStore:
+    """Persistent frontier of the site crawls, so an interrupted crawl can be resumed.
+
+    Every discovered URL is stored with its depth and status: "pending" until
+    it is fetched, then "ingested", "unchanged", "duplicate", "skipped" or
+    "failed". Pages are only marked "ingested" once their batch is embedded, so
+    a crawl killed mid-batch fetches them again on resume.
+    """
+
+    def __init__(self, path: str = SITE_CRAWL_PATH):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS crawls (
+                crawl_id TEXT PRIMARY KEY,
+                seeds TEXT NOT NULL,
+                max_depth INTEGER NOT NULL,
+                max_pages INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                finished_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS crawl_urls (
+                crawl_id TEXT NOT NULL,
+                url TEXT NOT NULL,
+                depth INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                content_hash TEXT,
+                PRIMARY KEY (crawl_id, url)
+            );
+            CREATE INDEX IF NOT EXISTS crawl_urls_status ON crawl_urls (crawl_id, status);
+        """)
+        self._connection.commit()
+
+    def create(self, seeds: List[str], max_depth: int, max_pages: int) -> SiteCrawl:
+        crawl = SiteCrawl(uuid.uuid4().hex[:12], seeds, max_depth, max_pages, time.time())
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO crawls (crawl_id, seeds, max_depth, max_pages, created_at) VALUES (?, ?, ?, ?, ?)",
+                (crawl.crawl_id, json.dumps(seeds), max_depth, max_pages, crawl.created_at))
+            self._connection.commit()
+        return crawl
+
+    def get(self, crawl_id: str) -> Optional[SiteCrawl]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT crawl_id, seeds, max_depth, max_pages, created_at, finished_at FROM crawls WHERE crawl_id = ?",
+                (crawl_id,)).fetchone()
+        if row is None:
+            return None
+        return SiteCrawl(row[0], json.loads(row[1]), *row[2:])
+
+    def enqueue(self, crawl: SiteCrawl, urls: Iterable[Tuple[str, int]]) -> List[Tuple[str, int]]:
+        """Adds newly discovered URLs while the crawl is below its page limit.
+
+        Returns:
+            list: The (url, depth) pairs that were not known yet.
+        """
+        added = []
+        with self._lock:
+            (known,) = self._connection.execute("SELECT COUNT(*) FROM crawl_urls WHERE crawl_id = ?", (crawl.crawl_id,)).fetchone()
+            for url, depth in urls:
+                if known >= crawl.max_pages:
+                    break
+                cursor = self._connection.execute(
+                    "INSERT OR IGNORE INTO crawl_urls (crawl_id, url, depth) VALUES (?, ?, ?)", (crawl.crawl_id, url, depth))
+                if cursor.rowcount:
+                    known += 1
+                    added.append((url, depth))
+            self._connection.commit()
+        return added
+
+    def pending(self, crawl_id: str) -> List[Tuple[str, int]]:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT url, depth FROM crawl_urls WHERE crawl_id = ? AND status = 'pending' ORDER BY depth", (crawl_id,)
+            ).fetchall()
+
+    def hashes(self, crawl_id: str) -> Set[str]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT content_hash FROM crawl_urls WHERE crawl_id = ? AND content_hash IS NOT NULL", (crawl_id,)
+            ).fetchall()
+        return {digest for (digest,) in rows}
+
+    def mark(self, crawl_id: str, urls: Iterable[str], status: str, digests: Optional[Dict[str, str]] = None):
+        digests = digests or {}
+        with self._lock:
+            self._connection.executemany(
+                "UPDATE crawl_urls SET status = ?, content_hash = COALESCE(?, content_hash) WHERE crawl_id = ? AND url = ?",
+                [(status, digests.get(url), crawl_id, url) for url in urls])
+            self._connection.commit()
+
+    def finish(self, crawl_id: str):
+        with self._lock:
+            self._connection.execute("UPDATE crawls SET finished_at = ? WHERE crawl_id = ?", (time.time(), crawl_id))
+            self._connection.commit()
+
+    def counts(self, crawl_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT status, COUNT(*) FROM crawl_urls WHERE crawl_id = ? GROUP BY status", (crawl_id,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        self._connection.close()
+
+
+class RobotsRules:
+    """robots.txt of every host visited, fetched once per host through the shared crawler."""
+
+    def __init__(self, crawler: AsyncCrawler):
+        self._crawler = crawler
+        self._parsers: Dict[str, Optional[RobotFileParser]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        async with self._locks.setdefault(origin, asyncio.Lock()):
+            if origin not in self._parsers:
+                result = await self._crawler.fetch(f"{origin}/robots.txt")
+                parser = None
+                if result.ok:
+                    parser = RobotFileParser()
+                    parser.parse(result.text.splitlines())
+                self._parsers[origin] = parser
+        # A missing or unreachable robots.txt allows everything
+        parser = self._parsers[origin]
+        return parser is None or parser.can_fetch(USER_AGENT, url)
+
+
+async def sitemap_urls(crawler: AsyncCrawler, sitemap_url: str, limit: int) -> List[str]:
+    """Returns up to `limit` page URLs listed by a sitemap, following sitemap indexes."""
+    urls, sitemaps, visited = [], [sitemap_url], 0
+    while sitemaps and len(urls) < limit and visited < MAX_SITEMAPS:
+        result = await crawler.fetch(sitemaps.pop(0))
+        visited += 1
+        if not result.ok:
+            continue
+        try:
+            root = etree.fromstring(result.text.encode("utf-8"), parser=etree.XMLParser(recover=True))
+        except etree.XMLSyntaxError:
+            continue
+        if root is None:
+            continue
+        locations = [loc.text.strip() for loc in root.iter("{*}loc") if loc.text]
+        if etree.QName(root).localname == "sitemapindex":
+            sitemaps.extend(locations)
+        else:
+            urls.extend(locations)
+    return urls[:limit]
+
+
+_store: Optional[SiteCrawlStore] = None
+
+
+def get_site_crawl_store() -> SiteCrawlStore:
+    """Returns the process-wide site crawl store, creating it on first use."""
+    global _store
+    if _store is None:
+        _store = SiteCrawlStore()
+    return _store
+
+
+async def crawl_site(start_url: Optional[str] = None, sitemap_url: Optional[str] = None,
+                     max_depth: int = SITE_CRAWL_MAX_DEPTH, max_pages: int = SITE_CRAWL_MAX_PAGES,
+                     crawl_id: Optional[str] = None, http_cache: Optional[HttpCache] = None,
+                     collection_name: str = DEFAULT_COLLECTION_NAME, concurrency: int = SITE_CRAWL_CONCURRENCY,
+                     store: Optional[SiteCrawlStore] = None) -> dict:
+    """Crawls a site breadth-first from a start URL and/or sitemap and ingests its pages as they arrive.
+
+    Only links on the hosts of the seeds are followed, up to `max_depth` links
+    away from a seed and `max_pages` URLs in total, honouring robots.txt. URLs
+    are normalised before they are queued and pages whose content hash was
+    already seen in the crawl are skipped as duplicates. Changed pages are
+    embedded in batches while the crawl continues, and the collection's index
+    snapshot, if it has one, is re-exported once at the end. Passing the
+    `crawl_id` of an interrupted crawl resumes it from its stored frontier.
+
+    Args:
+        start_url (str, optional): Page to start from.
+        sitemap_url (str, optional): Sitemap (or sitemap index) whose URLs seed the crawl.
+        max_depth (int, optional): How many links away from a seed to follow.
+        max_pages (int, optional): The most URLs to fetch.
+        crawl_id (str, optional): Crawl to resume, the seeds and limits of that crawl are reused.
+        http_cache (HttpCache, optional): Content hashes of earlier runs, unchanged pages are not re-embedded.
+        collection_name (str, optional): Collection to ingest into. Defaults to the shared collection.
+        concurrency (int, optional): Pages fetched at once.
+        store (SiteCrawlStore, optional): Frontier store. Defaults to the process-wide one.
+
+    Returns:
+        dict: The 'crawl_id', the number of URLs per status in 'pages' and the number of 'chunks' in the collection.
+
+    Raises:
+        ValueError: If there is neither a seed nor a crawl to resume.
+    """
+    store = store or get_site_crawl_store()
+    crawler = get_crawler()
+
+    if crawl_id:
+        crawl = store.get(crawl_id)
+        if crawl is None:
+            raise ValueError(f"Unknown crawl: {crawl_id}")
+    else:
+        seeds = [url for url in (start_url, sitemap_url) if url]
+        if not seeds:
+            raise ValueError("A start URL or a sitemap URL is required")
+        crawl = store.create(seeds, max_depth, max_pages)
+        seed_urls = [start_url] if start_url else []
+        if sitemap_url:
+            seed_urls += await sitemap_urls(crawler, sitemap_url, max_pages)
+        store.enqueue(crawl, [(url, 0) for url in map(normalize_url, seed_urls) if url])
+
+    # Links are followed on the seed hosts only, in the seed's scheme
+    schemes = {}
+    for seed in crawl.seeds:
+        parts = urlsplit(seed)
+        schemes.setdefault(parts.hostname.lower(), parts.scheme.lower())
+
+    frontier: asyncio.Queue = asyncio.Queue()
+    for url, depth in store.pending(crawl.crawl_id):
+        frontier.put_nowait((url, depth))
+    seen_hashes = store.hashes(crawl.crawl_id)
+    ingest_queue: asyncio.Queue = asyncio.Queue(maxsize=INGEST_BATCH_SIZE * 2)
+    robots = RobotsRules(crawler)
+    chunks = None
+
+    def discovered(links: List[str], depth: int) -> List[Tuple[str, int]]:
+        candidates = []
+        for link in links:
+            host = urlsplit(link).hostname
+            if not host or host.lower() not in schemes:
+                continue
+            url = normalize_url(link, schemes[host.lower()])
+            if url and not SKIPPED_EXTENSIONS.search(urlsplit(url).path):
+                candidates.append((url, depth))
+        return candidates
+
+    async def visit(url: str, depth: int):
+        if not await robots.allowed(url):
+            store.mark(crawl.crawl_id, [url], "skipped")
+            return
+
+        page = await scrape_page(crawler, url, http_cache, follow_links=True)
+        if page.status in ("failed", "skipped"):
+            store.mark(crawl.crawl_id, [url], page.status)
+            return
+        if page.digest in seen_hashes:
+            store.mark(crawl.crawl_id, [url], "duplicate")
+            return
+        seen_hashes.add(page.digest)
+
+        if page.status == "changed" and page.text:
+            await ingest_queue.put(page)
+        else:
+            store.mark(crawl.crawl_id, [url], "unchanged", {url: page.digest})
+
+        if depth < crawl.max_depth:
+            for link in store.enqueue(crawl, discovered(page.links, depth + 1)):
+                frontier.put_nowait(link)
+
+    async def worker():
+        while True:
+            url, depth = await frontier.get()
+            try:
+                await visit(url, depth)
+            except Exception:
+                logging.exception(f"Failed to crawl {url}")
+                store.mark(crawl.crawl_id, [url], "failed")
+            finally:
+                frontier.task_done()
+
+    async def ingest(batch: List[ScrapedPage]):
+        nonlocal chunks
+        urls = [page.url for page in batch]
+        try:
+            database = await asyncio.to_thread(split_documents, [page_to_document(page) for page in batch], collection_name)
+        except Exception:
+            logging.exception(f"Failed to ingest {len(batch)} crawled pages")
+            store.mark(crawl.crawl_id, urls, "failed")
+            return
+        chunks = database._collection.count()
+        for page in batch:
+            remember_page(http_cache, page)
+        store.mark(crawl.crawl_id, urls, "ingested", {page.url: page.digest for page in batch})
+
+    async def ingester():
+        batch, done = [], False
+        while not done:
+            idle = False
+            try:
+                page = await asyncio.wait_for(ingest_queue.get(), INGEST_FLUSH_SECONDS)
+                if page is None:
+                    done = True
+                else:
+                    batch.append(page)
+            except asyncio.TimeoutError:
+                idle = True
+            # Flush full batches, and partial ones once pages stop arriving
+            if batch and (done or idle or len(batch) >= INGEST_BATCH_SIZE):
+                await ingest(batch)
+                batch = []
+
+    ingest_task = asyncio.create_task(ingester())
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await frontier.join()
+        await ingest_queue.put(None)
+        await ingest_task
+    finally:
+        for task in workers + [ingest_task]:
+            task.cancel()
+
+    store.finish(crawl.crawl_id)
+    if chunks is not None:
+        await asyncio.to_thread(refresh_snapshot, collection_name)
+    pages = store.counts(crawl.crawl_id)
+    logging.info(f"Site crawl {crawl.crawl_id}: {pages}")
+    return {"crawl_id": crawl.crawl_id, "pages": pages, "chunks": chunks}
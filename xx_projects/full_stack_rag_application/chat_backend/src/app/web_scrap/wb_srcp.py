@@ -1,17 +1,43 @@
-from typing import List
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry  # type: ignore
-from bs4 import BeautifulSoup
-from fastapi import APIRouter, HTTPException, Body
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from langchain.schema import Document
+from app.rag_chatbot_pipeline.data_handler.data_operations import DEFAULT_COLLECTION_NAME, split_documents
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import refresh_snapshot
+from app.web_scrap.crawler import AsyncCrawler, get_crawler
+from app.web_scrap.http_cache import HttpCache, content_hash
 
+import asyncio
+import hashlib
 import logging
 import os
 import pdfkit
 
+# wkhtmltopdf is a separate process per page, keep the number running at once small
+PDF_CONCURRENCY = int(os.getenv("PDF_CONCURRENCY", "4"))
+# Render an archival PDF next to each directly ingested page
+ARCHIVE_PDFS = os.getenv("ARCHIVE_PDFS", "false").lower() == "true"
+ARCHIVE_DIRECTORY = os.path.join(os.path.dirname(__file__), '..', 'assets', 'archive')
+
+_pdf_limit = asyncio.Semaphore(PDF_CONCURRENCY)
+_archive_tasks: set = set()
+
+
+@dataclass
+class ScrapedPage:
+    url: str
+    status: str  # "changed", "unchanged", "failed" or "skipped" (not an HTML page)
+    title: Optional[str] = None
+    text: Optional[str] = None
+    digest: Optional[str] = None
+    headers: Dict[str, str] = field(default_factory=dict)
+    links: List[str] = field(default_factory=list)
+
 async def scrap_webtest(url):
     """Fetches and parses content from a URL with retry logic.
 
+    Uses the shared crawler, so the fetch goes through the pooled client and the
+    HTML is parsed off the event loop.
+
     Args:
         url (str): The URL to scrape data from.
 
@@ -19,28 +45,69 @@ async def scrap_webtest(url):
         str: The scraped and parsed text content, or None if fetching fails.
     """
 
-    def fetch_url_with_retry(url, max_retries=3, backoff_factor=0.3):
-        session = requests.Session()
-        retries = Retry(total=max_retries, backoff_factor=backoff_factor,
-                        status_forcelist=[500, 502, 503, 504])
-        session.mount('http://', HTTPAdapter(max_retries=retries))
-        session.mount('https://', HTTPAdapter(max_retries=retries))
-        try:
-            response = session.get(url, timeout=10)
-            response.raise_for_status()
-            return response.text
-        except requests.exceptions.RequestException as e:
-            print(f"Failed to fetch URL: {e}")
-            return None
-        finally:
-            session.close()
-
-    content = fetch_url_with_retry(url)
-    if content:
-        soup = BeautifulSoup(content, "html.parser")
-        return soup.get_text()
+    _, text = await get_crawler().scrape(url)
+    return text
+
+
+async def scrape_page(crawler: AsyncCrawler, url: str, http_cache: Optional[HttpCache] = None,
+                      follow_links: bool = False) -> ScrapedPage:
+    """Fetches and parses one page, checking it against the cache when one is given.
+
+    With `follow_links` the outgoing links of the page are returned too. The
+    request is then unconditional, since a 304 carries no links, and unchanged
+    content is only detected by its hash.
+
+    Returns:
+        ScrapedPage: The page with its title and structure-preserving text when it changed.
+    """
+    logging.info(f"Scraping URL: {url}")
+    headers = http_cache.conditional_headers(url) if http_cache and not follow_links else None
+    result = await crawler.fetch(url, headers=headers)
+    if result.not_modified:
+        http_cache.touch(url)
+        return ScrapedPage(url, "unchanged")
+    if not result.ok:
+        logging.error(f"Failed to fetch data from URL: {url}")
+        return ScrapedPage(url, "failed")
+
+    links = []
+    if follow_links and "html" not in result.headers.get("content-type", "text/html"):
+        return ScrapedPage(url, "skipped")
+    if follow_links:
+        title, text, links = await crawler.parse_page_and_links(result.text, url)
     else:
-        return None
+        title, text = await crawler.parse_page(result.text)
+    text = normalize_text(text)
+    digest = content_hash(text)
+    if http_cache and http_cache.is_unchanged(url, digest):
+        # The server ignored the validators but the content is the same
+        http_cache.store(url, result.headers.get("etag"), result.headers.get("last-modified"), digest)
+        return ScrapedPage(url, "unchanged", digest=digest, links=links)
+
+    return ScrapedPage(url, "changed", title, text, digest, result.headers, links)
+
+
+def remember_page(http_cache: Optional[HttpCache], page: ScrapedPage):
+    """Stores the validators of a page once its new content has been processed."""
+    if http_cache:
+        http_cache.store(page.url, page.headers.get("etag"), page.headers.get("last-modified"), page.digest)
+
+
+def normalize_text(data):
+    """Strips every line and collapses runs of blank lines, keeping the paragraph structure.
+
+    Args:
+        data (str): The scraped data to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+
+    lines = [" ".join(line.split()) for line in data.splitlines()]
+    paragraphs = "\n".join(lines)
+    while "\n\n\n" in paragraphs:
+        paragraphs = paragraphs.replace("\n\n\n", "\n\n")
+    return paragraphs.strip()
 
 
 def clean_data(data):
@@ -58,19 +125,20 @@ def clean_data(data):
     return cleaned_data
 
 
-def text_to_pdf(text, filename):
+def text_to_pdf(text, filename, assets_dir=None):
     """Generates a PDF from the provided text and saves it with the given filename.
 
     Args:
         text (str): The text content to convert to PDF.
         filename (str): The name of the PDF file to be created.
+        assets_dir (str, optional): Directory to write to. Defaults to the assets folder.
 
     Returns:
         str: The path to the generated PDF file, or None if creation fails.
     """
 
     try:
-        assets_dir = os.path.join(os.path.dirname(__file__), '..', 'assets')
+        assets_dir = assets_dir or os.path.join(os.path.dirname(__file__), '..', 'assets')
         os.makedirs(assets_dir, exist_ok=True)
         file_path = os.path.join(assets_dir, filename)
         path_wkhtmltopdf = '/usr/bin/wkhtmltopdf'  # Path to the wkhtmltopdf binary
@@ -80,35 +148,109 @@ def text_to_pdf(text, filename):
         print(f"Failed to create PDF: {e}")
         return None
 
-async def scrape_and_create_pdfs(urls: List[str]) -> dict[str, List[str]]:  
+async def scrape_and_create_pdfs(urls: List[str], http_cache: Optional[HttpCache] = None) -> dict[str, List[str]]:  
     """
-    (Function is now outside the route decorator)
     Scrapes data from a list of URLs, cleans it, creates a PDF for each URL, and names them dynamically.
 
+    URLs are fetched concurrently through the shared crawler and PDFs are rendered
+    in worker threads. A URL that fails is reported instead of aborting the batch.
+    With an `http_cache`, requests are conditional and pages whose content has not
+    changed skip the clean and PDF stages.
+
     Args:
         urls (List[str]): A list of URLs to scrape and convert to PDFs.
+        http_cache (HttpCache, optional): Validators and content hashes from earlier runs. Defaults to None.
 
     Returns:
-        dict: A dictionary with the key 'pdf_filepaths' containing a list of file paths to the created PDFs.
+        dict: A dictionary with the key 'pdf_filepaths' containing a list of file paths to the created PDFs,
+            'failed_urls' listing the URLs that could not be fetched or converted and 'unchanged_urls'
+            listing the URLs skipped because their content has not changed.
     """
-    pdf_filepaths = []
-
-    for idx, url in enumerate(urls):
-        try:
-            logging.info(f"Scraping URL: {url}")
-            response = await scrap_webtest(url)
-            if response:
-                cleaned_data = clean_data(response)
-                pdf_filepath = text_to_pdf(cleaned_data, f"data_{idx}.pdf")
-
-                if pdf_filepath:
-                    pdf_filepaths.append(pdf_filepath)
-                else:
-                    raise HTTPException(status_code=500, detail=f"Failed to create PDF for URL: {url}")
-            else:
-                raise HTTPException(status_code=404, detail=f"Failed to fetch data from URL: {url}")
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
-            raise HTTPException(status_code=500, detail="Internal server error")
-
-    return {"pdf_filepaths": pdf_filepaths}
+    crawler = get_crawler()
+    pdf_filepaths = {}
+    failed_urls = []
+    unchanged_urls = []
+
+    async def process(idx, url):
+        page = await scrape_page(crawler, url, http_cache)
+        if page.status == "unchanged":
+            unchanged_urls.append(url)
+            return
+        if page.status == "failed":
+            failed_urls.append(url)
+            return
+
+        async with _pdf_limit:
+            pdf_filepath = await asyncio.to_thread(text_to_pdf, clean_data(page.text), f"data_{idx}.pdf")
+
+        if pdf_filepath:
+            pdf_filepaths[idx] = pdf_filepath
+            remember_page(http_cache, page)
+        else:
+            logging.error(f"Failed to create PDF for URL: {url}")
+            failed_urls.append(url)
+
+    await asyncio.gather(*(process(idx, url) for idx, url in enumerate(urls)))
+
+    return {
+        "pdf_filepaths": [pdf_filepaths[idx] for idx in sorted(pdf_filepaths)],
+        "failed_urls": failed_urls,
+        "unchanged_urls": unchanged_urls,
+    }
+
+
+def page_to_document(page: ScrapedPage) -> Document:
+    return Document(page_content=page.text, metadata={"source": page.url, "title": page.title or page.url})
+
+
+def archive_pdf(page: ScrapedPage):
+    """Renders an archival PDF of the page in the background, off the ingestion path."""
+
+    async def render():
+        filename = hashlib.sha1(page.url.encode("utf-8")).hexdigest()[:16] + ".pdf"
+        async with _pdf_limit:
+            await asyncio.to_thread(text_to_pdf, clean_data(page.text), filename, ARCHIVE_DIRECTORY)
+
+    task = asyncio.get_running_loop().create_task(render())
+    _archive_tasks.add(task)
+    task.add_done_callback(_archive_tasks.discard)
+
+
+async def scrape_and_ingest(urls: List[str], http_cache: Optional[HttpCache] = None,
+                            collection_name: str = DEFAULT_COLLECTION_NAME, archive_pdfs: bool = ARCHIVE_PDFS) -> dict:
+    """Scrapes URLs and feeds the changed pages straight into the chunk/embed stage.
+
+    Pages become text documents with their URL and title as metadata, skipping the
+    HTML -> PDF -> PDF text round trip. PDF rendering is only an optional archival
+    side output. The collection's index snapshot, if it has one, is re-exported
+    after an ingest.
+
+    Args:
+        urls (List[str]): The URLs to scrape.
+        http_cache (HttpCache, optional): Validators and content hashes from earlier runs. Defaults to None.
+        collection_name (str, optional): Collection to ingest into. Defaults to the shared collection.
+        archive_pdfs (bool, optional): Also render each changed page to a PDF in the archive folder.
+
+    Returns:
+        dict: The 'ingested_urls', 'failed_urls' and 'unchanged_urls' and the number of 'chunks' in the collection.
+    """
+    crawler = get_crawler()
+    pages = await asyncio.gather(*(scrape_page(crawler, url, http_cache) for url in urls))
+    changed = [page for page in pages if page.status == "changed" and page.text]
+
+    chunks = None
+    if changed:
+        database = await asyncio.to_thread(split_documents, [page_to_document(page) for page in changed], collection_name)
+        chunks = database._collection.count()
+        for page in changed:
+            remember_page(http_cache, page)
+            if archive_pdfs:
+                archive_pdf(page)
+        await asyncio.to_thread(refresh_snapshot, collection_name)
+
+    return {
+        "ingested_urls": [page.url for page in changed],
+        "failed_urls": [page.url for page in pages if page.status == "failed"],
+        "unchanged_urls": [page.url for page in pages if page.status == "unchanged"],
+        "chunks": chunks,
+    }
@@ -0,0 +1,63 @@
+import asyncio
+
+from app.rag_chatbot_pipeline.interaction_handler.conversation_store import ConversationStore
+
+
+async def summarise(summary, turns):
+    return " ".join(filter(None, [summary] + [turn.content for turn in turns]))
+
+
+def store_at(path, **options) -> ConversationStore:
+    return ConversationStore(path=str(path), summariser=summarise, **options)
+
+
+def test_history_is_shared_by_every_worker(tmp_path) -> None:
+    path = tmp_path / "conversations.sqlite3"
+    first, second = store_at(path), store_at(path)
+    first.append("c1", "user", "What is the fee?")
+    second.append("c1", "assistant", "It is 50,000 PKR.")
+
+    expected = [{"role": "user", "content": "What is the fee?"}, {"role": "assistant", "content": "It is 50,000 PKR."}]
+    assert first.history("c1") == expected
+    assert second.history("c1") == expected
+    assert second.history("unknown") == []
+
+
+def test_turns_out_of_the_window_are_folded_into_the_summary(tmp_path) -> None:
+    path = tmp_path / "conversations.sqlite3"
+    store, other = store_at(path, token_budget=8), store_at(path, token_budget=8)
+
+    async def scenario():
+        for text in ["first question here", "first answer here", "second question here"]:
+            store.append("c1", "user", text)
+        await asyncio.gather(*store._tasks)
+
+    asyncio.run(scenario())
+    history = other.history("c1")
+    assert history[0]["role"] == "system"
+    assert "first question here" in history[0]["content"]
+    assert history[-1] == {"role": "user", "content": "second question here"}
+    assert other.session("c1").pending == []
+
+
+def test_failed_summaries_keep_the_turns_for_a_retry(tmp_path) -> None:
+    async def failing(summary, turns):
+        raise RuntimeError("provider down")
+
+    store = ConversationStore(path=str(tmp_path / "conversations.sqlite3"), token_budget=8, summariser=failing)
+
+    async def scenario():
+        store.append("c1", "user", "first question here")
+        store.append("c1", "user", "second question here")
+        await asyncio.gather(*store._tasks)
+
+    asyncio.run(scenario())
+    assert [turn.content for turn in store.session("c1").pending] == ["first question here"]
+
+
+def test_idle_sessions_are_evicted(tmp_path) -> None:
+    store = store_at(tmp_path / "conversations.sqlite3", ttl_seconds=-1)
+    store.append("c1", "user", "hello")
+    store.evict_expired()
+    assert store.stats()["sessions"] == 0
+    assert store.history("c1") == []
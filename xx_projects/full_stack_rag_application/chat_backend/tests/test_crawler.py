@@ -0,0 +1,55 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from app.web_scrap.crawler import MAX_BACKOFF, AsyncCrawler, retry_after_seconds
+
+NOW = datetime(2024, 6, 1, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def test_retry_after_is_read_as_seconds_or_http_date() -> None:
+    assert retry_after_seconds("120") == 120.0
+    assert retry_after_seconds("Sat, 01 Jun 2024 12:00:30 GMT", now=NOW) == 30.0
+    # A date that already passed means retry now
+    assert retry_after_seconds("Sat, 01 Jun 2024 11:00:00 GMT", now=NOW) == 0.0
+    assert retry_after_seconds("soon") is None
+    assert retry_after_seconds(None) is None
+
+
+def test_backoff_is_capped() -> None:
+    crawler = AsyncCrawler(parse_workers=1)
+    try:
+        assert crawler._backoff(0, "5") == 5.0
+        assert crawler._backoff(0, "86400") == MAX_BACKOFF
+        assert crawler._backoff(0, "Fri, 31 Dec 9999 23:59:59 GMT") == MAX_BACKOFF
+        assert crawler._backoff(30) == MAX_BACKOFF
+        assert 0 < crawler._backoff(0, "soon") <= crawler.backoff_factor * 1.5
+    finally:
+        asyncio.run(crawler.aclose())
+
+
+def test_a_busy_host_does_not_hold_up_other_hosts() -> None:
+    async def service(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "slow.test":
+            await asyncio.sleep(0.2)
+        return httpx.Response(200, text="page")
+
+    async def scenario():
+        crawler = AsyncCrawler(max_concurrency=3, per_host_concurrency=2, parse_workers=1)
+        crawler._client = httpx.AsyncClient(transport=httpx.MockTransport(service))
+        try:
+            started = time.monotonic()
+            slow = [asyncio.ensure_future(crawler.fetch(f"http://slow.test/{i}")) for i in range(10)]
+            await asyncio.sleep(0)
+            result = await crawler.fetch("http://fast.test/")
+            waited = time.monotonic() - started
+            await asyncio.gather(*slow)
+            return result, waited
+        finally:
+            await crawler.aclose()
+
+    result, waited = asyncio.run(scenario())
+    assert result.ok
+    assert waited < 0.1
@@ -0,0 +1,44 @@
+import chromadb
+
+from app.rag_chatbot_pipeline.data_handler.index_snapshot import SnapshotIndex, SnapshotVectorStore, export_snapshot
+from chat_common.source_references import find_source
+
+CHUNKS = [
+    ("c0", "Fees are due in June.", {"source": "fees.pdf", "page": 0, "chunk_id": "c0"}),
+    ("c1", "Hostels open in August.", {"source": "hostel.pdf", "page": 0, "chunk_id": "c1"}),
+    ("c2", "Late fees are 5%.", {"source": "fees.pdf", "page": 1, "chunk_id": "c2"}),
+]
+
+
+def snapshot_store(tmp_path) -> SnapshotVectorStore:
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    collection = client.create_collection("tenant")
+    collection.add(ids=[id for id, _, _ in CHUNKS], documents=[text for _, text, _ in CHUNKS],
+                   metadatas=[metadata for _, _, metadata in CHUNKS], embeddings=[[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    export_snapshot(collection, str(tmp_path / "snapshot"))
+    return SnapshotVectorStore(SnapshotIndex(str(tmp_path / "snapshot")), embedding_function=None)
+
+
+def test_get_filters_by_source_and_chunk_id(tmp_path) -> None:
+    store = snapshot_store(tmp_path)
+    assert store.get(where={"source": "fees.pdf"})["documents"] == ["Fees are due in June.", "Late fees are 5%."]
+    assert store.get(where={"source": "fees.pdf", "page": 1})["ids"] == ["c2"]
+    assert store.get(where={"source": "missing.pdf"})["ids"] == []
+    assert find_source(store, "c1").page_content == "Hostels open in August."
+    assert find_source(store, "c9") is None
+    assert store.index.row("c2") == 2
+
+
+def test_lookups_decode_the_records_once(tmp_path) -> None:
+    store = snapshot_store(tmp_path)
+    decoded = []
+    record = store.index.record
+    store.index.record = lambda i: decoded.append(i) or record(i)
+
+    store.get(where={"chunk_id": "c1"})
+    assert sorted(decoded) == [0, 1, 1, 2]
+    decoded.clear()
+    store.get(where={"source": "fees.pdf"})
+    store.get(where={"chunk_id": "c0"})
+    # Only the returned rows are decoded once the maps exist
+    assert decoded == [0, 2, 0]
@@ -0,0 +1,55 @@
+from app.rag_chatbot_pipeline.interaction_handler.keyword_index import KeywordIndex
+from app.rag_chatbot_pipeline.interaction_handler.question_condenser import (
+    CondensedQuestion, condense_question, extract_noun_phrases)
+
+HISTORY = [
+    {"role": "user", "content": "What is the admission fee for the BS program?"},
+    {"role": "assistant", "content": "It is 50,000 PKR per semester."},
+]
+
+
+def test_noun_phrases_span_articles_connectors_and_names() -> None:
+    assert extract_noun_phrases("What is the admission fee for the BS program?") == ["the admission fee for the BS program"]
+    assert extract_noun_phrases("Tell me about Dawood University") == ["Dawood University"]
+    # A capitalised verb starting the sentence is no phrase
+    assert extract_noun_phrases("Explain the fee structure.") == ["the fee structure"]
+
+
+def test_pronoun_is_replaced_with_the_whole_noun_phrase() -> None:
+    condensed = condense_question("When is it due?", HISTORY)
+    assert condensed.question == "When is the admission fee for the BS program due?"
+    assert condensed.rewritten
+
+    assert condense_question("It is due when?", HISTORY).question == "The admission fee for the BS program is due when?"
+
+
+def test_determiners_and_other_pronouns_are_left_alone() -> None:
+    for question in ("Can I pay this fee in installments?", "Are those fees refundable?", "Is her office open on Friday?"):
+        condensed = condense_question(question, HISTORY)
+        assert condensed.question == question
+        assert not condensed.rewritten
+
+
+def test_ellipsis_reuses_the_previous_question() -> None:
+    history = [{"role": "user", "content": "Tell me about the BS Computer Science program"}]
+    assert condense_question("what about the MBA?", history).question == "Tell me about the MBA program"
+
+
+def test_keywords_of_the_conversation_reach_the_retrieval_query() -> None:
+    index = KeywordIndex(["The admission fee is due in June.", "Hostel rooms are shared.", "Transport is free."])
+    condensed = condense_question("What are the requirements?", [{"role": "user", "content": "Which hostel rooms are free?"}], index)
+    assert condensed.question == "What are the requirements?"
+    assert condensed.rewritten
+    query = condensed.retrieval_query()
+    assert query.startswith("What are the requirements? ")
+    assert set(query.split()[4:]) == {"hostel", "rooms", "free"}
+
+
+def test_retrieval_query_adds_only_missing_keywords() -> None:
+    condensed = CondensedQuestion("When is the fee due?", ["fee", "admission", "due"], True)
+    assert condensed.retrieval_query() == "When is the fee due? admission"
+
+
+def test_first_turn_is_unchanged() -> None:
+    condensed = condense_question("When is it due?", [])
+    assert (condensed.question, condensed.rewritten) == ("When is it due?", False)
@@ -0,0 +1,68 @@
+import asyncio
+
+from langchain_core.documents import Document
+
+from app.rag_chatbot_pipeline.interaction_handler import chat_operations
+from app.rag_chatbot_pipeline.interaction_handler.chat_operations import SUMMARY_REQUEST_PATTERN, summarize_source
+from app.rag_chatbot_pipeline.interaction_handler.interaction_operations import SUMMARY_MAP_MAX_CHARS
+
+
+def test_only_requests_for_a_summary_trigger_summary_mode() -> None:
+    for request in ["Summarise the admission policy", "Can you please summarize the fee structure?",
+                    "Give me a brief overview of the BS program", "I'd like a summary of the hostel rules",
+                    "tl;dr of the prospectus", "What's the gist of the scholarship policy?"]:
+        assert SUMMARY_REQUEST_PATTERN.match(request), request
+
+    for question in ["Is there a summary of the fee structure?", "What does the overview say about hostels?",
+                     "Where can I find the program overview?", "Which courses summarise statistics?"]:
+        assert not SUMMARY_REQUEST_PATTERN.match(question), question
+
+
+class Store:
+    """Holds the chunks of one source for source_chunks."""
+
+    def __init__(self, source: str, count: int, length: int = 10):
+        self.chunks = [(f"chunk {i} ".ljust(length, "x"), {"source": source, "page": i}) for i in range(count)]
+
+    def get(self, where, include):
+        return {"documents": [text for text, _ in self.chunks], "metadatas": [metadata for _, metadata in self.chunks]}
+
+
+def summarize_with(monkeypatch, store: Store, max_chunks: int):
+    summarised = []
+
+    async def summarize_documents(documents):
+        summarised.append(documents)
+        return "summary"
+
+    monkeypatch.setattr(chat_operations, "summarize_documents", summarize_documents)
+    retrieved = [Document(page_content="chunk 1", metadata={"source": "policy.pdf", "page": 1}),
+                 Document(page_content="chunk 2", metadata={"source": "policy.pdf", "page": 2})]
+    response = asyncio.run(summarize_source(retrieved, store, max_chunks=max_chunks))
+    assert response["result"] == "summary"
+    return summarised[0], response["partial"]
+
+
+def test_whole_source_is_summarised_up_to_the_chunk_limit(monkeypatch) -> None:
+    parts, partial = summarize_with(monkeypatch, Store("policy.pdf", 10), max_chunks=10)
+    assert len(parts) == 10
+    assert not partial
+
+
+def test_longer_sources_are_merged_into_parts_covering_all_of_it(monkeypatch) -> None:
+    parts, partial = summarize_with(monkeypatch, Store("policy.pdf", 500), max_chunks=10)
+    assert len(parts) == 10
+    assert not partial
+    assert parts[0].page_content.startswith("chunk 0 ")
+    assert "chunk 499 " in parts[-1].page_content
+    assert sum(part.page_content.count("chunk ") for part in parts) == 500
+
+
+def test_sources_too_long_for_the_budget_are_sampled_across_and_marked_partial(monkeypatch) -> None:
+    parts, partial = summarize_with(monkeypatch, Store("policy.pdf", 500, length=1000), max_chunks=10)
+    assert len(parts) == 10
+    assert partial
+    assert all(len(part.page_content) <= SUMMARY_MAP_MAX_CHARS + 20 for part in parts)
+    # Parts come from the start, middle and end of the source, not just its first pages
+    assert parts[0].page_content.startswith("chunk 0 ")
+    assert int(parts[-1].page_content.split()[1]) > 400
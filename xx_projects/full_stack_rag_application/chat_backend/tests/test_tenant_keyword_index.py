@@ -0,0 +1,37 @@
+import asyncio
+import functools
+
+from app.rag_chatbot_pipeline.data_handler import index_snapshot
+from app.rag_chatbot_pipeline.interaction_handler import chat_operations
+from app.rag_chatbot_pipeline.interaction_handler.chat_operations import tenant_keyword_index
+from app.rag_chatbot_pipeline.interaction_handler.tenant_registry import LoadedTenant, TenantConfig
+
+
+class Store:
+    """Stands in for a tenant's collection, returning whatever texts it currently holds."""
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    def get(self, include):
+        return {"documents": list(self.texts)}
+
+
+def test_an_ingest_makes_the_next_question_rebuild_the_keyword_index(tmp_path, monkeypatch) -> None:
+    root = str(tmp_path)
+    monkeypatch.setattr(chat_operations, "ingested_at", functools.partial(index_snapshot.ingested_at, root=root))
+    store = Store(["Admission fees are due in June.", "Hostels open in August."])
+    tenant = LoadedTenant(TenantConfig("dawood", "dawood", "prompt"), store, 0, 0.0)
+
+    first = asyncio.run(tenant_keyword_index(tenant))
+    assert first.keywords("scholarship deadlines") == []
+    assert asyncio.run(tenant_keyword_index(tenant)) is first
+
+    # A scrape, crawl or ingestion job changes the collection, then refreshes it
+    store.texts.append("Scholarship deadlines are in March.")
+    index_snapshot.refresh_snapshot("dawood", root=root)
+
+    rebuilt = asyncio.run(tenant_keyword_index(tenant))
+    assert rebuilt is not first
+    assert set(rebuilt.keywords("scholarship deadlines")) == {"scholarship", "deadlines"}
+    assert asyncio.run(tenant_keyword_index(tenant)) is rebuilt